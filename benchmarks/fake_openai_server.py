@@ -0,0 +1,179 @@
+"""
+Local OpenAI-compatible chat completions server for load tests.
+
+Streams canned responses with a configurable time-to-first-token and token
+rate, so research, query and chat runs can be measured without a provider:
+
+    python benchmarks/fake_openai_server.py --port 8100 --ttft-ms 400 --tokens-per-sec 80
+
+Point the benchmark user at it with api_url http://localhost:8100/v1.
+The response is picked from the system prompt: query analysis JSON, a
+solutions document for the research experts, or plain text for chat.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+QUERY_ANALYSIS = {
+    "Targeted User": "Drivers of semi-autonomous vehicles",
+    "Usage Scenario": "Long highway drives with the autopilot engaged",
+    "Requirement": ["attention monitoring", "multimodal alerts", "takeover readiness"],
+    "Query": "How can the cabin keep drivers attentive to the road?",
+}
+
+
+def _solution(index: int) -> Dict[str, Any]:
+    return {
+        "Title": f"Adaptive attention cue {index + 1}",
+        "Function": "Keeps the driver ready to take over without constant alarms",
+        "Technical Method": {
+            "Original": "Gaze tracking drives escalating visual and haptic cues",
+            "Iteration": ["Seat vibration patterns", "Peripheral ambient light"],
+        },
+        "Possible Results": {
+            "Original": {
+                "Task Performance": "Faster takeover in critical situations",
+                "User Experience": "Fewer false alarms than fixed timers",
+            },
+            "Iteration": [
+                {"Task Performance": "Shorter reaction time", "User Experience": "Less startling"}
+            ],
+        },
+        "Use Case": "A driver glancing at the phone for too long feels a short seat pulse",
+    }
+
+
+SOLUTIONS = {
+    "title": "Attention support for semi-autonomous driving",
+    "desc": "Cues that scale with the driver's measured attention",
+    "solutions": [_solution(i) for i in range(3)],
+}
+
+CHAT_REPLY = (
+    "This inspiration combines gaze tracking with escalating cues. A good next step is "
+    "to prototype the haptic pattern in a driving simulator and compare takeover times "
+    "against a fixed-interval reminder. Watch for alarm fatigue over long drives."
+)
+
+
+def pick_response(messages: List[Dict[str, Any]]) -> str:
+    system = " ".join(
+        str(m.get("content", "")) for m in messages if m.get("role") == "system"
+    )
+    if "critically analyze the given query" in system:
+        return json.dumps(QUERY_ANALYSIS, ensure_ascii=False)
+    if "running memory of a conversation" in system:
+        return "The user is exploring attention cues for semi-autonomous driving."
+    if "specialized in Human-Computer Interaction (HCI) research and design solutions" in system:
+        return CHAT_REPLY
+    return json.dumps(SOLUTIONS, ensure_ascii=False, indent=2)
+
+
+def split_tokens(text: str, chars_per_token: int) -> List[str]:
+    return [text[i : i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+
+def create_app(config: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    stats = {"requests": 0, "active": 0, "peak_active": 0}
+
+    def chunk(completion_id: str, model: str, delta: Dict[str, Any], finish=None, usage=None):
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+        if usage:
+            payload["usage"] = usage
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": config.model, "object": "model"}]}
+
+    @app.get("/stats")
+    async def server_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", config.model)
+        text = pick_response(body.get("messages", []))
+        tokens = split_tokens(text, config.chars_per_token)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        stats["requests"] += 1
+
+        def ttft() -> float:
+            jitter = config.ttft_ms * config.jitter * (random.random() * 2 - 1)
+            return max(0.0, config.ttft_ms + jitter) / 1000
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft() + len(tokens) / config.tokens_per_sec)
+            return JSONResponse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def stream():
+            stats["active"] += 1
+            stats["peak_active"] = max(stats["peak_active"], stats["active"])
+            try:
+                await asyncio.sleep(ttft())
+                yield chunk(completion_id, model, {"role": "assistant", "content": ""})
+                interval = 1 / config.tokens_per_sec
+                for token in tokens:
+                    yield chunk(completion_id, model, {"content": token})
+                    await asyncio.sleep(interval)
+                yield chunk(completion_id, model, {}, finish="stop")
+                if include_usage:
+                    yield chunk(completion_id, model, {}, usage=usage)
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["active"] -= 1
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible streaming server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--model", default="bench-model")
+    parser.add_argument("--ttft-ms", type=float, default=400, help="Time to first token")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Relative TTFT jitter")
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--chars-per-token", type=int, default=4)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,271 @@
+"""
+End-to-end load test for the query, research and inspiration chat endpoints.
+
+Each simulated client runs query -> research -> chat against a running
+backend over SSE and records how long every phase took. Start the fake
+model server and the API first (see benchmarks/README.md), then:
+
+    python benchmarks/load_test.py --clients 20 --rounds 2
+
+The benchmark user gets the fake server as its model endpoint, so no
+provider is called. Reports p50/p95/p99 per phase and the peak number of
+concurrent runs each API worker process reached.
+"""
+import argparse
+import ast
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+
+
+def parse_data(raw: str) -> Any:
+    """SSE data is JSON from the event log, or a Python repr for direct streams"""
+    try:
+        return json.loads(raw)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(raw)
+    except (ValueError, SyntaxError):
+        return raw
+
+
+class Recorder:
+    """Collects phase durations (in seconds) across all clients"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, phase: str, seconds: float):
+        self.samples[phase].append(seconds)
+
+    def error(self, phase: str):
+        self.errors[phase] += 1
+
+    def report(self) -> str:
+        lines = [f"{'phase':<36}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"]
+        for phase in sorted(self.samples):
+            values = sorted(self.samples[phase])
+            lines.append(
+                f"{phase:<36}{len(values):>6}"
+                + "".join(f"{percentile(values, p):>10.2f}" for p in (50, 95, 99))
+                + f"{values[-1]:>10.2f}"
+            )
+        for phase, count in sorted(self.errors.items()):
+            lines.append(f"errors in {phase}: {count}")
+        return "\n".join(lines)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[int(p) - 1]
+
+
+async def stream_events(
+    client: httpx.AsyncClient, path: str, payload: Dict[str, Any], headers: Dict[str, str]
+):
+    """Yield (event, data, elapsed) from an SSE POST; the first item is ("headers", status, t)"""
+    started = time.perf_counter()
+    async with client.stream("POST", path, json=payload, headers=headers) as response:
+        yield "headers", response.status_code, time.perf_counter() - started
+        response.raise_for_status()
+        event, data = "message", []
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].lstrip())
+            elif not line and data:
+                yield event, parse_data("\n".join(data)), time.perf_counter() - started
+                event, data = "message", []
+
+
+async def timed_run(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    name: str,
+    path: str,
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+) -> Tuple[Optional[Any], bool]:
+    """
+    Run one SSE request, recording connect, first chunk, each
+    node_complete and total time. Returns the last "result" payload (or the
+    persistence result for research) and whether the run succeeded.
+    """
+    headers = {**headers, "Idempotency-Key": uuid.uuid4().hex}
+    result, failed, first_chunk = None, False, False
+    try:
+        async for event, data, elapsed in stream_events(client, path, payload, headers):
+            if event == "headers":
+                recorder.add(f"{name}.connect", elapsed)
+            elif event == "chunk" and not first_chunk:
+                first_chunk = True
+                recorder.add(f"{name}.first_chunk", elapsed)
+            elif event == "node_complete" and isinstance(data, dict):
+                node = data.get("node")
+                recorder.add(f"{name}.node.{node}", elapsed)
+                if node == "persistence":
+                    result = data.get("result")
+            elif event == "result":
+                result = data
+            elif event in ("error", "cancelled"):
+                failed = True
+            elif event == "end":
+                break
+        recorder.add(f"{name}.total", elapsed)
+    except (httpx.HTTPError, asyncio.TimeoutError) as e:
+        print(f"{name} request failed: {e!r}")
+        failed = True
+    if failed:
+        recorder.error(name)
+    return result, not failed
+
+
+async def client_session(
+    index: int, args: argparse.Namespace, token: str, recorder: Recorder
+):
+    headers = {"Authorization": f"Bearer {token}"}
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    async with httpx.AsyncClient(base_url=args.api, timeout=timeout) as client:
+        for round_index in range(args.rounds):
+            query = args.query
+            if not args.same_query:
+                # Distinct queries keep the query cache from short-circuiting the run
+                query = f"{query} (client {index}, round {round_index})"
+            analysis, ok = await timed_run(
+                client, recorder, "query", "/api/query", {"query": query}, headers
+            )
+            if not ok or not isinstance(analysis, dict):
+                continue
+
+            final, ok = await timed_run(
+                client,
+                recorder,
+                "research",
+                "/api/research",
+                {
+                    "query": query,
+                    "query_analysis_result": analysis,
+                    "with_paper": args.with_paper,
+                    "with_example": args.with_example,
+                    "is_drawing": False,
+                    "mode": args.mode,
+                },
+                headers,
+            )
+            solutions = (final or {}).get("solutions") if isinstance(final, dict) else None
+            if not ok or not solutions or "_id" not in solutions[0]:
+                continue
+
+            await timed_run(
+                client,
+                recorder,
+                "chat",
+                "/api/inspiration/chat",
+                {
+                    "inspiration_id": solutions[0]["_id"],
+                    "new_message": "How could this be evaluated in a user study?",
+                    "session_id": None,
+                    "protocol": 2,
+                },
+                headers,
+            )
+
+
+async def setup_user(args: argparse.Namespace) -> str:
+    """Register (if needed) and log in the benchmark user, pointing it at the fake model server"""
+    async with httpx.AsyncClient(base_url=args.api, timeout=30) as client:
+        await client.post(
+            "/api/register",
+            json={
+                "email": args.email,
+                "name": "benchmark",
+                "password": args.password,
+                "user_type": "developer",
+            },
+        )
+        response = await client.post(
+            "/api/login", json={"email": args.email, "password": args.password}
+        )
+        response.raise_for_status()
+        token = response.json()["token"]
+        response = await client.post(
+            "/api/user/api_key",
+            json={"api_key": "sk-benchmark", "api_url": args.model_url, "model_name": args.model},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        response.raise_for_status()
+        return token
+
+
+async def poll_active_runs(args: argparse.Namespace, token: str, stop: asyncio.Event):
+    """Sample /api/metrics/runs; each sample lands on one API worker process"""
+    peaks: Dict[int, Dict[str, Any]] = {}
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=args.api, timeout=10) as client:
+        while not stop.is_set():
+            try:
+                response = await client.get("/api/metrics/runs", headers=headers)
+                if response.status_code == 200:
+                    stats = response.json()
+                    peaks[stats["pid"]] = stats
+            except httpx.HTTPError:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), args.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    return peaks
+
+
+async def main(args: argparse.Namespace):
+    token = await setup_user(args)
+    recorder = Recorder()
+    stop = asyncio.Event()
+    poller = asyncio.create_task(poll_active_runs(args, token, stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *[client_session(i, args, token, recorder) for i in range(args.clients)]
+    )
+    wall = time.perf_counter() - started
+    stop.set()
+    peaks = await poller
+
+    completed = len(recorder.samples.get("research.total", []))
+    print(f"\n{args.clients} clients x {args.rounds} rounds ({args.mode} mode) in {wall:.1f}s")
+    print(f"research runs: {completed} ({completed / wall * 60:.1f}/min)\n")
+    print(recorder.report())
+    if peaks:
+        print("\nPeak concurrent runs per API worker:")
+        for pid, stats in sorted(peaks.items()):
+            print(f"  pid {pid}: {stats['peak_total']} total, by kind {stats['peak']}")
+    else:
+        print("\nNo /api/metrics/runs samples (is the benchmark user a developer?)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="InnoWeaver end-to-end load test")
+    parser.add_argument("--api", default="http://localhost:5000")
+    parser.add_argument("--model-url", default="http://localhost:8100/v1")
+    parser.add_argument("--model", default="bench-model")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--query", default="Help drivers stay attentive in semi-autonomous cars")
+    parser.add_argument("--same-query", action="store_true", help="Let the query cache serve repeats")
+    parser.add_argument("--with-paper", action="store_true")
+    parser.add_argument("--with-example", action="store_true")
+    parser.add_argument("--mode", choices=["fast", "balanced", "thorough"], default="thorough")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--email", default="benchmark@innoweaver.local")
+    parser.add_argument("--password", default="benchmark-password")
+    asyncio.run(main(parser.parse_args()))
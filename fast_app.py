@@ -3,19 +3,32 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 from typing import Dict, List, Optional, Any
 from pydantic import BaseModel
-from fast_routes import auth_router, task_router, query_router, load_router, prompts_router
+from fast_routes import auth_router, task_router, query_router, load_router, prompts_router, metrics_router
 from utils.log import logger
 from utils.rate_limiter import rate_limit_middleware
 from utils.health_check import HealthCheck
+from utils.http_client import http_clients
+from utils.context_builder import preload_encoding
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Long-lived outbound HTTP clients, shared by every request in this worker
+    await http_clients.start()
+    # Token counting must not download its encoding on the event loop
+    await preload_encoding()
+    yield
+    await http_clients.aclose()
 
 app = FastAPI(
     title="InnoWeaver",
     description="InnoWeaver API - FastAPI Version",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan
 )
 
 # Configure static files and templates (must be before middleware)
@@ -47,6 +60,7 @@ app.include_router(task_router, prefix="/api")
 app.include_router(query_router, prefix="/api")
 app.include_router(load_router, prefix="/api")
 app.include_router(prompts_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
 
 # Request logging middleware
 @app.middleware("http")
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from utils.auth_utils import fastapi_token_required
 import utils.tasks as USER
 import utils.log as LOG
+from utils.run_metrics import run_metrics_stats
 from .utils import route_handler
 import json
 
@@ -97,3 +98,18 @@ async def get_log_stats(current_user: Dict[str, Any] = Depends(fastapi_token_req
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
 
+@load_router.get("/logs/run_metrics")
+@route_handler()
+async def get_run_metrics(
+    kind: Optional[str] = Query(default=None, description="research, query or chat"),
+    user_id: Optional[str] = Query(default=None),
+    days: int = Query(default=7, ge=1, le=90),
+    mode: Optional[str] = Query(default=None, description="research mode: fast, balanced or thorough"),
+    current_user: Dict[str, Any] = Depends(fastapi_token_required)
+):
+    """Get wall time, TTFT and token percentiles per node and per model"""
+    if current_user['user_type'] != 'developer':
+        raise HTTPException(status_code=403, detail='No permission to access this resource')
+    return await run_metrics_stats(kind, user_id, days, mode)
+
+
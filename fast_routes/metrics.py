@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, Any
+from utils.auth_utils import fastapi_token_required
+from utils.http_client import http_clients
+from utils.model_cache import model_cache
+from utils.llm_limiter import llm_limiters
+from utils.hedging import stream_hedger
+from utils.sse import sse_stats
+from utils.chat_context import chat_context_packs
+from utils.job_queue import job_queue
+from utils.idempotency import idempotency_keys
+from utils.run_metrics import active_runs
+from .utils import route_handler
+
+metrics_router = APIRouter()
+
+def _require_developer(current_user: Dict[str, Any]):
+    if current_user['user_type'] != 'developer':
+        raise HTTPException(status_code=403, detail='No permission to access this resource')
+
+@metrics_router.get("/metrics/http")
+@route_handler()
+async def http_pool_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Connection pool statistics of the outbound HTTP clients in this worker"""
+    _require_developer(current_user)
+    return http_clients.stats()
+
+@metrics_router.get("/metrics/models")
+@route_handler()
+async def model_cache_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Hit rate and size of the initialized chat model cache in this worker"""
+    _require_developer(current_user)
+    return model_cache.stats()
+
+@metrics_router.get("/metrics/llm_limits")
+@route_handler()
+async def llm_limit_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Current adaptive concurrency limit, in-flight calls and queue depth per provider"""
+    _require_developer(current_user)
+    return llm_limiters.stats()
+
+@metrics_router.get("/metrics/hedging")
+@route_handler()
+async def hedging_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Time-to-first-token percentiles, hedge rate and hedge wins per provider"""
+    _require_developer(current_user)
+    return stream_hedger.stats()
+
+@metrics_router.get("/metrics/sse")
+@route_handler()
+async def sse_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Chunk events, emitted chunk frames and frames saved by coalescing per endpoint"""
+    _require_developer(current_user)
+    return sse_stats.stats()
+
+@metrics_router.get("/metrics/chat_context")
+@route_handler()
+async def chat_context_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Hit rate of the per-solution chat context pack cache in this worker"""
+    _require_developer(current_user)
+    return chat_context_packs.stats()
+
+@metrics_router.get("/metrics/queue")
+@route_handler()
+async def job_queue_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Queued and running jobs of the worker pool, per consumer"""
+    _require_developer(current_user)
+    return await job_queue.stats()
+
+@metrics_router.get("/metrics/idempotency")
+@route_handler()
+async def idempotency_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Research and query requests attached to an existing run instead of starting one"""
+    _require_developer(current_user)
+    return idempotency_keys.stats()
+
+@metrics_router.get("/metrics/runs")
+@route_handler()
+async def active_run_metrics(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    """Runs executing in this worker process now and the most at once, per kind"""
+    _require_developer(current_user)
+    return active_runs.stats()
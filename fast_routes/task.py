@@ -5,10 +5,19 @@ from utils.rate_limiter import rate_limit_dependency
 import utils.tasks as USER
 # from utils.redis import redis_client, async_redis
 from pydantic import BaseModel
-from .utils import route_handler
+from .utils import (
+    route_handler,
+    event_stream_response,
+    single_flight_response,
+    start_logged_run,
+    run_event_stream_response,
+    last_event_id,
+)
 import json
 from utils.tasks.research import start_research
-import asyncio
+from utils.checkpoint import research_checkpoints
+from utils.config import RESEARCH_MODES
+from utils.run_events import run_events
 from sse_starlette.sse import EventSourceResponse
 
 task_router = APIRouter()
@@ -81,6 +90,24 @@ async def test_api_connection(
     result = await USER.test_api_connection(current_user, api_key, api_url, model_name)
     return result
 
+@task_router.post("/user/test_api/batch")
+@route_handler()
+async def test_api_candidates(
+    request: Request,
+    current_user: Dict[str, Any] = Depends(fastapi_token_required)
+):
+    data = await request.json()
+    api_key = data.get('api_key')
+    candidates = data.get('candidates', [])
+    
+    if not candidates or not isinstance(candidates, list):
+        raise HTTPException(status_code=400, detail="Candidates are required")
+    if not all(isinstance(candidate, dict) for candidate in candidates):
+        raise HTTPException(status_code=400, detail="Each candidate must be an object")
+    
+    result = await USER.test_api_candidates(current_user, api_key, candidates)
+    return result
+
 # ------------------------------------------------------------------------
 
 @task_router.post("/query")
@@ -95,45 +122,18 @@ async def query(
     query_text = data["query"]
     design_doc = data.get("design_doc", "")
 
-    async def event_generator():
-        queue: asyncio.Queue = asyncio.Queue()
-
-        async def send_event(event_type: str, payload: Any):
-            if await request.is_disconnected():
-                raise asyncio.CancelledError()
-            await queue.put({"event": event_type, "data": payload})
-
-        async def run_workflow():
-            try:
-                await USER.query(
-                    current_user=current_user,
-                    query_text=query_text,
-                    design_doc=design_doc,
-                    send_event=send_event
-                )
-            except asyncio.CancelledError:
-                print("query cancelled")
-                raise
-            except Exception as e:
-                await queue.put({"event": "error", "data": str(e)})
-            finally:
-                await queue.put({"event": "end", "data": "complete"})
-
-        task = asyncio.create_task(run_workflow())
-        try:
-            while True:
-                msg = await queue.get()
-                yield msg
-                if msg["event"] == "end":
-                    break
-        except asyncio.CancelledError:
-            task.cancel()
-            raise
-        finally:
-            if not task.done():
-                task.cancel()
-    
-    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+    return await single_flight_response(
+        request,
+        "query",
+        str(current_user["_id"]),
+        {"query_text": query_text, "design_doc": design_doc},
+        lambda run_id, send_event: USER.query(
+            current_user=current_user,
+            query_text=query_text,
+            design_doc=design_doc,
+            send_event=send_event
+        ),
+    )
 
 @task_router.post("/inspiration/chat")
 @route_handler()
@@ -145,47 +145,25 @@ async def inspiration_chat(
     inspiration_id = data.get("inspiration_id")
     new_message = data.get("new_message")
     chat_history = data.get("chat_history", [])
+    protocol = data.get("protocol")
+    # Clients that send session_id (null for a new chat) keep history server-side
+    use_session = "session_id" in data
+    session_id = data.get("session_id")
     
-    async def event_generator():
-        queue: asyncio.Queue = asyncio.Queue()
-
-        async def send_event(event_type: str, payload: Any):
-            if await request.is_disconnected():
-                raise asyncio.CancelledError()
-            await queue.put({"event": event_type, "data": payload})
-
-        async def run_workflow():
-            try:
-                await USER.handle_inspiration_chat(
-                    current_user=current_user,
-                    inspiration_id=inspiration_id,
-                    new_message=new_message,
-                    chat_history=chat_history,
-                    send_event=send_event
-                )
-            except asyncio.CancelledError:
-                print("inspiration_chat cancelled")
-                raise
-            except Exception as e:
-                await queue.put({"event": "error", "data": str(e)})
-            finally:
-                await queue.put({"event": "end", "data": "complete"})
-
-        task = asyncio.create_task(run_workflow())
-        try:
-            while True:
-                msg = await queue.get()
-                yield msg
-                if msg["event"] == "end":
-                    break
-        except asyncio.CancelledError:
-            task.cancel()
-            raise
-        finally:
-            if not task.done():
-                task.cancel()
-
-    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+    return event_stream_response(
+        request,
+        "inspiration_chat",
+        lambda send_event: USER.handle_inspiration_chat(
+            current_user=current_user,
+            inspiration_id=inspiration_id,
+            new_message=new_message,
+            chat_history=chat_history,
+            send_event=send_event,
+            protocol=protocol,
+            session_id=session_id,
+            use_session=use_session
+        ),
+    )
 
 @task_router.post("/research")
 @route_handler()
@@ -198,49 +176,117 @@ async def research(
     with_paper = data.get("with_paper", False)
     with_example = data.get("with_example", False)
     is_drawing = data.get("is_drawing", False)
+    persist_first = data.get("persist_first")
+    mode = data.get("mode") or RESEARCH_MODES["default"]
+    if mode not in RESEARCH_MODES["modes"]:
+        raise HTTPException(status_code=400, detail=f"Unknown research mode: {mode}")
     print("start research")
-    print(f"with_paper: {with_paper}, with_example: {with_example}, is_drawing: {is_drawing}")
-    
-    async def event_generator():
-        queue: asyncio.Queue = asyncio.Queue()
-
-        async def send_event(event_type: str, payload: Any):
-            if await request.is_disconnected():
-                raise asyncio.CancelledError()
-            # print(f"event: {event_type}, data: {payload}")
-            await queue.put({"event": event_type, "data": payload})
-
-        async def run_workflow():
-            try:
-                await start_research(
-                    current_user=current_user,
-                    query=query,
-                    query_analysis_result=query_analysis_result,
-                    with_paper=with_paper,
-                    with_example=with_example,
-                    is_drawing=is_drawing,
-                    send_event=send_event,
-                )
-            except asyncio.CancelledError:
-                print("research cancelled")
-                raise
-            except Exception as e:
-                await queue.put({"event": "error", "data": str(e)})
-            finally:
-                await queue.put({"event": "end", "data": "complete"})
-
-        task = asyncio.create_task(run_workflow())
-        try:
-            while True:
-                msg = await queue.get()
-                yield msg
-                if msg["event"] == "end":
-                    break
-        except asyncio.CancelledError:
-            task.cancel()
-            raise
-        finally:
-            if not task.done():
-                task.cancel()
-
-    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+    print(f"with_paper: {with_paper}, with_example: {with_example}, is_drawing: {is_drawing}, mode: {mode}")
+
+    research_kwargs = dict(
+        query=query,
+        query_analysis_result=query_analysis_result,
+        with_paper=with_paper,
+        with_example=with_example,
+        is_drawing=is_drawing,
+        persist_first=persist_first,
+        mode=mode,
+    )
+    return await single_flight_response(
+        request,
+        "research",
+        str(current_user["_id"]),
+        research_kwargs,
+        lambda run_id, send_event: start_research(
+            current_user=current_user, send_event=send_event, run_id=run_id, **research_kwargs
+        ),
+    )
+
+@task_router.post("/research/resume")
+@route_handler()
+async def resume_research(
+    request: Request, current_user: Dict[str, Any] = Depends(fastapi_token_required)
+):
+    data = await request.json()
+    run_id = data.get("run_id")
+    if not run_id:
+        raise HTTPException(status_code=400, detail="Missing run ID")
+
+    checkpoint = await research_checkpoints.load(run_id)
+    if not checkpoint:
+        raise HTTPException(status_code=404, detail="Research run not found or expired")
+    if checkpoint["user_id"] != str(current_user["_id"]):
+        raise HTTPException(status_code=403, detail="No permission to access this resource")
+
+    if not await run_events.claim_restart(run_id):
+        # Still running, its job will be reclaimed, or another resume just
+        # restarted it: reattach instead of starting it a second time
+        return run_event_stream_response(request, run_id, last_event_id(request, data) or "0-0")
+
+    state = checkpoint["state"]
+    print(f"resume research {run_id}")
+
+    return await _research_response(
+        request,
+        last_id=last_event_id(request, data) or await run_events.last_id(run_id),
+        current_user=current_user,
+        query=state.get("query"),
+        query_analysis_result=state.get("query_analysis_result"),
+        with_paper=state.get("with_paper", False),
+        with_example=state.get("with_example", False),
+        is_drawing=state.get("is_drawing", False),
+        persist_first=state.get("persist_first"),
+        mode=state.get("mode"),
+        run_id=run_id,
+    )
+
+@task_router.post("/research/attach")
+@route_handler()
+async def attach_research(
+    request: Request, current_user: Dict[str, Any] = Depends(fastapi_token_required)
+):
+    """Replay a run's events after Last-Event-ID and follow it; any number of tabs may attach"""
+    data = await request.json()
+    run_id = await _owned_run(data, current_user)
+    if not await run_events.exists(run_id):
+        raise HTTPException(status_code=404, detail="Research run not found or expired")
+    return run_event_stream_response(request, run_id, last_event_id(request, data) or "0-0")
+
+@task_router.post("/research/cancel")
+@route_handler()
+async def cancel_research(
+    request: Request, current_user: Dict[str, Any] = Depends(fastapi_token_required)
+):
+    data = await request.json()
+    run_id = await _owned_run(data, current_user)
+    await run_events.request_cancel(run_id)
+    return {"run_id": run_id, "status": "cancelling"}
+
+async def _owned_run(data: Dict[str, Any], current_user: Dict[str, Any]) -> str:
+    run_id = data.get("run_id")
+    if not run_id:
+        raise HTTPException(status_code=400, detail="Missing run ID")
+    owner = await run_events.owner(run_id)
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Research run not found or expired")
+    if owner != str(current_user["_id"]):
+        raise HTTPException(status_code=403, detail="No permission to access this resource")
+    return run_id
+
+async def _research_response(
+    request: Request,
+    current_user: Dict[str, Any],
+    run_id: str,
+    last_id: str = "0-0",
+    **research_kwargs
+) -> EventSourceResponse:
+    await start_logged_run(
+        "research",
+        run_id,
+        str(current_user["_id"]),
+        lambda send_event: start_research(
+            current_user=current_user, send_event=send_event, run_id=run_id, **research_kwargs
+        ),
+        research_kwargs,
+    )
+    return run_event_stream_response(request, run_id, last_id)
@@ -1,6 +1,16 @@
 from functools import wraps
-from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import HTTPException, Request
+from sse_starlette.sse import EventSourceResponse
+from utils.sse import ChunkCoalescer, DisconnectCheck, sse_stats
+from utils.job_queue import job_queue
+from utils.run_events import RunStalled, run_events, start_background_run
+from utils.idempotency import idempotency_keys
+from utils.run_metrics import active_runs
+from utils.config import JOB_QUEUE
 import utils.log as LOG
+import asyncio
+import uuid
 
 def route_handler():
     def decorator(func):
@@ -15,4 +25,121 @@ def route_handler():
                 LOG.logger.error(f"Error in {func.__name__}: {str(e)}")
                 raise HTTPException(status_code=500, detail=str(e))
         return wrapper
-    return decorator 
\ No newline at end of file
+    return decorator
+
+SendEvent = Callable[[str, Any], Awaitable[None]]
+
+def event_stream_response(
+    request: Request,
+    endpoint: str,
+    workflow: Callable[[SendEvent], Awaitable[Any]],
+) -> EventSourceResponse:
+    """
+    Run `workflow(send_event)` in a task and stream its events over SSE.
+    Token chunks are coalesced per the endpoint's window, the stream always
+    ends with an "end" event, and a client disconnect cancels the workflow.
+    """
+    async def event_generator():
+        queue: asyncio.Queue = asyncio.Queue()
+        coalescer = ChunkCoalescer(endpoint, queue.put_nowait, sse_stats)
+        disconnected = DisconnectCheck(request, coalescer.window)
+
+        async def send_event(event_type: str, payload: Any):
+            if await disconnected(force=event_type != "chunk"):
+                raise asyncio.CancelledError()
+            coalescer.send(event_type, payload)
+
+        async def run_workflow():
+            try:
+                with active_runs.track(endpoint):
+                    await workflow(send_event)
+            except asyncio.CancelledError:
+                print(f"{endpoint} cancelled")
+                raise
+            except Exception as e:
+                coalescer.send("error", str(e))
+            finally:
+                coalescer.send("end", "complete")
+
+        task = asyncio.create_task(run_workflow())
+        try:
+            while True:
+                msg = await queue.get()
+                yield msg
+                if msg["event"] == "end":
+                    break
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            coalescer.flush()
+            if not task.done():
+                task.cancel()
+
+    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+
+async def start_logged_run(
+    endpoint: str,
+    run_id: str,
+    user_id: str,
+    workflow: Callable[[SendEvent], Awaitable[Any]],
+    payload: dict,
+):
+    """
+    Start a run whose events go to its event log: on the worker pool when
+    the endpoint is queued, otherwise in a background task of this process.
+    """
+    await run_events.create(run_id, user_id)
+    if job_queue.handles(endpoint):
+        await run_events.publish(run_id, "queued", {"run_id": run_id})
+        await run_events.mark_queued(run_id)
+        await job_queue.enqueue(endpoint, run_id, user_id, payload)
+    else:
+        start_background_run(endpoint, run_id, workflow)
+
+async def single_flight_response(
+    request: Request,
+    endpoint: str,
+    user_id: str,
+    payload: dict,
+    workflow: Callable[[str, SendEvent], Awaitable[Any]],
+) -> EventSourceResponse:
+    """
+    Start a logged run for `workflow(run_id, send_event)` unless the same
+    request (by Idempotency-Key header or payload) already started one, in
+    which case this response replays and follows that run instead.
+    """
+    run_id = uuid.uuid4().hex
+    existing = await idempotency_keys.claim(
+        endpoint, user_id, payload, run_id, request.headers.get("idempotency-key")
+    )
+    if existing:
+        return run_event_stream_response(request, existing, last_event_id(request) or "0-0")
+
+    await start_logged_run(
+        endpoint, run_id, user_id, lambda send_event: workflow(run_id, send_event), payload
+    )
+    return run_event_stream_response(request, run_id)
+
+def last_event_id(request: Request, data: Optional[dict] = None) -> Optional[str]:
+    return request.headers.get("last-event-id") or (data or {}).get("last_event_id")
+
+def run_event_stream_response(request: Request, run_id: str, last_id: str = "0-0") -> EventSourceResponse:
+    """
+    Replay the run's event log after `last_id` and follow it until "end".
+    Disconnecting only stops this relay; the run itself keeps going.
+    """
+    async def event_generator():
+        try:
+            async for event_id, event_type, data in run_events.subscribe(
+                run_id, last_id, start_timeout=JOB_QUEUE["start_timeout"]
+            ):
+                yield {"id": event_id, "event": event_type, "data": data}
+                if event_type == "end":
+                    break
+        except RunStalled as e:
+            LOG.logger.error(str(e))
+            yield {"event": "error", "data": "Run stopped unexpectedly, please resume it"}
+            yield {"event": "end", "data": "complete"}
+
+    return EventSourceResponse(event_generator(), media_type="text/event-stream")
@@ -58,6 +58,8 @@ const GenerateSolution = () => {
   const [selectedMode, setSelectedMode] = useState('chat');
   const [selectedIds, setSelectedIds] = useState<string[]>([]);
   const [drawMode, setDrawMode] = useState(false);
+  // Research quality level: fast (one pass), balanced (two) or thorough (three)
+  const [researchMode, setResearchMode] = useState('thorough');
   const [viewingFile, setViewingFile] = useState<File | null>(null);
 
   // Messages and analysis
@@ -96,7 +98,7 @@ const GenerateSolution = () => {
   const apiUrl = process.env.API_URL;
 
   // Initialize SSE hooks
-  const { connectionState: sseConnectionState, connect: connectSSE, disconnect: disconnectSSE } = useResearchSSE({
+  const { connectionState: sseConnectionState, connect: connectSSE, disconnect: disconnectSSE, cancel: cancelSSE } = useResearchSSE({
     url: `${apiUrl}/api/research`,
     maxReconnectAttempts: 5,
     reconnectInterval: 1000,
@@ -106,6 +108,17 @@ const GenerateSolution = () => {
     messageTimeout: 60000,
   });
 
+  // Images of a saved persist-first research arrive on their own run
+  const { attach: attachImagesSSE, disconnect: disconnectImagesSSE } = useResearchSSE({
+    url: `${apiUrl}/api/research`,
+    maxReconnectAttempts: 5,
+    reconnectInterval: 1000,
+    maxReconnectInterval: 30000,
+    heartbeatInterval: 30000,
+    connectionTimeout: 10000,
+    messageTimeout: 120000,
+  });
+
   const { connectionState: querySSEConnectionState, connect: connectQuerySSE, disconnect: disconnectQuerySSE } = useQuerySSE({
     url: `${apiUrl}/api/query`,
   });
@@ -400,9 +413,36 @@ const GenerateSolution = () => {
     }
   };
 
+  // Images run event handler; replays only patch the same images again
+  const handleImagesEvent = (eventType: string, data: any) => {
+    switch (eventType) {
+      case 'image_ready':
+        handleSSEEvent(eventType, data);
+        break;
+      case 'error': {
+        const errorMsg = typeof data === 'string' ? data : JSON.stringify(data);
+        setMessages(prev => [...prev, {
+          type: 'system' as const,
+          content: `Image generation error: ${errorMsg}`
+        }]);
+        break;
+      }
+    }
+  };
+
   // SSE event handler
   const handleSSEEvent = (eventType: string, data: any) => {
     switch (eventType) {
+      case 'replay': {
+        // Reattached from the start of the run; its events arrive again
+        setResearchState(prev => ({
+          ...prev,
+          progress: 0,
+          streamingContent: '',
+          results: {}
+        }));
+        break;
+      }
       case 'chunk': {
         const text = data?.text ? String(data.text) : String(data);
         setResearchState(prev => ({
@@ -444,6 +484,7 @@ const GenerateSolution = () => {
                 newResults.iteratedSolution = data.result;
                 break;
               case 'evaluation':
+              case 'single_pass':
               case 'persistence':
                 newResults.finalSolution = data.result;
                 break;
@@ -453,6 +494,37 @@ const GenerateSolution = () => {
         }
         break;
       }
+      case 'image_ready': {
+        // Persist-first runs: patch the image into the saved solution
+        if (data?.solution_id && data?.image_url) {
+          setResearchState(prev => {
+            const finalSolution = prev.results.finalSolution;
+            if (!finalSolution?.solutions) return prev;
+            const solutions = finalSolution.solutions.map((item: any) =>
+              item?._id === data.solution_id
+                ? { ...item, solution: { ...item.solution, image_url: data.image_url, image_name: data.image_name } }
+                : item
+            );
+            return { ...prev, results: { ...prev.results, finalSolution: { ...finalSolution, solutions } } };
+          });
+        }
+        break;
+      }
+      case 'images_pending': {
+        // The research ends once saved; follow the images generated for it
+        if (data?.run_id) {
+          attachImagesSSE(data.run_id, handleImagesEvent);
+        }
+        break;
+      }
+      case 'shortcut': {
+        // A step was skipped or simplified to finish within the time budget
+        setMessages(prev => [...prev, {
+          type: 'system' as const,
+          content: `Time budget: ${data?.node} ${data?.action === 'skipped' ? 'skipped' : `ran ${data?.action}`} (${data?.reason})`
+        }]);
+        break;
+      }
       case 'error': {
         const errorMsg = typeof data === 'string' ? data : JSON.stringify(data);
         setMessages(prev => [...prev, {
@@ -522,9 +594,11 @@ const GenerateSolution = () => {
       query_analysis_result: analysisResult,
       with_paper: selectedMode === "paper",
       with_example: selectedMode === "inspiration",
-      is_drawing: drawMode
+      is_drawing: drawMode,
+      mode: researchMode
     };
 
+    disconnectImagesSSE();
     try {
       await connectSSE(payload, handleSSEEvent);
     } catch (error: any) {
@@ -553,7 +627,7 @@ const GenerateSolution = () => {
 
   // Stop research
   const stopResearch = () => {
-    disconnectSSE();
+    cancelSSE();
     setResearchState(prev => ({
       ...prev,
       isLoading: false,
@@ -707,12 +781,13 @@ const GenerateSolution = () => {
   useEffect(() => {
     return () => {
       disconnectSSE();
+      disconnectImagesSSE();
       disconnectQuerySSE();
       if (timerRef.current) {
         clearInterval(timerRef.current);
       }
     };
-  }, [disconnectSSE, disconnectQuerySSE]);
+  }, [disconnectSSE, disconnectImagesSSE, disconnectQuerySSE]);
 
   return (
     <div className='flex justify-center bg-primary text-text-primary min-h-full transition-colors duration-300'>
@@ -884,6 +959,18 @@ const GenerateSolution = () => {
                         PDF, Word, TXT, Markdown files (max 10MB each)
                       </div>
 
+                      <select
+                        className='px-3 py-1.5 text-xs rounded-lg bg-gray-200/10 text-gray-400 font-medium
+                          transition-colors hover:bg-gray-200/20 focus:outline-none focus:ring-2 focus:ring-blue-500/50'
+                        value={researchMode}
+                        onChange={(e) => setResearchMode(e.target.value)}
+                        title="Research quality: fast is a single pass, thorough runs every expert"
+                      >
+                        <option value="fast">Fast</option>
+                        <option value="balanced">Balanced</option>
+                        <option value="thorough">Thorough</option>
+                      </select>
+
                       {isDeveloper && (
                         <button
                           className={`px-3 py-1.5 text-xs rounded-lg font-medium transition-colors duration-200 ${drawMode
@@ -4,7 +4,7 @@ import { motion, AnimatePresence } from "framer-motion";
 import { useToast } from "@/components/ui/toast";
 import useAuthStore from "@/lib/hooks/auth-store";
 import { logger } from "@/lib/logger";
-import { useChatSSE } from "@/lib/hooks/useChatSSE";
+import { useChatSSE, CHAT_PROTOCOL_VERSION } from "@/lib/hooks/useChatSSE";
 
 // Define a clear type for messages
 interface Message {
@@ -29,6 +29,11 @@ const ChatPopup = ({ isOpen, onClose, onMinimize, inspirationId, solution }: Cha
     const [streamingContent, setStreamingContent] = useState("");
     const { toast } = useToast();
     const messagesEndRef = useRef<HTMLDivElement>(null);
+    const lastSeqRef = useRef(-1);
+    // Reply assembled from protocol 2 deltas
+    const streamedRef = useRef("");
+    // Server-side chat session; null until the server assigns one
+    const sessionIdRef = useRef<string | null>(null);
     const { apiKey } = useAuthStore();
 
     // Instantiate the SSE hook
@@ -42,6 +47,11 @@ const ChatPopup = ({ isOpen, onClose, onMinimize, inspirationId, solution }: Cha
 
     useEffect(scrollToBottom, [messages, streamingContent]);
 
+    // A different inspiration starts a new server-side session
+    useEffect(() => {
+        sessionIdRef.current = null;
+    }, [inspirationId]);
+
     // Effect to set the initial welcome message
     useEffect(() => {
         if (solution && messages.length === 0) {
@@ -56,22 +66,40 @@ const ChatPopup = ({ isOpen, onClose, onMinimize, inspirationId, solution }: Cha
     // Define the event handler for SSE messages
     const handleSSEEvent = (eventType: string, data: any) => {
         switch (eventType) {
+            case 'session':
+                if (data.session_id) {
+                    sessionIdRef.current = data.session_id;
+                }
+                break;
+
             case 'chunk':
                 if (data.content) {
                     setStreamingContent(data.content);
+                } else if (typeof data.delta === 'string') {
+                    // Protocol 2: append deltas, skipping replayed sequence numbers
+                    if (typeof data.seq === 'number') {
+                        if (data.seq <= lastSeqRef.current) break;
+                        lastSeqRef.current = data.seq;
+                    }
+                    streamedRef.current += data.delta;
+                    setStreamingContent(streamedRef.current);
                 }
                 break;
 
-            case 'result':
-                if (data.content) {
+            case 'result': {
+                // Prefer the server's full reply over what the deltas built
+                const content = data.content || streamedRef.current;
+                if (content) {
                     setMessages(prev => [
                         ...prev,
-                        { type: 'bot', content: data.content, timestamp: Date.now() }
+                        { type: 'bot', content, timestamp: Date.now() }
                     ]);
                 }
+                streamedRef.current = "";
                 setStreamingContent("");
                 setIsLoading(false);
                 break;
+            }
 
             case 'error':
                 toast({
@@ -114,21 +142,19 @@ const ChatPopup = ({ isOpen, onClose, onMinimize, inspirationId, solution }: Cha
             status: 'sent',
         };
 
-        const messageHistory = messages.map(msg => ({
-            role: msg.type === 'user' ? 'user' as const : 'assistant' as const,
-            content: msg.content
-        }));
-
         setMessages(prev => [...prev, userMessage]);
         const currentInput = inputMessage;
         setInputMessage('');
         setIsLoading(true);
         setStreamingContent("");
+        lastSeqRef.current = -1;
+        streamedRef.current = "";
 
         const payload = {
             inspiration_id: inspirationId,
             new_message: currentInput,
-            chat_history: messageHistory,
+            session_id: sessionIdRef.current,
+            protocol: CHAT_PROTOCOL_VERSION,
         };
 
         await connect(payload, handleSSEEvent);
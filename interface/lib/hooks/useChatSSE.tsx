@@ -29,6 +29,13 @@ interface SSEState {
  */
 type SSEEventHandler = (eventType: string, data: any) => void;
 
+/**
+ * Streaming protocol version requested from the chat API.
+ * Version 2 chunks carry only `delta` and `seq`; the full reply is sent once in
+ * `result` (`content`, `done`).
+ */
+export const CHAT_PROTOCOL_VERSION = 2;
+
 // Default configuration settings
 const DEFAULT_CONFIG: Required<SSEConfig> = {
     url: '/api/inspiration/chat', // Default chat API endpoint
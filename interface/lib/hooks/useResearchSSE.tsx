@@ -54,6 +54,13 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
     const currentPayloadRef = useRef<any>(null);
     const eventHandlerRef = useRef<SSEEventHandler | null>(null);
 
+    // Run being followed and the id of its last received event;
+    // reconnects attach to the run and replay from there instead of restarting it
+    const runIdRef = useRef<string | null>(null);
+    const lastEventIdRef = useRef<string | null>(null);
+    // Whether anything of the followed run has been handed to the caller yet
+    const receivedRef = useRef(false);
+
     const cleanup = useCallback(() => {
         // Clear all timers
         [reconnectTimerRef, heartbeatTimerRef, connectionTimeoutRef, messageTimeoutRef].forEach(timer => {
@@ -174,7 +181,7 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
     }, [sseConfig.messageTimeout]);
 
 
-    const connectSSERef = useRef<((payload: any, onEvent: SSEEventHandler) => Promise<void>) | null>(null);
+    const connectSSERef = useRef<((payload: any, onEvent: SSEEventHandler, reattach?: boolean) => Promise<void>) | null>(null);
 
     // Effect to handle reconnection scheduling
     useEffect(() => {
@@ -185,18 +192,24 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
 
             reconnectTimerRef.current = setTimeout(() => {
                 if (currentPayloadRef.current && eventHandlerRef.current && connectSSERef.current) {
-                    connectSSERef.current(currentPayloadRef.current, eventHandlerRef.current);
+                    connectSSERef.current(currentPayloadRef.current, eventHandlerRef.current, true);
                 }
             }, delay);
         }
     }, [connectionState.isConnecting, connectionState.reconnectAttempts, calculateReconnectDelay]);
 
     // Main connection function
-    const connectSSE = useCallback(async (payload: any, onEvent: SSEEventHandler) => {
+    const connectSSE = useCallback(async (payload: any, onEvent: SSEEventHandler, reattach: boolean = false) => {
         cleanup();
 
         currentPayloadRef.current = payload;
         eventHandlerRef.current = onEvent;
+        if (!reattach) {
+            runIdRef.current = null;
+            lastEventIdRef.current = null;
+            receivedRef.current = false;
+        }
+        const attaching = reattach && runIdRef.current !== null;
 
         setConnectionState(prev => ({
             ...prev,
@@ -229,14 +242,23 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
         try {
             const { fetchEventSource } = await import('@microsoft/fetch-event-source');
 
-            await fetchEventSource(sseConfig.url, {
+            const headers: Record<string, string> = {
+                'Content-Type': 'application/json',
+                Authorization: `Bearer ${localStorage.getItem('token') ?? ''}`,
+                Accept: 'text/event-stream',
+            };
+            if (attaching && lastEventIdRef.current) {
+                headers['Last-Event-ID'] = lastEventIdRef.current;
+            } else if (attaching && receivedRef.current) {
+                // The run is replayed from its first event: drop what was accumulated
+                onEvent('replay', { run_id: runIdRef.current });
+            }
+            let finished = false;
+
+            await fetchEventSource(attaching ? `${sseConfig.url}/attach` : sseConfig.url, {
                 method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    Authorization: `Bearer ${localStorage.getItem('token') ?? ''}`,
-                    Accept: 'text/event-stream',
-                },
-                body: JSON.stringify(payload),
+                headers,
+                body: JSON.stringify(attaching ? { run_id: runIdRef.current } : payload),
                 signal: abortController.signal,
 
                 onopen: async (response) => {
@@ -270,6 +292,9 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
 
                     const eventType = msg.event || 'chunk';
                     let eventData: any = msg.data;
+                    if (msg.id) {
+                        lastEventIdRef.current = msg.id;
+                    }
 
                     // Safe JSON parsing
                     if (typeof eventData === 'string' && eventData.trim()) {
@@ -280,6 +305,14 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
                         }
                     }
 
+                    if ((eventType === 'run' || eventType === 'queued') && eventData?.run_id) {
+                        runIdRef.current = eventData.run_id;
+                    }
+                    if (eventType === 'end') {
+                        finished = true;
+                    }
+
+                    receivedRef.current = true;
                     try {
                         onEvent(eventType, eventData);
                     } catch (handlerError) {
@@ -304,12 +337,17 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
                 },
 
                 onclose: () => {
+                    if (!finished) {
+                        // Dropped mid-run: reconnect through onerror and reattach
+                        throw new Error('Connection closed before the run finished');
+                    }
                     console.log('SSE: Connection closed');
                     setConnectionState(prev => ({
                         ...prev,
                         isConnected: false,
                         isConnecting: false
                     }));
+                    abortController.abort();
                 },
 
                 openWhenHidden: true,
@@ -351,6 +389,36 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
         }));
     }, [cleanup]);
 
+    // Follow a run started elsewhere (e.g. the images of a saved research) from its first event
+    const attach = useCallback(async (runId: string, onEvent: SSEEventHandler) => {
+        cleanup();
+        runIdRef.current = runId;
+        lastEventIdRef.current = null;
+        receivedRef.current = false;
+        await connectSSE({ run_id: runId }, onEvent, true);
+    }, [cleanup, connectSSE]);
+
+    // Stop the run on the server, then disconnect
+    const cancel = useCallback(async () => {
+        const runId = runIdRef.current;
+        disconnect();
+        if (!runId) {
+            return;
+        }
+        try {
+            await fetch(`${sseConfig.url}/cancel`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    Authorization: `Bearer ${localStorage.getItem('token') ?? ''}`,
+                },
+                body: JSON.stringify({ run_id: runId }),
+            });
+        } catch (error) {
+            console.error('SSE: Failed to cancel run:', error);
+        }
+    }, [sseConfig.url, disconnect]);
+
     // Cleanup on unmount
     useEffect(() => {
         return () => {
@@ -362,6 +430,8 @@ export const useResearchSSE = (config: Partial<SSEConfig> = {}) => {
     return useMemo(() => ({
         connectionState,
         connect: connectSSE,
-        disconnect
-    }), [connectionState, connectSSE, disconnect]);
+        attach,
+        disconnect,
+        cancel
+    }), [connectionState, connectSSE, attach, disconnect, cancel]);
 };
@@ -0,0 +1,147 @@
+"""
+Worker process for queued research and query runs.
+
+Reads jobs from the Redis Streams queue, runs them and publishes their
+events to the per-run event log that the web workers relay over SSE.
+Start as many processes (on as many nodes) as needed:
+
+    JOB_QUEUE_ENABLED=true python research_worker.py --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import time
+from typing import Any, Dict
+from bson.objectid import ObjectId
+from utils.config import JOB_QUEUE
+from utils.context_builder import preload_encoding
+from utils.db import users_collection
+from utils.http_client import http_clients
+from utils.job_queue import job_queue
+from utils.run_events import run_events, run_logged, wait_background_runs
+from utils.tasks.research import start_research
+import utils.tasks as USER
+import utils.log as LOG
+
+
+def _workflow(job: Dict[str, Any]):
+    payload = job["payload"]
+
+    async def workflow(send_event):
+        current_user = await users_collection.find_one({"_id": ObjectId(job["user_id"])})
+        if not current_user:
+            raise ValueError("User not found")
+        if job["kind"] == "research":
+            await start_research(
+                current_user=current_user,
+                send_event=send_event,
+                run_id=job["run_id"],
+                # From the claim: a job reclaimed from a crashed worker, or one
+                # that waited out a backlog, still gets its full time budget
+                started_at=job["claimed_at"],
+                **payload,
+            )
+        elif job["kind"] == "query":
+            await USER.query(current_user=current_user, send_event=send_event, **payload)
+        else:
+            raise ValueError(f"Unknown job kind: {job['kind']}")
+
+    return workflow
+
+
+async def run_job(job: Dict[str, Any]):
+    run_id = job["run_id"]
+    if await run_events.cancelled(run_id):
+        LOG.logger.info(f"Skipping {job['kind']} run {run_id}, cancelled before start")
+        await run_events.publish(run_id, "cancelled", {"run_id": run_id})
+        await run_events.publish(run_id, "end", "complete")
+        await run_events.mark_done(run_id, "cancelled")
+        return
+    await run_logged(job["kind"], run_id, _workflow(job))
+
+
+class Worker:
+    """Keeps up to `concurrency` jobs running and acknowledges them when done"""
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.running: Dict[str, asyncio.Task] = {}
+        self.stopping = asyncio.Event()
+
+    async def _handle(self, job: Dict[str, Any]):
+        started = job["claimed_at"] = time.time()
+        LOG.logger.info(
+            f"Worker {self.name} starting {job['kind']} run {job['run_id']} "
+            f"after {started - job['enqueued_at']:.1f}s in queue"
+        )
+        try:
+            await run_job(job)
+        finally:
+            await job_queue.ack(job["id"])
+            LOG.logger.info(
+                f"Worker {self.name} finished {job['kind']} run {job['run_id']} "
+                f"in {time.time() - started:.1f}s"
+            )
+
+    async def _heartbeat(self):
+        while not self.stopping.is_set():
+            try:
+                await job_queue.heartbeat(self.name, list(self.running))
+            except Exception as e:
+                LOG.logger.error(f"Worker heartbeat failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self.stopping.wait(), JOB_QUEUE["heartbeat"])
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        await job_queue.ensure_group()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        print(f"Worker {self.name} waiting for jobs (concurrency {self.concurrency})")
+        while not self.stopping.is_set():
+            free = self.concurrency - len(self.running)
+            if free <= 0:
+                await asyncio.wait(self.running.values(), return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                jobs = await job_queue.read(self.name, free)
+            except Exception as e:
+                LOG.logger.error(f"Failed to read jobs: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            for job in jobs:
+                task = asyncio.create_task(self._handle(job))
+                self.running[job["id"]] = task
+                task.add_done_callback(lambda _, job_id=job["id"]: self.running.pop(job_id, None))
+
+        # Let running jobs finish; unacknowledged ones are reclaimed by other workers
+        if self.running:
+            print(f"Worker {self.name} draining {len(self.running)} running jobs")
+            await asyncio.wait(self.running.values())
+        # Image runs of persist-first jobs outlive their job
+        await wait_background_runs()
+        heartbeat.cancel()
+
+
+async def main(name: str, concurrency: int):
+    await http_clients.start()
+    await preload_encoding()
+    worker = Worker(name, concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stopping.set)
+    try:
+        await worker.run()
+    finally:
+        await http_clients.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="InnoWeaver research worker")
+    parser.add_argument("--concurrency", type=int, default=JOB_QUEUE["concurrency"])
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}")
+    args = parser.parse_args()
+    asyncio.run(main(args.name, args.concurrency))
@@ -0,0 +1,74 @@
+"""
+Import-time profile of the API (or the research worker).
+
+Runs `python -X importtime -c "import fast_app"` in a fresh interpreter,
+prints the slowest modules and exits with status 1 when the total goes over
+the budget or a module that should load lazily was imported at startup:
+
+    python scripts/import_profile.py --budget-ms 2000
+    python scripts/import_profile.py --module research_worker --top 30
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed on some code paths; importing them at startup is a regression
+LAZY_MODULES = ["chromadb", "dashscope", "IPython", "flask", "PIL", "langchain.chat_models"]
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module: str) -> List[Tuple[str, int, int, int]]:
+    """(name, self_us, cumulative_us, depth) for every module the import loaded"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit(f"Importing {module} failed")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def main(args: argparse.Namespace) -> int:
+    entries = profile(args.module)
+    cumulative: Dict[str, int] = {name: total for name, _, total, _ in entries}
+    total_ms = cumulative.get(args.module, 0) / 1000
+
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for name, self_us, total_us, depth in sorted(entries, key=lambda e: -e[2])[: args.top]:
+        print(f"{total_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {'  ' * depth}{name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in cumulative]
+    if eager:
+        print(f"\nImported at startup but expected to load lazily: {', '.join(eager)}")
+        failed = True
+    print(f"\nimport {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if total_ms > args.budget_ms:
+        print("Over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--module", default="fast_app")
+    parser.add_argument(
+        "--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", 2500))
+    )
+    parser.add_argument("--top", type=int, default=20)
+    sys.exit(main(parser.parse_args()))
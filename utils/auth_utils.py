@@ -1,14 +1,15 @@
 from functools import wraps
-from flask import request, jsonify
 import utils.tasks as USER
 from fastapi import HTTPException, Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, Union, Any
 from .config import API
 
+# Flask versions of the decorators; Flask is imported on use so the FastAPI app never loads it
 def token_required(f):
     @wraps(f)
     async def decorated(*args, **kwargs):
+        from flask import request, jsonify
         token = None
         if 'Authorization' in request.headers:
             token = request.headers['Authorization'].split(" ")[1]
@@ -24,6 +25,7 @@ def validate_input(fields):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            from flask import request, jsonify
             data = request.json
             for field in fields:
                 if field not in data or not data[field]:
@@ -0,0 +1,117 @@
+import json
+from typing import Any, Dict, Iterable, Optional
+from bson.objectid import ObjectId
+from .config import CHAT_CONTEXT
+from .db import solutions_collection, papers_collection, papers_cited_collection
+from .redis import async_redis
+from .log import logger
+
+# Solution fields that only matter for display or bookkeeping
+SKIPPED_SOLUTION_FIELDS = {"image_url", "image_name"}
+
+# Paper fields tried in order for the digest of a cited paper
+PAPER_DIGEST_FIELDS = ["Abstract", "Target Definition", "Contributions", "Results"]
+
+
+class ChatContextPacks:
+    """
+    Precomputed chat context per solution: the solution itself plus short
+    digests of the papers it cites. Packs are cached in Redis, shared by all
+    turns and users, and invalidated whenever the solution changes.
+    """
+
+    prefix = "innoweaver:chat:context"
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, solution_id: str) -> str:
+        return f"{self.prefix}:{solution_id}"
+
+    async def get(self, solution_id: str) -> Optional[str]:
+        if not self.config["enabled"]:
+            return await self.build(solution_id)
+        try:
+            cached = await async_redis.get(self._key(solution_id))
+        except Exception as e:
+            logger.error(f"Chat context cache read failed: {str(e)}")
+            cached = None
+        if cached:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        pack = await self.build(solution_id)
+        if pack:
+            try:
+                await async_redis.setex(self._key(solution_id), self.config["expire"], pack)
+            except Exception as e:
+                logger.error(f"Chat context cache write failed: {str(e)}")
+        return pack
+
+    async def build(self, solution_id: str) -> Optional[str]:
+        try:
+            solution_oid = ObjectId(solution_id)
+        except Exception:
+            return None
+        document = await solutions_collection.find_one(
+            {"_id": solution_oid}, {"solution": 1, "query": 1}
+        )
+        if not document:
+            return None
+
+        relations = await papers_cited_collection.find(
+            {"solution_id": solution_oid}, {"paper_id": 1}
+        ).to_list(None)
+        paper_ids = list(dict.fromkeys(r["paper_id"] for r in relations))[: self.config["max_papers"]]
+        papers = []
+        if paper_ids:
+            projection = {"Title": 1, **{field: 1 for field in PAPER_DIGEST_FIELDS}}
+            papers = await papers_collection.find({"_id": {"$in": paper_ids}}, projection).to_list(None)
+
+        solution = {
+            k: v
+            for k, v in (document.get("solution") or {}).items()
+            if k not in SKIPPED_SOLUTION_FIELDS
+        }
+        pack = {
+            "query": document.get("query", ""),
+            "solution": solution,
+            "cited_papers": [self._paper_digest(paper) for paper in papers],
+        }
+        return json.dumps(pack, ensure_ascii=False, default=str)
+
+    def _paper_digest(self, paper: Dict[str, Any]) -> Dict[str, str]:
+        digest = ""
+        for field in PAPER_DIGEST_FIELDS:
+            value = paper.get(field)
+            if value:
+                digest = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+                break
+        limit = self.config["paper_digest_chars"]
+        if len(digest) > limit:
+            digest = digest[:limit].rstrip() + "…"
+        return {"title": paper.get("Title", ""), "digest": digest}
+
+    async def invalidate(self, solution_ids: Iterable[Any]):
+        keys = [self._key(str(solution_id)) for solution_id in solution_ids]
+        if not keys:
+            return
+        try:
+            await async_redis.delete(*keys)
+        except Exception as e:
+            logger.error(f"Chat context invalidation failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# Global instance
+chat_context_packs = ChatContextPacks(CHAT_CONTEXT)
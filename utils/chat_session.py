@@ -0,0 +1,194 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Callable, Dict, Any, List, Optional, Set
+from langchain_core.messages import SystemMessage, HumanMessage
+from .config import CHAT_SESSION
+from .context_builder import count_tokens
+from .llm_limiter import llm_limiters
+from .redis import async_redis
+from .log import logger
+from . import prompting
+
+
+# Store a session only if its stored revision is still the one it was loaded with
+SAVE_IF_UNCHANGED = """
+local current = redis.call('GET', KEYS[1])
+local revision = 0
+if current then
+    revision = tonumber(cjson.decode(current)['revision'] or 0)
+end
+if revision ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SETEX', KEYS[1], ARGV[3], ARGV[2])
+return 1
+"""
+
+
+class ChatSessionStore:
+    """
+    Redis-backed inspiration chat sessions keyed by (user, inspiration, session).
+    The client only sends its new message; older turns are folded into a
+    running summary once the stored conversation grows past a token threshold.
+    Every save is a compare-and-set on the session's revision, so concurrent
+    turns and compactions re-apply their change instead of overwriting each other.
+    """
+
+    prefix = "innoweaver:chat:session"
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self._compactions: Set[asyncio.Task] = set()
+
+    def _key(self, user_id: str, inspiration_id: str, session_id: str) -> str:
+        return f"{self.prefix}:{user_id}:{inspiration_id}:{session_id}"
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def new_session() -> Dict[str, Any]:
+        return {
+            "summary": "",
+            "messages": [],
+            "summarized_messages": 0,
+            "revision": 0,
+            "updated_at": time.time(),
+        }
+
+    async def load(self, user_id: str, inspiration_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+        data = await async_redis.get(self._key(user_id, inspiration_id, session_id))
+        return json.loads(data) if data else None
+
+    async def save(self, user_id: str, inspiration_id: str, session_id: str, session: Dict[str, Any]) -> bool:
+        """Store the session unless it was saved since it was loaded; False on a conflict"""
+        revision = session.get("revision", 0)
+        stored = dict(session, revision=revision + 1, updated_at=time.time())
+        saved = await async_redis.eval(
+            SAVE_IF_UNCHANGED,
+            1,
+            self._key(user_id, inspiration_id, session_id),
+            revision,
+            json.dumps(stored, ensure_ascii=False),
+            self.config["expire"],
+        )
+        if saved:
+            session.update(revision=stored["revision"], updated_at=stored["updated_at"])
+        return bool(saved)
+
+    async def update(
+        self,
+        user_id: str,
+        inspiration_id: str,
+        session_id: str,
+        session: Dict[str, Any],
+        change: Callable[[Dict[str, Any]], bool],
+    ) -> bool:
+        """
+        Apply `change` to the session and save it. On a conflicting write the
+        latest session is loaded and the change applied again; `change` returns
+        False when it no longer applies.
+        """
+        for _ in range(self.config["save_attempts"]):
+            if not change(session):
+                return False
+            if await self.save(user_id, inspiration_id, session_id, session):
+                return True
+            session = await self.load(user_id, inspiration_id, session_id) or self.new_session()
+        logger.warning(f"Chat session {session_id} kept changing, dropped an update")
+        return False
+
+    async def delete(self, user_id: str, inspiration_id: str, session_id: str):
+        await async_redis.delete(self._key(user_id, inspiration_id, session_id))
+
+    async def record_turn(
+        self,
+        user_id: str,
+        inspiration_id: str,
+        session_id: str,
+        session: Dict[str, Any],
+        user_message: str,
+        assistant_message: str,
+    ) -> bool:
+        limit = self.config["max_message_chars"]
+        turn = [
+            {"role": "user", "content": user_message[:limit]},
+            {"role": "assistant", "content": assistant_message[:limit]},
+        ]
+
+        def append(latest: Dict[str, Any]) -> bool:
+            latest["messages"].extend(turn)
+            return True
+
+        return await self.update(user_id, inspiration_id, session_id, session, append)
+
+    def session_tokens(self, session: Dict[str, Any]) -> int:
+        return count_tokens(session["summary"]) + sum(
+            count_tokens(message["content"]) for message in session["messages"]
+        )
+
+    async def _summarize(self, summary: str, older: List[Dict[str, str]], model) -> Optional[str]:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in older)
+        messages = [
+            SystemMessage(content=prompting.get_prompt("CHAT_SUMMARY_SYSTEM_PROMPT")),
+            HumanMessage(
+                content=f"Current summary:\n{summary or '(none)'}\n\nOlder turns:\n{transcript}"
+            ),
+        ]
+        try:
+            async with llm_limiters.for_model(model).slot():
+                response = await model.ainvoke(messages)
+        except Exception as e:
+            logger.error(f"Chat session summarization failed: {str(e)}")
+            return None
+        return (response.content or "").strip() or None
+
+    async def compact(self, user_id: str, inspiration_id: str, session_id: str, model) -> bool:
+        """Summarize all but the most recent messages once the stored session is over budget"""
+        session = await self.load(user_id, inspiration_id, session_id)
+        keep_recent = self.config["keep_recent"]
+        if (
+            session is None
+            or len(session["messages"]) <= keep_recent
+            or self.session_tokens(session) <= self.config["summary_threshold"]
+        ):
+            return False
+
+        older = session["messages"][:-keep_recent]
+        summary = await self._summarize(session["summary"], older, model)
+        if not summary:
+            return False
+
+        def fold(latest: Dict[str, Any]) -> bool:
+            # Turns saved meanwhile stay; skip if the older ones were folded already
+            if latest["messages"][: len(older)] != older:
+                return False
+            latest["summary"] = summary
+            latest["messages"] = latest["messages"][len(older):]
+            latest["summarized_messages"] += len(older)
+            return True
+
+        if not await self.update(user_id, inspiration_id, session_id, session, fold):
+            return False
+        logger.info(f"Compacted chat session: {len(older)} messages folded into summary")
+        return True
+
+    def compact_later(self, user_id: str, inspiration_id: str, session_id: str, model):
+        """Run compact() in the background, so its LLM call never holds a response open"""
+
+        async def run():
+            try:
+                await self.compact(user_id, inspiration_id, session_id, model)
+            except Exception as e:
+                logger.error(f"Chat session compaction failed: {str(e)}")
+
+        task = asyncio.create_task(run())
+        self._compactions.add(task)
+        task.add_done_callback(self._compactions.discard)
+
+
+# Global instance
+chat_sessions = ChatSessionStore(CHAT_SESSION)
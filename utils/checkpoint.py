@@ -0,0 +1,94 @@
+import json
+from typing import Dict, Any, Optional, List
+from .config import RESEARCH_CHECKPOINT
+from .redis import async_redis
+from .log import logger
+
+# State fields that are persisted after each node; the model, user document and
+# send_event callback are rebuilt when a run is resumed
+CHECKPOINT_FIELDS = [
+    "query",
+    "query_analysis_result",
+    "with_paper",
+    "with_example",
+    "is_drawing",
+    "persist_first",
+    "mode",
+    "domain_knowledge",
+    "init_solution",
+    "iterated_solution",
+    "final_solution",
+    "token_usage",
+    "shortcuts",
+    "progress",
+    "status",
+    "error",
+]
+
+
+class ResearchCheckpointStore:
+    """
+    Redis-backed checkpoints of research runs, keyed by run id.
+    Each run keeps its owner, the serializable part of the state and the list
+    of completed nodes, so a retried run can skip the nodes already paid for.
+    """
+
+    def __init__(self, redis_prefix: str = "innoweaver:research:checkpoint:", expire: int = 3600 * 24):
+        self.redis_prefix = redis_prefix
+        self.expire = expire
+
+    def _key(self, run_id: str) -> str:
+        return f"{self.redis_prefix}{run_id}"
+
+    async def create(self, run_id: str, user_id: str, state: Dict[str, Any]):
+        key = self._key(run_id)
+        await async_redis.hset(
+            key,
+            mapping={
+                "user_id": user_id,
+                "state": self._dump_state(state),
+                "completed": json.dumps([]),
+            },
+        )
+        await async_redis.expire(key, self.expire)
+
+    async def save(self, run_id: str, node: str, state: Dict[str, Any]):
+        """Record that a node finished, together with the state it produced"""
+        key = self._key(run_id)
+        try:
+            completed = json.loads(await async_redis.hget(key, "completed") or "[]")
+            if node not in completed:
+                completed.append(node)
+            await async_redis.hset(
+                key,
+                mapping={"state": self._dump_state(state), "completed": json.dumps(completed)},
+            )
+            await async_redis.expire(key, self.expire)
+        except Exception as e:
+            logger.error(f"Failed to save checkpoint for run {run_id} after {node}: {str(e)}")
+
+    async def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        data = await async_redis.hgetall(self._key(run_id))
+        if not data:
+            return None
+        return {
+            "user_id": data.get("user_id"),
+            "state": json.loads(data.get("state") or "{}"),
+            "completed": json.loads(data.get("completed") or "[]"),
+        }
+
+    async def delete(self, run_id: str):
+        await async_redis.delete(self._key(run_id))
+
+    def _dump_state(self, state: Dict[str, Any]) -> str:
+        return json.dumps(
+            {field: state[field] for field in CHECKPOINT_FIELDS if field in state},
+            default=str,
+        )
+
+
+# Global instance
+research_checkpoints = ResearchCheckpointStore(
+    redis_prefix="innoweaver:research:checkpoint:",
+    expire=RESEARCH_CHECKPOINT["expire"],
+)
@@ -1,4 +1,5 @@
 import os
+import json
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -60,6 +61,287 @@ OPENAI = {
 SMMS = {
     "api_key": os.getenv("SM_MS_API_KEY"),
     "upload_url": "https://sm.ms/api/v2/upload",
+    # Generated images are small, a stalled download should fail fast
+    "download_timeout": float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", 5)),
+}
+
+# Outbound HTTP client pool configuration
+HTTP_CLIENT = {
+    "max_connections": int(os.getenv("HTTP_MAX_CONNECTIONS", 100)),
+    "max_keepalive_connections": int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)),
+    "keepalive_expiry": float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60)),
+    "timeout": float(os.getenv("HTTP_TIMEOUT", 300)),
+    "connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", 10)),
+    "http2": os.getenv("HTTP_HTTP2", "false").lower() == "true",
+    "dns_cache_ttl": float(os.getenv("HTTP_DNS_CACHE_TTL", 300)),
+    # Clients are keyed by user-supplied base URLs; least recently used ones
+    # beyond this are closed once their in-flight requests had time to finish
+    "max_clients": int(os.getenv("HTTP_MAX_CLIENTS", 64)),
+    # Base URLs whose clients are created at startup
+    "prewarm": [
+        url
+        for url in [
+            os.getenv("DRAW_URL"),
+            os.getenv("OPENAI_BASE_URL"),
+            "https://api.deepseek.com/v1",
+            "https://sm.ms",
+        ]
+        if url
+    ],
+}
+
+# Initialized chat model cache configuration
+MODEL_CACHE = {
+    "max_size": int(os.getenv("MODEL_CACHE_SIZE", 256)),
+    "ttl": int(os.getenv("MODEL_CACHE_TTL", 1800)),  # 30 minutes
+}
+
+# Query analysis result cache configuration
+QUERY_CACHE = {
+    "enabled": os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true",
+    "expire": int(os.getenv("QUERY_CACHE_EXPIRE", 3600 * 24)),  # 24 hours
+    # Cosine similarity for semantic hits, 0 disables embedding lookups
+    "similarity_threshold": float(os.getenv("QUERY_CACHE_SIMILARITY", 0)),
+    "max_candidates": int(os.getenv("QUERY_CACHE_MAX_CANDIDATES", 200)),
+    "replay_chunk_size": 64,
+}
+
+# Research run checkpoint configuration
+RESEARCH_CHECKPOINT = {
+    "enabled": os.getenv("RESEARCH_CHECKPOINT_ENABLED", "true").lower() == "true",
+    "expire": int(os.getenv("RESEARCH_CHECKPOINT_EXPIRE", 3600 * 24)),  # 24 hours
+}
+
+# API connection test configuration
+API_TEST = {
+    "timeout": float(os.getenv("API_TEST_TIMEOUT", 10)),
+    "cache_expire": int(os.getenv("API_TEST_CACHE_EXPIRE", 60)),
+    # Failures are often transient (rate limits, a key just fixed); retry them soon
+    "failure_cache_expire": int(os.getenv("API_TEST_FAILURE_CACHE_EXPIRE", 5)),
+    "max_candidates": 10,
+}
+
+# Streaming JSON parsing of LLM node outputs
+STREAM_JSON = {
+    # Close the upstream stream as soon as the top-level JSON value is complete
+    "stop_on_close": os.getenv("STREAM_JSON_STOP_ON_CLOSE", "true").lower() == "true",
+}
+
+# Adaptive (AIMD) concurrency limits per LLM provider and API key
+LLM_LIMITER = {
+    "initial_limit": int(os.getenv("LLM_LIMIT_INITIAL", 8)),
+    "min_limit": int(os.getenv("LLM_LIMIT_MIN", 1)),
+    "max_limit": int(os.getenv("LLM_LIMIT_MAX", 64)),
+    "decrease_factor": 0.5,
+    "max_wait": float(os.getenv("LLM_LIMIT_MAX_WAIT", 30)),  # seconds in queue
+    "max_queue": int(os.getenv("LLM_LIMIT_MAX_QUEUE", 200)),
+}
+
+# Hedged LLM streams: send a second request when the first token is late
+HEDGING = {
+    "enabled": os.getenv("HEDGING_ENABLED", "false").lower() == "true",
+    "percentile": float(os.getenv("HEDGING_PERCENTILE", 95)),  # TTFT percentile used as deadline
+    "min_samples": 20,  # TTFT samples needed before the percentile is trusted
+    "default_deadline": float(os.getenv("HEDGING_DEFAULT_DEADLINE", 8)),
+    "min_deadline": 1.0,
+    "max_deadline": 30.0,
+    "window": 200,  # TTFT samples kept per provider
+}
+
+# Token budgets for the domain knowledge block of research node prompts
+CONTEXT_BUDGET = {
+    "enabled": os.getenv("CONTEXT_BUDGET_ENABLED", "true").lower() == "true",
+    # tiktoken encoding, loaded at startup; set TIKTOKEN_CACHE_DIR to ship it with the image
+    "encoding": os.getenv("CONTEXT_BUDGET_ENCODING", "cl100k_base"),
+    "max_field_chars": 800,  # longer field values are clipped
+    "default_budget": 4000,
+    "node_budgets": {
+        "domain_expert": int(os.getenv("CONTEXT_BUDGET_DOMAIN_EXPERT", 6000)),
+        "interdisciplinary": int(os.getenv("CONTEXT_BUDGET_INTERDISCIPLINARY", 4000)),
+        "evaluation": int(os.getenv("CONTEXT_BUDGET_EVALUATION", 3000)),
+        "single_pass": int(os.getenv("CONTEXT_BUDGET_SINGLE_PASS", 6000)),
+    },
+}
+
+# Message layout of the research expert nodes
+PROMPT_LAYOUT = {
+    # Put the query and domain knowledge first, byte-identical in every node, so
+    # provider-side prompt caching can reuse it; node instructions follow it
+    "prefix_cache": os.getenv("PROMPT_PREFIX_CACHE", "true").lower() == "true",
+    "shared_budget": int(os.getenv("PROMPT_SHARED_CONTEXT_BUDGET", 5000)),  # tokens
+    # Request usage metadata on streams to record input, output and cached tokens.
+    # Only sent to providers known to accept stream_options; a stream stopped at
+    # the end of its JSON document waits up to usage_wait seconds for the usage chunk
+    "measure_usage": os.getenv("PROMPT_MEASURE_USAGE", "true").lower() == "true",
+    "usage_wait": float(os.getenv("PROMPT_USAGE_WAIT", 2.0)),
+    "usage_providers": [
+        url.strip().rstrip("/")
+        for url in os.getenv(
+            "PROMPT_USAGE_PROVIDERS", "https://api.openai.com/v1,https://api.deepseek.com/v1"
+        ).split(",")
+        if url.strip()
+    ],
+}
+
+# Per-node timing and token accounting of research, query and chat runs
+RUN_METRICS = {
+    "enabled": os.getenv("RUN_METRICS_ENABLED", "true").lower() == "true",
+    "stats_max_runs": 5000,  # most recent runs aggregated by the stats endpoint
+}
+
+# Coalescing of streamed "chunk" events into fewer SSE frames
+SSE_COALESCE = {
+    "default": {
+        "window_ms": int(os.getenv("SSE_COALESCE_WINDOW_MS", 40)),  # 0 sends every chunk
+        "max_bytes": int(os.getenv("SSE_COALESCE_MAX_BYTES", 2048)),
+    },
+    # Per-endpoint overrides
+    "endpoints": {
+        "query": {"window_ms": 30},
+        "inspiration_chat": {"window_ms": 30},
+        "research": {"window_ms": 50, "max_bytes": 4096},
+    },
+}
+
+# Inspiration chat streaming protocol versions
+# 1: every chunk carries delta, cumulative content and message
+# 2: chunks carry only delta and seq, the full content is sent once in "result"
+CHAT_PROTOCOL = {
+    "default_version": 1,
+    "supported_versions": [1, 2],
+}
+
+# Server-side inspiration chat sessions
+CHAT_SESSION = {
+    "expire": int(os.getenv("CHAT_SESSION_EXPIRE", 3600 * 24 * 7)),  # 7 days
+    # Summarize older turns once summary + turns exceed this many tokens
+    "summary_threshold": int(os.getenv("CHAT_SESSION_SUMMARY_THRESHOLD", 3000)),
+    "keep_recent": 6,  # most recent messages always sent verbatim
+    "max_message_chars": 20000,
+    "save_attempts": 3,  # re-applies of a turn or summary after conflicting saves
+}
+
+# Cached per-solution context packs for inspiration chat
+CHAT_CONTEXT = {
+    "enabled": os.getenv("CHAT_CONTEXT_CACHE_ENABLED", "true").lower() == "true",
+    "expire": int(os.getenv("CHAT_CONTEXT_EXPIRE", 3600 * 24)),  # 24 hours
+    "max_papers": 10,  # cited papers included per solution
+    "paper_digest_chars": 400,
+}
+
+# Image generation in the research drawing node
+DRAWING = {
+    # Concurrent generations per drawing provider (base URL)
+    "concurrency": int(os.getenv("DRAW_CONCURRENCY", 3)),
+    # Per-provider overrides, e.g. DRAW_PROVIDER_LIMITS='{"https://api.example.com/v1": 2}'
+    "provider_limits": {
+        url.rstrip("/"): limit
+        for url, limit in json.loads(os.getenv("DRAW_PROVIDER_LIMITS", "{}")).items()
+    },
+}
+
+# Research pipeline modes
+RESEARCH_PIPELINE = {
+    # Save solutions right after evaluation and generate images in the background
+    # (default for requests that do not send persist_first)
+    "persist_first": os.getenv("RESEARCH_PERSIST_FIRST", "false").lower() == "true",
+}
+
+# Out-of-process worker pool fed by a Redis Streams job queue
+JOB_QUEUE = {
+    "enabled": os.getenv("JOB_QUEUE_ENABLED", "false").lower() == "true",
+    # Endpoints whose runs are queued instead of executed in the web worker
+    "kinds": [k.strip() for k in os.getenv("JOB_QUEUE_KINDS", "research").split(",") if k.strip()],
+    "stream": "innoweaver:jobs",
+    "group": "innoweaver-workers",
+    "max_length": 10000,
+    "concurrency": int(os.getenv("JOB_WORKER_CONCURRENCY", 4)),  # Jobs per worker process
+    "block_ms": 5000,
+    # Jobs of crashed workers are reclaimed after this; keep it a few heartbeats
+    # long and below RUN_EVENTS["reclaim_wait"], so followers wait for the reclaim
+    "claim_idle_ms": 90 * 1000,
+    "heartbeat": 20,  # Seconds between idle-time resets of running jobs
+    "start_timeout": 60,  # Seconds to wait for a worker to pick up a job
+}
+
+# Per-run event log in capped Redis Streams, replayed on reconnect (Last-Event-ID)
+RUN_EVENTS = {
+    "max_length": 10000,  # Events kept per run
+    "expire": 3600,
+    "block_ms": 5000,
+    "live_ttl": 30,  # A run whose producer stops refreshing this is considered dead
+    # Seconds followers of a queued run keep waiting after it stopped being live,
+    # while its job is still pending and can be reclaimed by another worker
+    "reclaim_wait": 150,
+    "cancel_check_interval": 1.0,
+}
+
+# Single-flight deduplication of research and query runs
+IDEMPOTENCY = {
+    "enabled": os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true",
+    "key_expire": 3600,  # Runs started with an Idempotency-Key header
+    "payload_expire": 600,  # Runs matched by a hash of user and payload
+}
+
+# Batched ($in) loading of solutions and papers
+DOCUMENT_LOADER = {
+    "max_batch": 100,  # Ids per query
+}
+
+# End-to-end latency budget of research runs
+RESEARCH_DEADLINE = {
+    "enabled": os.getenv("RESEARCH_DEADLINE_ENABLED", "false").lower() == "true",
+    # Counted from the request, or from the worker's claim for queued runs. At
+    # least the slowest path through the node budgets, so shortcuts are only
+    # taken when nodes run over
+    "slo": float(os.getenv("RESEARCH_SLO_SECONDS", 300)),
+    # Longest a single node may run, in seconds
+    "node_budgets": {
+        "rag": 20,
+        "paper": 10,
+        "example": 10,
+        "domain_expert": 90,
+        "interdisciplinary": 60,
+        "evaluation": 60,
+        "drawing": 60,
+        "single_pass": 120,
+        # persistence is never cut short, results are always saved
+    },
+    # Seconds that must remain for the full version of a node; below it the node
+    # degrades (keyword-only RAG, brief domain expert, skipped interdisciplinary/
+    # evaluation/drawing)
+    "min_remaining": {
+        "rag": 150,
+        "domain_expert": 60,
+        "interdisciplinary": 90,
+        "evaluation": 40,
+        "drawing": 45,
+    },
+    # Longest a degraded node may run, in seconds
+    "fallback_budgets": {
+        "rag": 15,
+        "domain_expert": 60,
+        "interdisciplinary": 5,
+        "evaluation": 5,
+        "drawing": 5,
+    },
+    # Answer cap of the brief domain expert
+    "brief_max_tokens": 2000,
+}
+
+# Research quality levels: the expert stages each mode runs, in order, with
+# the max_tokens of each stage's answer
+RESEARCH_MODES = {
+    "default": os.getenv("RESEARCH_DEFAULT_MODE", "thorough"),
+    # The expert stages of each mode with their max_tokens; None leaves a stage uncapped
+    "modes": {
+        # One combined prompt proposes, iterates and evaluates the solutions
+        "fast": {"single_pass": 6000},
+        # The domain expert's solutions go straight to evaluation
+        "balanced": {"domain_expert": 4000, "evaluation": 6000},
+        # The full pipeline, answers as long as the model needs
+        "thorough": {"domain_expert": None, "interdisciplinary": None, "evaluation": None},
+    },
 }
 
 # Cache configuration
@@ -84,6 +366,7 @@ PROMPT_FILES = {
     "PRACTICAL_EXPERT_EVALUATE": "practical_expert_evaluate_system_prompt",
     "DRAWING_EXPERT": "drawing_expert_system_prompt",
     "HTML_GENERATION": "html_generation_system_prompt",
+    "CHAT_SUMMARY": "chat_summary_system_prompt",
 }
 
 # Test configuration
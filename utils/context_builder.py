@@ -0,0 +1,188 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+from .config import CONTEXT_BUDGET
+from .log import logger
+
+# Paper fields worth sending to the expert nodes, in prompt order
+EVIDENCE_FIELDS = [
+    "Title",
+    "Target Definition",
+    "Design Goal",
+    "Design Background",
+    "Contributions",
+    "Innovations",
+    "Artifact Knowledge",
+    "Supporting knowledge",
+    "Results",
+]
+
+# Search bookkeeping that never helps the model
+IGNORED_FIELDS = {
+    "keyword_score",
+    "vector_score",
+    "final_score",
+    "source",
+    "metadata",
+    "vector_metadata",
+    "vector_content",
+    "embedding",
+    "image_url",
+    "image_name",
+}
+
+_encoding = None
+_encoding_failed = False
+
+
+def load_encoding():
+    """
+    Load the tiktoken encoding once. The first load may download the BPE file
+    (cached under TIKTOKEN_CACHE_DIR), so servers call preload_encoding() at
+    startup instead of paying for it inside a request.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(CONTEXT_BUDGET["encoding"])
+        except Exception as e:
+            _encoding_failed = True
+            logger.warning(f"tiktoken unavailable, estimating tokens from length: {str(e)}")
+    return _encoding
+
+
+async def preload_encoding():
+    """Load the encoding in a thread, keeping the event loop free"""
+    await asyncio.to_thread(load_encoding)
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the configured tiktoken encoding, or len/4 without it"""
+    if load_encoding() is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class EvidenceContext:
+    """Compact domain knowledge for one node prompt"""
+
+    def __init__(self, text: str, records: int, included: int, tokens: int, raw_tokens: int):
+        self.text = text
+        self.records = records
+        self.included = included
+        self.tokens = tokens
+        self.raw_tokens = raw_tokens
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "records": self.records,
+            "included": self.included,
+            "tokens": self.tokens,
+            "raw_tokens": self.raw_tokens,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+def _clip(value: Any, max_chars: int) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars].rstrip() + "…"
+    if isinstance(value, dict):
+        return {k: _clip(v, max_chars) for k, v in value.items() if not str(k).startswith("_")}
+    if isinstance(value, list):
+        return [_clip(v, max_chars) for v in value]
+    return value
+
+
+def _evidence_record(hit: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Turn a RAG, paper or example hit into a record of its useful fields"""
+    if not isinstance(hit, dict):
+        return None
+
+    kind = "paper"
+    content = hit
+    if "solution_id" in hit and isinstance(hit.get("content"), dict):
+        kind = "example"
+        content = hit["content"].get("solution") or hit["content"]
+    elif isinstance(hit.get("content"), dict):
+        content = hit["content"]
+    if isinstance(content.get("text_analysis"), dict):
+        content = {**content, **content["text_analysis"]}
+
+    max_chars = CONTEXT_BUDGET["max_field_chars"]
+    record: Dict[str, Any] = {"type": kind}
+    if kind == "example":
+        # Example solutions are already compact, keep all of their fields
+        for key, value in content.items():
+            if not key.startswith("_") and key not in IGNORED_FIELDS and value:
+                record[key] = _clip(value, max_chars)
+    else:
+        for key in EVIDENCE_FIELDS:
+            if content.get(key):
+                record[key] = _clip(content[key], max_chars)
+        if len(record) == 1 and isinstance(hit.get("content"), str) and hit["content"]:
+            # Vector-only fallback hits carry just the indexed text
+            record["Content"] = _clip(hit["content"], max_chars)
+    return record if len(record) > 1 else None
+
+
+def _dedupe_key(hit: Dict[str, Any], record: Dict[str, Any]) -> str:
+    for key in ("solution_id", "paper_id", "_id", "id"):
+        if hit.get(key):
+            return f"{record['type']}:{hit[key]}"
+    title = record.get("Title")
+    if title:
+        return f"{record['type']}:{' '.join(str(title).lower().split())}"
+    return json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def build_context(
+    domain_knowledge: Any, node: str, budget: Optional[int] = None
+) -> EvidenceContext:
+    """
+    Build the domain knowledge block of a node prompt.
+    Hits become compact, deduplicated evidence records that are added in
+    ranking order until the node's token budget is used up.
+    """
+    raw_text = str(domain_knowledge)
+    raw_tokens = count_tokens(raw_text)
+    if not CONTEXT_BUDGET["enabled"]:
+        return EvidenceContext(raw_text, 0, 0, raw_tokens, raw_tokens)
+
+    hits = domain_knowledge.get("hits", []) if isinstance(domain_knowledge, dict) else []
+    records: List[Dict[str, Any]] = []
+    seen = set()
+    for hit in hits or []:
+        record = _evidence_record(hit)
+        if record is None:
+            continue
+        key = _dedupe_key(hit, record)
+        if key in seen:
+            continue
+        seen.add(key)
+        records.append(record)
+
+    if budget is None:
+        budget = CONTEXT_BUDGET["node_budgets"].get(node, CONTEXT_BUDGET["default_budget"])
+    lines: List[str] = []
+    tokens = 0
+    for index, record in enumerate(records, start=1):
+        text = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+        line = f"[{index}] {text}"
+        line_tokens = count_tokens(line) + 1
+        if tokens + line_tokens > budget:
+            break
+        lines.append(line)
+        tokens += line_tokens
+
+    context = EvidenceContext("\n".join(lines), len(records), len(lines), tokens, raw_tokens)
+    logger.info(
+        f"Context for {node}: {context.included}/{context.records} records, "
+        f"{context.tokens} tokens (saved {context.tokens_saved})"
+    )
+    return context
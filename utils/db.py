@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import Optional, Dict, Any, List
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -24,6 +25,9 @@ solutions_liked_collection = db["solution_liked"]
 papers_cited_collection = db["paper_cited"]
 papers_liked_collection = db["paper_liked"]
 
+# Per-run timing and token accounting
+run_metrics_collection = db["run_metrics"]
+
 # API configuration constants
 ALLOWED_USER_TYPES = API["allowed_user_types"]
 SECRET_KEY = API["secret_key"]
@@ -146,11 +150,18 @@ def search_in_meilisearch(query, requirements):
 
 
 async def hybrid_search(
-    query: str, requirements: List[str] = None, limit: int = 10
+    query: str, requirements: List[str] = None, limit: int = 10, keyword_only: bool = False
 ) -> List[Dict]:
     try:
-        keyword_results = search_in_meilisearch(query, requirements or [])
-        vector_results = vector_store.search(query, limit=limit * 2)
+        # Both clients block, run them in threads so callers can time out
+        if keyword_only:
+            keyword_results = await asyncio.to_thread(search_in_meilisearch, query, requirements or [])
+            vector_results = []
+        else:
+            keyword_results, vector_results = await asyncio.gather(
+                asyncio.to_thread(search_in_meilisearch, query, requirements or []),
+                asyncio.to_thread(vector_store.search, query, limit * 2),
+            )
 
         # Combine and deduplicate
         combined_results = {}
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional
+from .config import HEDGING
+from .log import logger
+from .model_cache import model_provider_key
+
+
+class ProviderHedgeStats:
+    """Recent time-to-first-token samples and hedge counters for one provider"""
+
+    def __init__(self, window: int):
+        self.ttft: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.primary_wins = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.ttft:
+            return None
+        samples = sorted(self.ttft)
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class StreamHedger:
+    """
+    Time-to-first-token watchdog for LLM streams.
+
+    When a stream has not produced its first chunk by the provider's TTFT
+    percentile deadline, an identical second request is started. Whichever
+    stream yields first wins and the other one is cancelled and closed.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self._providers: Dict[str, ProviderHedgeStats] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.config["enabled"]
+
+    def _stats(self, provider: str) -> ProviderHedgeStats:
+        stats = self._providers.get(provider)
+        if stats is None:
+            stats = ProviderHedgeStats(self.config["window"])
+            self._providers[provider] = stats
+        return stats
+
+    def deadline(self, provider: str) -> float:
+        stats = self._stats(provider)
+        if len(stats.ttft) < self.config["min_samples"]:
+            return self.config["default_deadline"]
+        value = stats.percentile(self.config["percentile"])
+        return min(self.config["max_deadline"], max(self.config["min_deadline"], value))
+
+    def open(self, model, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Stream from a LangChain model's chain, hedged when hedging is enabled"""
+        if not self.enabled or model is None:
+            return factory()
+        return self.astream(model_provider_key(model), factory)
+
+    async def astream(
+        self, provider: str, factory: Callable[[], AsyncIterator]
+    ) -> AsyncIterator:
+        """
+        Iterate a stream created by `factory`, hedging it if the first chunk is late.
+        `factory` must start a new, identical request on every call.
+        """
+        stats = self._stats(provider)
+        stats.requests += 1
+        started = time.monotonic()
+
+        primary = factory()
+        primary_first = asyncio.ensure_future(primary.__anext__())
+        contenders = {primary_first: (primary, started)}
+        winner = winner_first = None
+
+        try:
+            done, _ = await asyncio.wait([primary_first], timeout=self.deadline(provider))
+            if done:
+                winner, winner_first = primary, primary_first
+                stats.primary_wins += 1
+            else:
+                stats.hedged += 1
+                logger.info(
+                    f"Hedging LLM stream for {provider}: no first token after "
+                    f"{time.monotonic() - started:.2f}s"
+                )
+                hedge = factory()
+                hedge_first = asyncio.ensure_future(hedge.__anext__())
+                contenders[hedge_first] = (hedge, time.monotonic())
+                winner_first = await self._first_success(contenders)
+                winner = contenders[winner_first][0]
+                if winner is hedge:
+                    stats.hedge_wins += 1
+                else:
+                    stats.primary_wins += 1
+        finally:
+            for task, (stream, _) in contenders.items():
+                if task is not winner_first:
+                    await _discard(task, stream)
+
+        try:
+            first = winner_first.result()
+        except StopAsyncIteration:
+            return
+        except Exception:
+            stats.failures += 1
+            raise
+        stats.ttft.append(time.monotonic() - contenders[winner_first][1])
+
+        try:
+            yield first
+            async for chunk in winner:
+                yield chunk
+        finally:
+            await winner.aclose()
+
+    @staticmethod
+    async def _first_success(contenders: Dict[asyncio.Future, Any]) -> asyncio.Future:
+        """Wait for the first contender to yield; errors only win if every contender fails"""
+        pending = set(contenders)
+        failed = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None or isinstance(task.exception(), StopAsyncIteration):
+                    return task
+                failed = failed or task
+        return failed
+
+    def stats(self) -> Dict[str, Any]:
+        providers = {}
+        for provider, stats in self._providers.items():
+            p50 = stats.percentile(50)
+            p95 = stats.percentile(95)
+            providers[provider] = {
+                "requests": stats.requests,
+                "hedged": stats.hedged,
+                "hedge_rate": round(stats.hedged / stats.requests, 3) if stats.requests else 0.0,
+                "primary_wins": stats.primary_wins,
+                "hedge_wins": stats.hedge_wins,
+                "failures": stats.failures,
+                "deadline": round(self.deadline(provider), 3),
+                "ttft_p50": round(p50, 3) if p50 is not None else None,
+                "ttft_p95": round(p95, 3) if p95 is not None else None,
+            }
+        return {"enabled": self.enabled, "providers": providers}
+
+
+async def _discard(task: asyncio.Future, stream):
+    """Cancel a pending first-chunk read and close its stream"""
+    task.cancel()
+    await asyncio.wait([task])
+    if not task.cancelled():
+        task.exception()  # mark as retrieved
+    try:
+        await stream.aclose()
+    except Exception as e:
+        logger.warning(f"Error closing hedged LLM stream: {str(e)}")
+
+
+# Global instance
+stream_hedger = StreamHedger(HEDGING)
@@ -0,0 +1,270 @@
+import asyncio
+import importlib.util
+import ipaddress
+import os
+import socket
+import time
+import typing
+from collections import OrderedDict
+from typing import Dict, Optional, Any, List, Tuple
+from urllib.parse import urlsplit
+import httpx
+import httpcore
+from .config import HTTP_CLIENT
+from .log import logger
+
+
+class DNSCache:
+    """Process-wide cache of resolved host addresses"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, host: str, port: int) -> str:
+        if self.ttl <= 0 or _is_ip_literal(host):
+            return host
+
+        entry = self._entries.get((host, port))
+        now = time.monotonic()
+        if entry and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        self._entries[(host, port)] = (address, now + self.ttl)
+        return address
+
+    def evict(self, host: str, port: int):
+        self._entries.pop((host, port), None)
+
+
+class PooledNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend used by every pooled client.
+    Resolves hosts through the shared DNS cache and counts new connections,
+    so pool stats can show how often keep-alive connections are reused.
+    """
+
+    def __init__(self, dns_cache: DNSCache):
+        self.dns_cache = dns_cache
+        self.connections_opened = 0
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[typing.Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        address = await self.dns_cache.resolve(host, port)
+        try:
+            stream = await self._backend.connect_tcp(
+                address,
+                port,
+                timeout=timeout,
+                local_address=local_address,
+                socket_options=socket_options,
+            )
+        except Exception:
+            # The cached address may be stale, resolve again on the next attempt
+            self.dns_cache.evict(host, port)
+            raise
+        self.connections_opened += 1
+        return stream
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(
+            path, timeout=timeout, socket_options=socket_options
+        )
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+def _install_network_backend(
+    transport: httpx.AsyncHTTPTransport, backend: PooledNetworkBackend
+) -> bool:
+    """
+    Put the backend on the transport's connection pool.
+    httpx has no public hook for this, so it relies on httpcore 1.x internals
+    (pinned in requirements.txt); other versions keep the default backend.
+    """
+    pool = getattr(transport, "_pool", None)
+    if (
+        not httpcore.__version__.startswith("1.")
+        or not isinstance(pool, httpcore.AsyncConnectionPool)
+        or not hasattr(pool, "_network_backend")
+    ):
+        return False
+    pool._network_backend = backend
+    return True
+
+
+class HttpClientRegistry:
+    """
+    Registry of long-lived httpx clients keyed by base_url.
+    Clients keep connections alive between calls, so LLM, image and upload
+    requests skip the TCP+TLS handshake once a connection is warm. At most
+    `max_clients` are kept; evicted clients are closed after `timeout`
+    seconds, once requests already using them are done.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.http2 = config["http2"] and _h2_available()
+        self.dns_cache = DNSCache(config["dns_cache_ttl"])
+        self._clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+        self._transports: Dict[str, httpx.AsyncHTTPTransport] = {}
+        self._backends: Dict[str, PooledNetworkBackend] = {}
+        self._requests: Dict[str, int] = {}
+        self._retiring: Dict[asyncio.Task, httpx.AsyncClient] = {}
+        self._backend_warned = False
+        self.evictions = 0
+
+    async def start(self, base_urls: Optional[List[str]] = None):
+        """Create clients for known endpoints up front (called from app lifespan)"""
+        for base_url in base_urls if base_urls is not None else self.config["prewarm"]:
+            self.get(base_url)
+        logger.info(
+            f"HTTP client registry started (http2: {self.http2}, clients: {list(self._clients)})"
+        )
+
+    def get(self, base_url: Optional[str] = None) -> httpx.AsyncClient:
+        """Get the shared client for a base_url, creating it on first use"""
+        key = (base_url or "").rstrip("/")
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = self._create_client(key)
+            self._clients[key] = client
+        self._clients.move_to_end(key)
+        while len(self._clients) > self.config["max_clients"]:
+            evicted_key, evicted = self._clients.popitem(last=False)
+            self._forget(evicted_key)
+            self._retire(evicted)
+        return client
+
+    def is_current(self, base_url: Optional[str], client: httpx.AsyncClient) -> bool:
+        """Whether `client` is still the open, registered client for base_url"""
+        return not client.is_closed and self._clients.get((base_url or "").rstrip("/")) is client
+
+    def for_url(self, url: str) -> httpx.AsyncClient:
+        """Get the shared client for the origin of an absolute URL"""
+        parts = urlsplit(url)
+        return self.get(f"{parts.scheme}://{parts.netloc}")
+
+    def _create_client(self, key: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.config["max_connections"],
+            max_keepalive_connections=self.config["max_keepalive_connections"],
+            keepalive_expiry=self.config["keepalive_expiry"],
+        )
+        transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=limits)
+        backend = PooledNetworkBackend(self.dns_cache)
+        if not _install_network_backend(transport, backend) and not self._backend_warned:
+            self._backend_warned = True
+            logger.warning(
+                f"httpcore {httpcore.__version__} is not supported, "
+                f"DNS caching and connection stats are disabled"
+            )
+        self._transports[key] = transport
+        self._backends[key] = backend
+        self._requests[key] = 0
+
+        async def count_request(request: httpx.Request):
+            # An evicted client stays usable until it is closed, but is no longer counted
+            if key in self._requests:
+                self._requests[key] += 1
+
+        return httpx.AsyncClient(
+            base_url=key,
+            transport=transport,
+            timeout=httpx.Timeout(
+                self.config["timeout"], connect=self.config["connect_timeout"]
+            ),
+            event_hooks={"request": [count_request]},
+        )
+
+    def _forget(self, key: str):
+        self._transports.pop(key, None)
+        self._backends.pop(key, None)
+        self._requests.pop(key, None)
+        self.evictions += 1
+
+    def _retire(self, client: httpx.AsyncClient):
+        """Close an evicted client once requests that already hold it had time to finish"""
+
+        async def close_later():
+            await asyncio.sleep(self.config["timeout"])
+            await client.aclose()
+
+        try:
+            task = asyncio.get_running_loop().create_task(close_later())
+        except RuntimeError:
+            # No loop (e.g. a script at import time), nothing can be in flight
+            return
+        self._retiring[task] = client
+        task.add_done_callback(lambda done: self._retiring.pop(done, None))
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool statistics per client, used to check connection reuse"""
+        clients = {}
+        for key, client in self._clients.items():
+            requests = self._requests.get(key, 0)
+            opened = self._backends[key].connections_opened
+            pool = getattr(self._transports[key], "_pool", None)
+            connections = pool.connections if pool is not None else []
+            clients[key or "<absolute>"] = {
+                "requests": requests,
+                "connections_opened": opened,
+                "reuse_ratio": round(1 - opened / requests, 3) if requests else 0.0,
+                "open_connections": len(connections),
+                "idle_connections": sum(1 for conn in connections if conn.is_idle()),
+                "closed": client.is_closed,
+            }
+        return {
+            "pid": os.getpid(),
+            "http2": self.http2,
+            "dns_cache": {"hits": self.dns_cache.hits, "misses": self.dns_cache.misses},
+            "evictions": self.evictions,
+            "retiring": len(self._retiring),
+            "clients": clients,
+        }
+
+    async def aclose(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for task, client in list(self._retiring.items()):
+            task.cancel()
+            clients.append(client)
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP client {client.base_url}: {str(e)}")
+
+
+def _is_ip_literal(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def _h2_available() -> bool:
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+# Global instance
+http_clients = HttpClientRegistry(HTTP_CLIENT)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from .config import IDEMPOTENCY
+from .redis import async_redis
+from .run_events import run_events
+from .log import logger
+
+# Runs in these states are not reused; a duplicate request starts over. So
+# are runs without a status that are neither live nor queued (their process died)
+RETRYABLE_STATUSES = {"failed", "cancelled"}
+
+# Point the key at a new run only if it still names the run that was checked
+TAKE_OVER = """
+if (redis.call('GET', KEYS[1]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class IdempotencyKeys:
+    """
+    Single-flight registry mapping a request to the run it started.
+    The key is the client's Idempotency-Key header, or else a hash of the
+    user and the request payload; the first request claims it with SET NX
+    and duplicates attach to that run's event log instead of starting one.
+    The winner is marked live right away, so a duplicate arriving before the
+    run starts does not mistake it for a dead one.
+    """
+
+    prefix = "innoweaver:idempotency"
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.hits = 0
+        self.misses = 0
+
+    def _key(
+        self, endpoint: str, user_id: str, payload: Dict[str, Any], header: Optional[str]
+    ) -> str:
+        if header:
+            return f"{self.prefix}:{endpoint}:{user_id}:key:{header}"
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{endpoint}:{user_id}:payload:{digest}"
+
+    async def claim(
+        self,
+        endpoint: str,
+        user_id: str,
+        payload: Dict[str, Any],
+        run_id: str,
+        header: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Claim the request for `run_id`. Returns the run_id of an in-flight or
+        completed duplicate to attach to, or None when this run should start.
+        """
+        if not self.config["enabled"]:
+            return None
+        key = self._key(endpoint, user_id, payload, header)
+        expire = self.config["key_expire"] if header else self.config["payload_expire"]
+        try:
+            if await async_redis.set(key, run_id, nx=True, ex=expire):
+                await run_events.mark_live(run_id)
+                self.misses += 1
+                return None
+            existing = await async_redis.get(key)
+            if existing and await self._reusable(existing):
+                self.hits += 1
+                logger.info(f"Duplicate {endpoint} request attached to run {existing}")
+                return existing
+            # The earlier run failed, was cancelled or died: this request takes
+            # over, unless a concurrent duplicate already did
+            if await async_redis.eval(TAKE_OVER, 1, key, existing or "", run_id, expire):
+                await run_events.mark_live(run_id)
+            else:
+                winner = await async_redis.get(key)
+                if winner:
+                    self.hits += 1
+                    logger.info(f"Duplicate {endpoint} request attached to run {winner}")
+                    return winner
+        except Exception as e:
+            logger.error(f"Idempotency check failed, starting a new run: {str(e)}")
+        self.misses += 1
+        return None
+
+    @staticmethod
+    async def _reusable(run_id: str) -> bool:
+        status = await run_events.status(run_id)
+        if status is not None:
+            return status not in RETRYABLE_STATUSES
+        # No status yet: in flight if live or queued; check the status again in
+        # case the run finished in between
+        return (
+            await run_events.is_live(run_id)
+            or await run_events.job_pending(run_id)
+            or await run_events.status(run_id) not in (None, *RETRYABLE_STATUSES)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "deduplicated": self.hits,
+            "started": self.misses,
+            "dedupe_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# Global instance
+idempotency_keys = IdempotencyKeys(IDEMPOTENCY)
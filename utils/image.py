@@ -1,8 +1,33 @@
-import os
+import asyncio
 import uuid
-import httpx
 from io import BytesIO
-from PIL import Image
+from typing import Dict, Optional
+from utils.config import SMMS, DRAWING
+from utils.http_client import http_clients
+
+_drawing_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def drawing_semaphore(base_url: Optional[str]) -> asyncio.Semaphore:
+    """Process-wide bound on concurrent image generations per drawing provider"""
+    key = (base_url or "").rstrip("/")
+    semaphore = _drawing_semaphores.get(key)
+    if semaphore is None:
+        limit = DRAWING["provider_limits"].get(key, DRAWING["concurrency"])
+        semaphore = asyncio.Semaphore(max(1, int(limit)))
+        _drawing_semaphores[key] = semaphore
+    return semaphore
+
+
+def _recompress(image_data: bytes) -> bytes:
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_data))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", optimize=True, quality=30)
+    return buffer.getvalue()
 
 
 async def process_and_upload_image(
@@ -10,43 +35,31 @@ async def process_and_upload_image(
 ) -> tuple[str, str]:
     """Process and upload image, return (url, image_name)"""
     # Download image
-    async with httpx.AsyncClient() as client:
-        response = await client.get(image_url)
-        response.raise_for_status()
-        image_data = response.content
+    response = await http_clients.for_url(image_url).get(
+        image_url, timeout=SMMS["download_timeout"]
+    )
+    response.raise_for_status()
+    image_data = response.content
 
-    # Process image
-    image = Image.open(BytesIO(image_data))
-    if image.mode != "RGB":
-        image = image.convert("RGB")
+    # Process image off the event loop, so concurrent uploads keep streaming
+    jpeg_data = await asyncio.to_thread(_recompress, image_data)
 
     # Generate unique filename
     image_name = str(uuid.uuid4())
-    temp_image_path = f"./temp_image_{image_name}.jpg"
-
-    try:
-        # Save temporary file
-        image.save(temp_image_path, format="JPEG", optimize=True, quality=30)
-
-        # Upload directly to SM.MS here
-        async with httpx.AsyncClient() as client:
-            with open(temp_image_path, "rb") as image_file:
-                response = await client.post(
-                    "https://sm.ms/api/v2/upload",
-                    headers={"Authorization": sm_ms_api_key},
-                    files={
-                        "smfile": (f"{image_name}.jpg", image_file, "image/jpeg")
-                    },  # Specify filename
-                )
-            response.raise_for_status()
-            result = response.json()
-
-            if result.get("success"):
-                return result["data"]["url"], image_name
-            else:
-                raise Exception(f"SM.MS upload failed: {result.get('message')}")
-
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_image_path):
-            os.remove(temp_image_path)
+
+    # Upload directly to SM.MS here
+    upload_url = SMMS["upload_url"]
+    response = await http_clients.for_url(upload_url).post(
+        upload_url,
+        headers={"Authorization": sm_ms_api_key},
+        files={
+            "smfile": (f"{image_name}.jpg", jpeg_data, "image/jpeg")
+        },  # Specify filename
+    )
+    response.raise_for_status()
+    result = response.json()
+
+    if result.get("success"):
+        return result["data"]["url"], image_name
+    else:
+        raise Exception(f"SM.MS upload failed: {result.get('message')}")
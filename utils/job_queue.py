@@ -0,0 +1,103 @@
+import json
+import time
+from typing import Any, Dict, List
+from redis.exceptions import ResponseError
+from .config import JOB_QUEUE
+from .redis import async_redis
+from .log import logger
+
+
+class JobQueue:
+    """
+    Redis Streams job queue shared by the web workers and the worker pool.
+    Web workers enqueue runs, worker processes read them through one consumer
+    group and acknowledge them when done. Jobs left pending by a crashed
+    worker are reclaimed by another one after `claim_idle_ms`.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.stream = config["stream"]
+        self.group = config["group"]
+
+    def handles(self, kind: str) -> bool:
+        return self.config["enabled"] and kind in self.config["kinds"]
+
+    async def ensure_group(self):
+        try:
+            await async_redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def enqueue(self, kind: str, run_id: str, user_id: str, payload: Dict[str, Any]) -> str:
+        fields = {
+            "kind": kind,
+            "run_id": run_id,
+            "user_id": user_id,
+            "payload": json.dumps(payload, ensure_ascii=False, default=str),
+            "enqueued_at": str(time.time()),
+        }
+        return await async_redis.xadd(
+            self.stream, fields, maxlen=self.config["max_length"], approximate=True
+        )
+
+    @staticmethod
+    def _job(message_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            "id": message_id,
+            "kind": fields.get("kind"),
+            "run_id": fields.get("run_id"),
+            "user_id": fields.get("user_id"),
+            "payload": json.loads(fields.get("payload") or "{}"),
+            "enqueued_at": float(fields.get("enqueued_at") or 0),
+        }
+
+    async def read(self, consumer: str, count: int) -> List[Dict[str, Any]]:
+        """Reclaim stale jobs first, then block for new ones"""
+        jobs = []
+        reclaimed = await async_redis.xautoclaim(
+            self.stream, self.group, consumer, self.config["claim_idle_ms"], count=count
+        )
+        for message_id, fields in reclaimed[1]:
+            if fields:
+                logger.warning(f"Reclaimed job {message_id} from a stalled worker")
+                jobs.append(self._job(message_id, fields))
+        if jobs:
+            return jobs
+
+        response = await async_redis.xreadgroup(
+            self.group, consumer, {self.stream: ">"}, count=count, block=self.config["block_ms"]
+        )
+        for _, messages in response or []:
+            for message_id, fields in messages:
+                jobs.append(self._job(message_id, fields))
+        return jobs
+
+    async def heartbeat(self, consumer: str, message_ids: List[str]):
+        """Reset the idle time of running jobs so they are not reclaimed"""
+        if message_ids:
+            await async_redis.xclaim(
+                self.stream, self.group, consumer, 0, message_ids, justid=True
+            )
+
+    async def ack(self, message_id: str):
+        await async_redis.xack(self.stream, self.group, message_id)
+        await async_redis.xdel(self.stream, message_id)
+
+    async def stats(self) -> Dict[str, Any]:
+        await self.ensure_group()
+        pending = await async_redis.xpending(self.stream, self.group)
+        groups = await async_redis.xinfo_groups(self.stream)
+        group = next((g for g in groups if g["name"] == self.group), {})
+        return {
+            "enabled": self.config["enabled"],
+            "kinds": self.config["kinds"],
+            "queued": group.get("lag"),
+            "running": pending["pending"],
+            "consumers": {c["name"]: c["pending"] for c in pending.get("consumers") or []},
+        }
+
+
+# Global instance
+job_queue = JobQueue(JOB_QUEUE)
@@ -0,0 +1,225 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Tuple
+import httpx
+from .config import LLM_LIMITER
+from .log import logger
+from .model_cache import provider_key, model_provider_key
+
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+class LimiterOverloaded(Exception):
+    """Raised when a request waited too long for a concurrency slot"""
+
+
+class Lease:
+    """Handle for a held slot, used to report overload seen inside a stream"""
+
+    def __init__(self):
+        self.overloaded = False
+        self.retry_after: Optional[float] = None
+
+    def report_overload(self, retry_after: Optional[float] = None):
+        self.overloaded = True
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for one upstream provider.
+    The limit grows by roughly one slot per window of successful calls and is
+    cut multiplicatively on 429 / 503 / timeouts, honoring Retry-After.
+    Excess requests wait in a bounded FIFO queue.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        decrease_factor: float = 0.5,
+        max_wait: float = 30.0,
+        max_queue: int = 200,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.backoff_until = 0.0
+        self.successes = 0
+        self.overloads = 0
+        self.rejected = 0
+        self._waiters: deque = deque()
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit) and time.monotonic() >= self.backoff_until
+
+    async def acquire(self):
+        if not self._waiters and self._has_capacity():
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LimiterOverloaded("Upstream request queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._schedule_wake()
+        try:
+            await asyncio.wait([waiter], timeout=self.max_wait)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.done():
+            self._abandon(waiter)
+            self.rejected += 1
+            raise LimiterOverloaded(
+                f"No upstream slot available within {self.max_wait:.0f}s"
+            )
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            # The slot was granted while we were giving up, hand it on
+            self.release()
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self):
+        self.in_flight = max(0, self.in_flight - 1)
+        self._wake()
+
+    def on_success(self):
+        self.successes += 1
+        self.limit = min(self.max_limit, self.limit + 1 / max(self.limit, 1))
+        self._wake()
+
+    def on_overload(self, retry_after: Optional[float] = None):
+        self.overloads += 1
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        if retry_after:
+            self.backoff_until = max(self.backoff_until, time.monotonic() + retry_after)
+        self._schedule_wake()
+
+    def _wake(self):
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def _schedule_wake(self):
+        # Waiters blocked only by a Retry-After backoff need a timer to resume
+        delay = self.backoff_until - time.monotonic()
+        if delay <= 0:
+            return
+        if self._wake_handle and not self._wake_handle.cancelled():
+            if self._wake_handle.when() >= asyncio.get_running_loop().time() + delay:
+                return
+            # A longer Retry-After moved the backoff; fire at its new end instead
+            self._wake_handle.cancel()
+
+        def wake():
+            self._wake_handle = None
+            self._wake()
+            if self._waiters:
+                self._schedule_wake()
+
+        self._wake_handle = asyncio.get_running_loop().call_later(delay, wake)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        lease = Lease()
+        succeeded = False
+        try:
+            yield lease
+            succeeded = True
+        except Exception as e:
+            overloaded, retry_after = classify_error(e)
+            if overloaded:
+                lease.report_overload(retry_after)
+            raise
+        finally:
+            # Cancelled or abandoned calls neither grow nor shrink the limit
+            if lease.overloaded:
+                self.on_overload(lease.retry_after)
+            elif succeeded:
+                self.on_success()
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "backoff_remaining": round(max(0.0, self.backoff_until - time.monotonic()), 2),
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "rejected": self.rejected,
+        }
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def classify_error(error: Exception) -> Tuple[bool, Optional[float]]:
+    """Return (is_overload, retry_after) for errors raised by httpx or the OpenAI SDK"""
+    if isinstance(error, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return True, None
+    if type(error).__name__ in ("APITimeoutError", "RateLimitError"):
+        response = getattr(error, "response", None)
+        return True, parse_retry_after(getattr(response, "headers", None))
+
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status_code in OVERLOAD_STATUS_CODES:
+        return True, parse_retry_after(getattr(response, "headers", None))
+    return False, None
+
+
+class LimiterRegistry:
+    """Adaptive limiters keyed by (base_url, api_key fingerprint)"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+
+    def get(self, base_url: Optional[str], api_key: Optional[str]) -> AdaptiveLimiter:
+        return self._get(provider_key(base_url, api_key))
+
+    def for_model(self, model) -> AdaptiveLimiter:
+        """Limiter for a LangChain ChatOpenAI model"""
+        return self._get(model_provider_key(model))
+
+    def _get(self, key: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveLimiter(**self.config)
+            self._limiters[key] = limiter
+            logger.info(f"Created adaptive LLM limiter for {key}")
+        return limiter
+
+    def stats(self) -> Dict[str, Any]:
+        return {key: limiter.stats() for key, limiter in self._limiters.items()}
+
+
+# Global instance
+llm_limiters = LimiterRegistry(LLM_LIMITER)
@@ -0,0 +1,137 @@
+import asyncio
+import copy
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from bson.objectid import ObjectId
+from .config import DOCUMENT_LOADER
+from .context_builder import EVIDENCE_FIELDS
+from .db import solutions_collection, papers_collection
+from .log import logger
+
+
+def prepare_solution(solution: Dict[str, Any]) -> Dict[str, Any]:
+    solution["id"] = str(solution["_id"])
+    solution["_id"] = str(solution["_id"])
+    solution["user_id"] = str(solution["user_id"])
+    return solution
+
+
+def prepare_paper(paper: Dict[str, Any]) -> Dict[str, Any]:
+    paper["id"] = str(paper["_id"])
+    del paper["_id"]
+    return paper
+
+
+class BatchLoader:
+    """
+    DataLoader-style loader for one collection. Ids requested within the same
+    event-loop tick are fetched with a single `$in` query, and every result
+    (including misses) is memoized for the lifetime of the loader. Like
+    find_one({"_id": ObjectId(id)}), loading an invalid id raises.
+    """
+
+    def __init__(
+        self,
+        collection,
+        prepare: Callable[[Dict[str, Any]], Dict[str, Any]],
+        projection: Optional[Dict[str, int]] = None,
+    ):
+        self.collection = collection
+        self.prepare = prepare
+        self.projection = projection
+        self._results: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self.queries = 0
+
+    async def load(self, document_id: Any) -> Optional[Dict[str, Any]]:
+        key = str(document_id)
+        future = self._results.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._results[key] = future
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            self._pending.append(key)
+        document = await future
+        # Callers may modify what they get, nested fields included; keep the memoized copy intact
+        return copy.deepcopy(document)
+
+    async def load_many(self, document_ids: Iterable[Any]) -> List[Optional[Dict[str, Any]]]:
+        return list(await asyncio.gather(*[self.load(document_id) for document_id in document_ids]))
+
+    def _dispatch(self):
+        keys, self._pending = self._pending, []
+        max_batch = DOCUMENT_LOADER["max_batch"]
+        for start in range(0, len(keys), max_batch):
+            asyncio.ensure_future(self._fetch(keys[start : start + max_batch]))
+
+    async def _fetch(self, keys: List[str]):
+        oids = {}
+        futures: Dict[str, asyncio.Future] = {}
+        for key in keys:
+            try:
+                oids[key] = ObjectId(key)
+                futures[key] = self._results[key]
+            except Exception as e:
+                self._results[key].set_exception(e)
+        try:
+            documents = {}
+            if oids:
+                self.queries += 1
+                cursor = self.collection.find({"_id": {"$in": list(oids.values())}}, self.projection)
+                documents = {str(document["_id"]): document async for document in cursor}
+            for key, future in futures.items():
+                document = documents.get(key)
+                future.set_result(self.prepare(document) if document else None)
+        except Exception as e:
+            logger.error(f"Batched load from {self.collection.name} failed: {str(e)}")
+            self._forget(futures, e)
+        finally:
+            # Cancelled mid-query: release the callers instead of leaving them waiting
+            self._forget(futures, None)
+
+    def _forget(self, futures: Dict[str, asyncio.Future], error: Optional[Exception]):
+        """Fail the unresolved futures and drop them, so a later load retries"""
+        for key, future in futures.items():
+            if future.done():
+                continue
+            if self._results.get(key) is future:
+                del self._results[key]
+            if error is None:
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+
+class DocumentLoaders:
+    """The batch loaders of one request or research run"""
+
+    def __init__(self):
+        self.solutions = BatchLoader(solutions_collection, prepare_solution)
+        self.papers = BatchLoader(papers_collection, prepare_paper)
+        # Papers used as prompt evidence only need the fields the context builder reads
+        self.paper_evidence = BatchLoader(
+            papers_collection,
+            prepare_paper,
+            {field: 1 for field in EVIDENCE_FIELDS + ["text_analysis"]},
+        )
+
+
+_loaders: ContextVar[Optional[DocumentLoaders]] = ContextVar("document_loaders", default=None)
+
+
+def document_loaders() -> DocumentLoaders:
+    """Loaders of the current scope, or fresh ones outside of any scope"""
+    return _loaders.get() or DocumentLoaders()
+
+
+@contextmanager
+def loader_scope():
+    """Share batch loaders (and their memoized results) within this block"""
+    token = _loaders.set(DocumentLoaders())
+    try:
+        yield
+    finally:
+        _loaders.reset(token)
@@ -5,9 +5,10 @@ import utils.prompting as prompting
 import utils.db as RAG
 import utils.log as LOG
 import json
-import requests
-import re
 import asyncio
+from utils.http_client import http_clients
+from utils.stream_json import process_llm_response
+from utils.llm_limiter import llm_limiters, parse_retry_after, OVERLOAD_STATUS_CODES
 
 async def _stream_openai_response(http_client, data, headers):
     try:
@@ -38,10 +39,22 @@ async def _stream_openai_response(http_client, data, headers):
         except Exception as read_err:
             LOG.logger.error(f"Failed to read error response body: {read_err}")
         LOG.logger.error(f"HTTP error during streaming: {e.response.status_code} - {error_body}")
-        yield {'error': f"HTTP error: {e.response.status_code}"}
+        yield {
+            'error': f"HTTP error: {e.response.status_code}",
+            'status_code': e.response.status_code,
+            'retry_after': parse_retry_after(e.response.headers),
+        }
     except Exception as e:
         LOG.logger.error(f"Error during OpenAI stream: {e}", exc_info=True)
-        yield {'error': f"Streaming error: {str(e)}"}
+        yield {'error': f"Streaming error: {str(e)}", 'timeout': isinstance(e, httpx.TimeoutException)}
+
+async def _limited_stream(limiter, http_client, data, headers):
+    """Hold a provider concurrency slot for the whole lifetime of a stream"""
+    async with limiter.slot() as lease:
+        async for item in _stream_openai_response(http_client, data, headers):
+            if 'error' in item and (item.get('status_code') in OVERLOAD_STATUS_CODES or item.get('timeout')):
+                lease.report_overload(item.get('retry_after'))
+            yield item
 
 async def make_openai_request(messages, model, client, stream=False):
     headers = {
@@ -58,27 +71,29 @@ async def make_openai_request(messages, model, client, stream=False):
         headers["Accept"] = "text/event-stream"
         data["stream"] = True
 
-    async with httpx.AsyncClient(base_url=client.base_url, timeout=300.0) as http_client:
-        if stream:
-            # Call the extracted stream handler
-            return _stream_openai_response(http_client, data, headers)
-        else:
-            try:
+    http_client = http_clients.get(client.base_url)
+    limiter = llm_limiters.get(client.base_url, client.api_key)
+    if stream:
+        # Call the extracted stream handler
+        return _limited_stream(limiter, http_client, data, headers)
+    else:
+        try:
+            async with limiter.slot():
                 response = await http_client.post("/chat/completions", json=data, headers=headers)
                 response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                 error_body = "Unknown error body"
-                 try:
-                     error_body = await e.response.aread()
-                 except Exception as read_err:
-                     LOG.logger.error(f"Failed to read error response body: {read_err}")
-                 LOG.logger.error(f"HTTP error in non-stream request: {e.response.status_code} - {error_body}")
-                 # Re-raise the exception or return an error structure consistent with your error handling
-                 raise e # Or return an error dict/object
-            except Exception as e:
-                LOG.logger.error(f"Error during OpenAI non-stream request: {e}", exc_info=True)
-                raise e # Or return an error dict/object
+            return response.json()
+        except httpx.HTTPStatusError as e:
+             error_body = "Unknown error body"
+             try:
+                 error_body = await e.response.aread()
+             except Exception as read_err:
+                 LOG.logger.error(f"Failed to read error response body: {read_err}")
+             LOG.logger.error(f"HTTP error in non-stream request: {e.response.status_code} - {error_body}")
+             # Re-raise the exception or return an error structure consistent with your error handling
+             raise e # Or return an error dict/object
+        except Exception as e:
+            LOG.logger.error(f"Error during OpenAI non-stream request: {e}", exc_info=True)
+            raise e # Or return an error dict/object
 
 async def make_image_request(prompt, client):
     headers = {
@@ -100,10 +115,10 @@ async def make_image_request(prompt, client):
     LOG.logger.info(f"Making image request with model: {model_name}, base_url: {client.base_url}")
     
     try:
-        async with httpx.AsyncClient(base_url=client.base_url, timeout=60.0) as http_client:
-            response = await http_client.post("/images/generations", json=data, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        http_client = http_clients.get(client.base_url)
+        response = await http_client.post("/images/generations", json=data, headers=headers, timeout=60.0)
+        response.raise_for_status()
+        return response.json()
     except httpx.HTTPStatusError as e:
         error_body = "Unknown error body"
         try:
@@ -119,23 +134,6 @@ async def make_image_request(prompt, client):
     
 # -----------------------------------------------------------------------------
 
-# Add a helper function to process LLM response content
-def process_llm_response(content):
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        # If content is not JSON format, try to extract JSON part from content
-        json_match = re.search(r'```json\s*([\s\S]*?)\s*```', content)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                # If extracted JSON part parsing fails, return original content as text
-                return {"text": content}
-        else:
-            # If no JSON part found, return original content as text
-            return {"text": content}
-
 async def knowledge_extraction(paper, client, user_type=None, stream=False):
     model_name = client.model_name or "deepseek-chat"
     LOG.logger.info(f"Using model {model_name} for knowledge extraction (Stream: {stream}, User Type: {user_type})")
@@ -278,7 +276,7 @@ async def inspiration_chat(inspiration, new_message, client, chat_history=None,
             processed_result["response"] = content 
         return processed_result
 
-def simple_completion(prompt, client, model=None):
+async def simple_completion(prompt, client, model=None, timeout=10.0):
     """
     A simple function to test API connection by sending a basic completion request
     
@@ -286,6 +284,7 @@ def simple_completion(prompt, client, model=None):
         prompt (str): The prompt to send
         client (OpenAIClient): The client instance
         model (str, optional): The model to use, overrides client.model_name if provided
+        timeout (float, optional): Request timeout in seconds
         
     Returns:
         str: The response text
@@ -313,11 +312,12 @@ def simple_completion(prompt, client, model=None):
         base_url = client.base_url or "https://api.deepseek.com/v1"
         LOG.logger.info(f"Making API request to {base_url} with model {model_to_use}")
         
-        response = requests.post(
-            f"{base_url}/chat/completions",
+        http_client = http_clients.get(base_url)
+        response = await http_client.post(
+            "/chat/completions",
             headers=headers,
             json=payload,
-            timeout=10
+            timeout=timeout
         )
         
         if response.status_code == 200:
@@ -336,8 +336,8 @@ def simple_completion(prompt, client, model=None):
             # Raise exception with detailed error information
             raise Exception(json.dumps(error_info))
     
-    except requests.exceptions.RequestException as re:
-        error_msg = f"Network error in API request: {str(re)}"
+    except httpx.HTTPError as he:
+        error_msg = f"Network error in API request: {str(he)}"
         LOG.logger.error(error_msg)
         raise Exception(error_msg)
     except json.JSONDecodeError as je:
@@ -348,4 +348,3 @@ def simple_completion(prompt, client, model=None):
         error_msg = f"Error in simple_completion: {str(e)}"
         LOG.logger.error(error_msg)
         raise Exception(error_msg)
-
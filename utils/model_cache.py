@@ -0,0 +1,119 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from .config import MODEL_CACHE, PROMPT_LAYOUT
+from .http_client import http_clients
+from .log import logger
+
+DEFAULT_MODEL_NAME = "deepseek-chat"
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+
+
+def api_key_fingerprint(api_key: Optional[str]) -> str:
+    """Stable, non-reversible identifier of an API key"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def provider_key(base_url: Optional[str], api_key: Optional[str]) -> str:
+    """Identifier of an upstream provider account, safe to log and expose"""
+    return f"{(base_url or DEFAULT_BASE_URL).rstrip('/')}#{api_key_fingerprint(api_key)[:8]}"
+
+
+def model_provider_key(model) -> str:
+    """provider_key of a LangChain ChatOpenAI model"""
+    api_key = getattr(model, "openai_api_key", None)
+    if hasattr(api_key, "get_secret_value"):
+        api_key = api_key.get_secret_value()
+    return provider_key(getattr(model, "openai_api_base", None), api_key)
+
+
+def stream_usage_supported(base_url: Optional[str]) -> bool:
+    """Whether usage metadata should be requested on streams from this provider"""
+    if not PROMPT_LAYOUT["measure_usage"]:
+        return False
+    return (base_url or DEFAULT_BASE_URL).rstrip("/") in PROMPT_LAYOUT["usage_providers"]
+
+
+def _client_stale(model, base_url: str) -> bool:
+    client = getattr(model, "http_async_client", None)
+    return client is not None and not http_clients.is_current(base_url, client)
+
+
+class ChatModelCache:
+    """
+    Bounded LRU cache of initialized LangChain chat models with a TTL.
+    Keyed by (model_name, base_url, api_key fingerprint), so repeat requests
+    of the same user configuration reuse a warm client.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: int = 1800):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._models: "OrderedDict[Tuple[str, str, str], Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model_name: str, base_url: str, api_key: Optional[str]):
+        key = (model_name, base_url, api_key_fingerprint(api_key))
+        now = time.monotonic()
+
+        entry = self._models.get(key)
+        if entry and _client_stale(entry[0], base_url):
+            # Its HTTP client was evicted from the registry; rebind to the pooled one
+            del self._models[key]
+            self.evictions += 1
+            entry = None
+        if entry and entry[1] > now:
+            self.hits += 1
+            self._models.move_to_end(key)
+            return entry[0]
+        if entry:
+            # Expired
+            del self._models[key]
+            self.evictions += 1
+
+        self.misses += 1
+        # Imported on first use; it pulls in the provider SDKs
+        from langchain.chat_models import init_chat_model
+
+        model = init_chat_model(
+            model=model_name,
+            model_provider="openai",
+            api_key=api_key,
+            base_url=base_url,
+            streaming=True,
+            stream_usage=stream_usage_supported(base_url),
+            http_async_client=http_clients.get(base_url),
+        )
+        self._models[key] = (model, now + self.ttl)
+        while len(self._models) > self.max_size:
+            self._models.popitem(last=False)
+            self.evictions += 1
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._models),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def get_chat_model(current_user: Dict[str, Any]):
+    """Get a cached streaming chat model for the user's API configuration"""
+    return model_cache.get(
+        current_user.get("model_name") or DEFAULT_MODEL_NAME,
+        current_user.get("api_url") or DEFAULT_BASE_URL,
+        current_user.get("api_key") or None,
+    )
+
+
+# Global instance
+model_cache = ChatModelCache(MODEL_CACHE["max_size"], MODEL_CACHE["ttl"])
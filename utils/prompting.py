@@ -8,9 +8,11 @@ _PROMPT_FILE_PATHS = {
     'QUERY_EXPLAIN_SYSTEM_PROMPT': 'query_explain_system_prompt',
     'INTERDISCIPLINARY_EXPERT_SYSTEM_PROMPT': 'interdisciplinary_expert_system_prompt',
     'PRACTICAL_EXPERT_EVALUATE_SYSTEM_PROMPT': 'practical_expert_evaluate_system_prompt',
+    'SINGLE_PASS_EXPERT_SYSTEM_PROMPT': 'single_pass_expert_system_prompt',
     'DRAWING_EXPERT_SYSTEM_PROMPT': 'drawing_expert_system_prompt',
     'HTML_GENERATION_SYSTEM_PROMPT': 'html_generation_system_prompt',
     'INSPIRATION_CHAT_SYSTEM_PROMPT': 'inspiration_chat_system_prompt',
+    'CHAT_SUMMARY_SYSTEM_PROMPT': 'chat_summary_system_prompt',
 }
 
 def _get_prompt_file_path(prompt_name: str) -> str | None:
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import json
+import math
+import re
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+from .config import QUERY_CACHE
+from .redis import async_redis
+from .log import logger
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class QueryAnalysisCache:
+    """
+    Redis cache of QUERY_EXPLAIN results keyed by normalized query + design_doc.
+    With a similarity threshold, near-identical queries on the same design_doc
+    are matched through their embeddings as well.
+    """
+
+    def __init__(
+        self,
+        redis_prefix: str = "innoweaver:query_analysis:",
+        expire: int = 3600 * 24,
+        similarity_threshold: float = 0,
+        max_candidates: int = 200,
+        replay_chunk_size: int = 64,
+    ):
+        self.redis_prefix = redis_prefix
+        self.expire = expire
+        self.similarity_threshold = similarity_threshold
+        self.max_candidates = max_candidates
+        self.replay_chunk_size = replay_chunk_size
+
+    def _entry_key(self, entry_id: str) -> str:
+        return f"{self.redis_prefix}entry:{entry_id}"
+
+    def _candidates_key(self, design_doc: str) -> str:
+        return f"{self.redis_prefix}candidates:{_digest(normalize_text(design_doc))}"
+
+    def _entry_id(self, query: str, design_doc: str) -> str:
+        return _digest(f"{normalize_text(query)}\x00{normalize_text(design_doc)}")
+
+    async def _embedding(self, query: str) -> List[float]:
+        from .vector_store import vector_store
+
+        return await asyncio.to_thread(vector_store.get_embedding, normalize_text(query))
+
+    async def lookup(
+        self, query: str, design_doc: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """Return (cached entry or None, query embedding if one was computed)"""
+        embedding = None
+        try:
+            cached = await async_redis.get(self._entry_key(self._entry_id(query, design_doc)))
+            if cached:
+                return json.loads(cached), None
+
+            if self.similarity_threshold <= 0:
+                return None, None
+
+            embedding = await self._embedding(query)
+            if not embedding:
+                return None, None
+
+            candidates = await async_redis.lrange(
+                self._candidates_key(design_doc), 0, self.max_candidates - 1
+            )
+            best_id, best_score = None, self.similarity_threshold
+            for raw in candidates:
+                candidate = json.loads(raw)
+                score = _cosine_similarity(embedding, candidate["embedding"])
+                if score >= best_score:
+                    best_id, best_score = candidate["id"], score
+
+            if best_id:
+                cached = await async_redis.get(self._entry_key(best_id))
+                if cached:
+                    logger.info(f"Semantic query analysis cache hit (similarity: {best_score:.3f})")
+                    return json.loads(cached), embedding
+        except Exception as e:
+            logger.error(f"Query analysis cache lookup failed: {str(e)}")
+        return None, embedding
+
+    async def store(
+        self,
+        query: str,
+        design_doc: str,
+        content: str,
+        result: Dict[str, Any],
+        embedding: Optional[List[float]] = None,
+    ):
+        # Only cache responses that parsed into structured JSON
+        if not content or not isinstance(result, dict) or "text" in result:
+            return
+
+        entry_id = self._entry_id(query, design_doc)
+        try:
+            await async_redis.setex(
+                self._entry_key(entry_id),
+                self.expire,
+                json.dumps({"content": content, "result": result}),
+            )
+            if self.similarity_threshold <= 0:
+                return
+
+            if embedding is None:
+                embedding = await self._embedding(query)
+            if embedding:
+                candidates_key = self._candidates_key(design_doc)
+                await async_redis.lpush(
+                    candidates_key, json.dumps({"id": entry_id, "embedding": embedding})
+                )
+                await async_redis.ltrim(candidates_key, 0, self.max_candidates - 1)
+                await async_redis.expire(candidates_key, self.expire)
+        except Exception as e:
+            logger.error(f"Query analysis cache store failed: {str(e)}")
+
+    async def replay(
+        self, entry: Dict[str, Any], send_event: Callable[[str, Any], Awaitable[None]]
+    ):
+        """Send a cached entry with the same chunk/result events as a live stream"""
+        content = entry["content"]
+        for start in range(0, len(content), self.replay_chunk_size):
+            await send_event("chunk", {"text": content[start:start + self.replay_chunk_size]})
+        await send_event("result", entry["result"])
+
+
+# Global instance
+query_cache = QueryAnalysisCache(
+    redis_prefix="innoweaver:query_analysis:",
+    expire=QUERY_CACHE["expire"],
+    similarity_threshold=QUERY_CACHE["similarity_threshold"],
+    max_candidates=QUERY_CACHE["max_candidates"],
+    replay_chunk_size=QUERY_CACHE["replay_chunk_size"],
+)
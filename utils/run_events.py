@@ -0,0 +1,240 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from .config import RUN_EVENTS
+from .redis import async_redis
+from .sse import ChunkCoalescer, sse_stats
+from .run_metrics import active_runs
+from .log import logger
+
+SendEvent = Callable[[str, Any], Awaitable[None]]
+
+
+class RunStalled(Exception):
+    """The run stopped publishing events without finishing"""
+
+
+# Claim a stopped run for a restart: fails while it is live or its job is pending
+CLAIM_RESTART = """
+if redis.call('EXISTS', KEYS[1]) == 1 or redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+redis.call('SET', KEYS[1], '1', 'EX', ARGV[1])
+return 1
+"""
+
+
+class RunEvents:
+    """
+    Per-run event log in a capped Redis Stream. Whoever runs the workflow
+    (a web worker or a queue worker) publishes its events, and any number of
+    SSE connections replay and follow them from a Last-Event-ID.
+    """
+
+    prefix = "innoweaver:run"
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+
+    def _key(self, run_id: str, name: str = "events") -> str:
+        return f"{self.prefix}:{run_id}:{name}"
+
+    async def create(self, run_id: str, user_id: str):
+        async with async_redis.pipeline(transaction=False) as pipe:
+            pipe.setex(self._key(run_id, "owner"), self.config["expire"], user_id)
+            pipe.delete(
+                self._key(run_id, "cancel"), self._key(run_id, "status"), self._key(run_id, "job")
+            )
+            await pipe.execute()
+
+    async def owner(self, run_id: str) -> Optional[str]:
+        return await async_redis.get(self._key(run_id, "owner"))
+
+    async def exists(self, run_id: str) -> bool:
+        return bool(await async_redis.exists(self._key(run_id)))
+
+    async def last_id(self, run_id: str) -> str:
+        entries = await async_redis.xrevrange(self._key(run_id), count=1)
+        return entries[0][0] if entries else "0-0"
+
+    async def publish(self, run_id: str, event_type: str, payload: Any) -> str:
+        key = self._key(run_id)
+        async with async_redis.pipeline(transaction=False) as pipe:
+            pipe.xadd(
+                key,
+                {"event": event_type, "data": json.dumps(payload, ensure_ascii=False, default=str)},
+                maxlen=self.config["max_length"],
+                approximate=True,
+            )
+            pipe.expire(key, self.config["expire"])
+            event_id, _ = await pipe.execute()
+        return event_id
+
+    async def mark_queued(self, run_id: str):
+        """The run has a job on the queue until mark_done"""
+        await async_redis.setex(self._key(run_id, "job"), self.config["expire"], "1")
+
+    async def job_pending(self, run_id: str) -> bool:
+        """A queued job of the run is waiting, running or waiting to be reclaimed"""
+        return bool(await async_redis.exists(self._key(run_id, "job")))
+
+    async def claim_restart(self, run_id: str) -> bool:
+        """
+        Atomically check that the run is neither live nor queued and mark it
+        live, so only one of several concurrent resumes starts it again.
+        """
+        return bool(
+            await async_redis.eval(
+                CLAIM_RESTART,
+                2,
+                self._key(run_id, "live"),
+                self._key(run_id, "job"),
+                self.config["live_ttl"],
+            )
+        )
+
+    async def mark_live(self, run_id: str):
+        await async_redis.setex(self._key(run_id, "live"), self.config["live_ttl"], "1")
+
+    async def mark_done(self, run_id: str, status: str):
+        async with async_redis.pipeline(transaction=False) as pipe:
+            pipe.setex(self._key(run_id, "status"), self.config["expire"], status)
+            pipe.delete(self._key(run_id, "live"), self._key(run_id, "job"))
+            await pipe.execute()
+
+    async def status(self, run_id: str) -> Optional[str]:
+        """"completed", "failed" or "cancelled" once the run has finished"""
+        return await async_redis.get(self._key(run_id, "status"))
+
+    async def is_live(self, run_id: str) -> bool:
+        return bool(await async_redis.exists(self._key(run_id, "live")))
+
+    async def _read(self, key: str, last_id: str, block: Optional[int] = None):
+        response = await async_redis.xread({key: last_id}, count=100, block=block)
+        return [message for _, messages in response or [] for message in messages]
+
+    async def subscribe(
+        self, run_id: str, last_id: str = "0-0", start_timeout: Optional[float] = None
+    ) -> AsyncIterator[Tuple[str, str, Any]]:
+        """
+        Yield (event_id, event_type, payload) after `last_id`, replaying the
+        log first and then following the live run. Raises RunStalled when the
+        run is not live and nothing new arrives, allowing `start_timeout`
+        seconds for a queued run to be picked up and `reclaim_wait` seconds
+        for the pending job of a stopped worker to be reclaimed.
+        """
+        key = self._key(run_id)
+        waited = 0.0
+        block_ms = self.config["block_ms"]
+        while True:
+            messages = await self._read(key, last_id, block_ms)
+            if not messages:
+                waited += block_ms / 1000
+                if await self.is_live(run_id):
+                    # Started; from now on a run that is not live has stopped
+                    start_timeout = None
+                    waited = 0.0
+                    continue
+                if start_timeout is not None and waited < start_timeout:
+                    continue
+                if waited < self.config["reclaim_wait"] and await self.job_pending(run_id):
+                    continue
+                # The producer may have published its last events while we checked
+                messages = await self._read(key, last_id)
+                if not messages:
+                    raise RunStalled(f"Run {run_id} stopped without finishing")
+            for event_id, fields in messages:
+                last_id = event_id
+                yield event_id, fields["event"], json.loads(fields["data"])
+
+    async def request_cancel(self, run_id: str):
+        await async_redis.setex(self._key(run_id, "cancel"), self.config["expire"], "1")
+
+    async def cancelled(self, run_id: str) -> bool:
+        return bool(await async_redis.exists(self._key(run_id, "cancel")))
+
+
+async def run_logged(
+    endpoint: str, run_id: str, workflow: Callable[[SendEvent], Awaitable[Any]]
+):
+    """
+    Run `workflow(send_event)`, publishing its coalesced events to the run's
+    event log until the final "end" event. The run keeps going when clients
+    disconnect; it stops only when cancelled through `request_cancel`.
+    """
+    outbox: asyncio.Queue = asyncio.Queue()
+    coalescer = ChunkCoalescer(endpoint, outbox.put_nowait, sse_stats)
+
+    async def publisher():
+        while True:
+            msg = await outbox.get()
+            try:
+                await run_events.publish(run_id, msg["event"], msg["data"])
+            except Exception as e:
+                # Drop the event rather than stop draining the outbox
+                logger.error(f"{endpoint} run {run_id} lost a {msg['event']} event: {str(e)}")
+            if msg["event"] == "end":
+                break
+
+    async def keep_live():
+        while True:
+            await run_events.mark_live(run_id)
+            await asyncio.sleep(RUN_EVENTS["live_ttl"] / 3)
+
+    checked = 0.0
+
+    async def send_event(event_type: str, payload: Any):
+        nonlocal checked
+        now = time.monotonic()
+        if now - checked >= RUN_EVENTS["cancel_check_interval"]:
+            checked = now
+            if await run_events.cancelled(run_id):
+                raise asyncio.CancelledError()
+        coalescer.send(event_type, payload)
+
+    await run_events.mark_live(run_id)
+    publishing = asyncio.create_task(publisher())
+    heartbeat = asyncio.create_task(keep_live())
+    status = "failed"
+    try:
+        with active_runs.track(endpoint):
+            await workflow(send_event)
+        status = "completed"
+    except asyncio.CancelledError:
+        print(f"{endpoint} run {run_id} cancelled")
+        status = "cancelled"
+        coalescer.send("cancelled", {"run_id": run_id})
+    except Exception as e:
+        logger.error(f"{endpoint} run {run_id} failed: {str(e)}")
+        coalescer.send("error", str(e))
+    finally:
+        coalescer.send("end", "complete")
+        heartbeat.cancel()
+        try:
+            await publishing
+        finally:
+            await run_events.mark_done(run_id, status)
+
+
+_background_runs: Dict[str, asyncio.Task] = {}
+
+
+def start_background_run(
+    endpoint: str, run_id: str, workflow: Callable[[SendEvent], Awaitable[Any]]
+) -> asyncio.Task:
+    """Run a logged workflow in this process, independent of any request"""
+    task = asyncio.create_task(run_logged(endpoint, run_id, workflow))
+    _background_runs[run_id] = task
+    task.add_done_callback(lambda _: _background_runs.pop(run_id, None))
+    return task
+
+
+async def wait_background_runs():
+    """Let this process's background runs finish, e.g. before a worker exits"""
+    if _background_runs:
+        await asyncio.wait(list(_background_runs.values()))
+
+
+# Global instance
+run_events = RunEvents(RUN_EVENTS)
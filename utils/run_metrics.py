@@ -0,0 +1,224 @@
+import datetime
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from .config import RUN_METRICS
+from .context_builder import count_tokens
+from .db import run_metrics_collection
+from .log import logger
+
+
+class NodeTimer:
+    """Wall time, time-to-first-token and token usage of one node or LLM call"""
+
+    def __init__(self, node: str):
+        self.node = node
+        self.started = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.usage: Dict[str, int] = {}
+
+    def mark_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    def set_usage(self, usage: Dict[str, Any]):
+        details = usage.get("input_token_details") or {}
+        self.usage = {
+            "input_tokens": usage.get("input_tokens", 0) or 0,
+            "output_tokens": usage.get("output_tokens", 0) or 0,
+            "cached_tokens": details.get("cache_read", 0) or 0,
+            "usage_estimated": bool(usage.get("estimated")),
+        }
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.monotonic()
+
+    def record(self) -> Dict[str, Any]:
+        finished = self.finished or time.monotonic()
+        record = {
+            "node": self.node,
+            "wall_ms": round((finished - self.started) * 1000, 1),
+            "ttft_ms": None,
+            "tokens_per_sec": None,
+            **self.usage,
+        }
+        if self.first_token_at is not None:
+            record["ttft_ms"] = round((self.first_token_at - self.started) * 1000, 1)
+            generation = finished - self.first_token_at
+            if self.usage.get("output_tokens") and generation > 0:
+                record["tokens_per_sec"] = round(self.usage["output_tokens"] / generation, 1)
+        return record
+
+
+def estimate_usage(chain, inputs: Dict[str, Any], completion: str) -> Dict[str, Any]:
+    """
+    Local token counts for a call whose provider sent no usage: the prompt
+    rendered by the first step of `chain` (prompt | model) and the completion
+    """
+    try:
+        messages = chain.first.invoke(inputs).to_messages()
+        prompt = "\n".join(str(message.content) for message in messages)
+    except Exception:
+        prompt = ""
+    return {
+        "input_tokens": count_tokens(prompt) if prompt else 0,
+        "output_tokens": count_tokens(completion) if completion else 0,
+        "estimated": True,
+    }
+
+
+class RunMetrics:
+    """Per-node accounting of one research, query or chat run, stored in run_metrics"""
+
+    def __init__(self, kind: str, run_id: str, user_id: str, model: Optional[str]):
+        self.kind = kind
+        self.run_id = run_id
+        self.user_id = user_id
+        self.model = model
+        self.started = time.monotonic()
+        self.created_at = datetime.datetime.utcnow()
+        self.timers: Dict[str, NodeTimer] = {}
+        # Degradations taken to meet the run's deadline
+        self.shortcuts: List[Dict[str, str]] = []
+        # Research quality level (fast, balanced or thorough)
+        self.mode: Optional[str] = None
+
+    @classmethod
+    def for_model(cls, kind: str, run_id: str, current_user: Dict[str, Any], model) -> "RunMetrics":
+        return cls(
+            kind,
+            run_id,
+            str(current_user.get("_id")),
+            getattr(model, "model_name", None) or getattr(model, "model", None),
+        )
+
+    def start(self, node: str) -> NodeTimer:
+        timer = NodeTimer(node)
+        self.timers[node] = timer
+        return timer
+
+    def timer(self, node: Optional[str]) -> Optional[NodeTimer]:
+        return self.timers.get(node) if node else None
+
+    async def save(self, status: str = "completed"):
+        if not RUN_METRICS["enabled"]:
+            return
+        nodes = [timer.record() for timer in self.timers.values()]
+        document = {
+            "run_id": self.run_id,
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "model": self.model,
+            "status": status,
+            "created_at": self.created_at,
+            "wall_ms": round((time.monotonic() - self.started) * 1000, 1),
+            "input_tokens": sum(node.get("input_tokens", 0) for node in nodes),
+            "output_tokens": sum(node.get("output_tokens", 0) for node in nodes),
+            "cached_tokens": sum(node.get("cached_tokens", 0) for node in nodes),
+            "nodes": nodes,
+            "shortcuts": self.shortcuts,
+            "mode": self.mode,
+        }
+        try:
+            await run_metrics_collection.insert_one(document)
+        except Exception as e:
+            logger.error(f"Failed to save run metrics for {self.run_id}: {str(e)}")
+
+
+class ActiveRuns:
+    """Runs executing in this process right now, and the most seen at once"""
+
+    def __init__(self):
+        self.current: Dict[str, int] = {}
+        self.peak: Dict[str, int] = {}
+        self.peak_total = 0
+
+    @contextmanager
+    def track(self, kind: str):
+        self.current[kind] = self.current.get(kind, 0) + 1
+        self.peak[kind] = max(self.peak.get(kind, 0), self.current[kind])
+        self.peak_total = max(self.peak_total, sum(self.current.values()))
+        try:
+            yield
+        finally:
+            self.current[kind] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "current": dict(self.current),
+            "current_total": sum(self.current.values()),
+            "peak": dict(self.peak),
+            "peak_total": self.peak_total,
+        }
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return {"p50": None, "p90": None, "p99": None}
+
+    def pick(p: float) -> float:
+        return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+    return {"p50": pick(50), "p90": pick(90), "p99": pick(99)}
+
+
+def _summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "count": len(records),
+        "wall_ms": percentiles([r.get("wall_ms") for r in records]),
+        "ttft_ms": percentiles([r.get("ttft_ms") for r in records]),
+        "tokens_per_sec": percentiles([r.get("tokens_per_sec") for r in records]),
+        "input_tokens": sum(r.get("input_tokens", 0) for r in records),
+        "output_tokens": sum(r.get("output_tokens", 0) for r in records),
+        "cached_tokens": sum(r.get("cached_tokens", 0) for r in records),
+    }
+
+
+async def run_metrics_stats(
+    kind: Optional[str] = None,
+    user_id: Optional[str] = None,
+    days: int = 7,
+    mode: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Percentiles per node and per model over the most recent runs"""
+    query: Dict[str, Any] = {
+        "created_at": {"$gte": datetime.datetime.utcnow() - datetime.timedelta(days=days)}
+    }
+    if kind:
+        query["kind"] = kind
+    if user_id:
+        query["user_id"] = user_id
+    if mode:
+        query["mode"] = mode
+
+    cursor = (
+        run_metrics_collection.find(query, {"_id": 0, "model": 1, "nodes": 1, "wall_ms": 1})
+        .sort("created_at", -1)
+        .limit(RUN_METRICS["stats_max_runs"])
+    )
+    by_node: Dict[str, List[Dict[str, Any]]] = {}
+    by_model: Dict[str, List[Dict[str, Any]]] = {}
+    run_wall = []
+    async for run in cursor:
+        run_wall.append(run.get("wall_ms"))
+        for record in run.get("nodes", []):
+            by_node.setdefault(record["node"], []).append(record)
+            if record.get("ttft_ms") is not None:
+                # Only LLM calls say anything about the model
+                by_model.setdefault(run.get("model") or "unknown", []).append(record)
+
+    return {
+        "runs": len(run_wall),
+        "run_wall_ms": percentiles(run_wall),
+        "nodes": {node: _summarize(records) for node, records in by_node.items()},
+        "models": {model: _summarize(records) for model, records in by_model.items()},
+    }
+
+
+# Global instance
+active_runs = ActiveRuns()
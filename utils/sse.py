@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+from .config import SSE_COALESCE
+
+# Payload fields that carry a token delta and are concatenated when merging;
+# every other field is replaced by the latest value
+DELTA_FIELDS = ("text", "delta")
+
+
+class SSEStats:
+    """Chunk events received and frames emitted per SSE endpoint"""
+
+    def __init__(self):
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, chunks: int = 0, frames: int = 0):
+        stats = self._endpoints.setdefault(endpoint, {"chunks": 0, "frames": 0})
+        stats["chunks"] += chunks
+        stats["frames"] += frames
+
+    def stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, stats in self._endpoints.items():
+            saved = stats["chunks"] - stats["frames"]
+            endpoints[endpoint] = {
+                "chunks": stats["chunks"],
+                "chunk_frames": stats["frames"],
+                "frames_saved": saved,
+                "saved_ratio": round(saved / stats["chunks"], 3) if stats["chunks"] else 0.0,
+                **coalesce_settings(endpoint),
+            }
+        return endpoints
+
+
+def coalesce_settings(endpoint: str) -> Dict[str, Any]:
+    return {**SSE_COALESCE["default"], **SSE_COALESCE["endpoints"].get(endpoint, {})}
+
+
+def merge_chunk(current: Any, payload: Any) -> Any:
+    """Merge a chunk payload into the buffered one"""
+    if current is None:
+        return dict(payload) if isinstance(payload, dict) else payload
+    if isinstance(current, str) and isinstance(payload, str):
+        return current + payload
+    if isinstance(current, dict) and isinstance(payload, dict):
+        merged = {**current, **payload}
+        for field in DELTA_FIELDS:
+            if isinstance(current.get(field), str) and isinstance(payload.get(field), str):
+                merged[field] = current[field] + payload[field]
+        return merged
+    return payload
+
+
+def _payload_size(payload: Any) -> int:
+    if isinstance(payload, dict):
+        return sum(len(payload[field]) for field in DELTA_FIELDS if isinstance(payload.get(field), str))
+    return len(payload) if isinstance(payload, str) else 0
+
+
+class ChunkCoalescer:
+    """
+    Batches "chunk" events into one SSE frame per time window or size limit.
+    Any other event flushes the buffer first, so event order is preserved.
+    """
+
+    def __init__(self, endpoint: str, emit: Callable[[Dict[str, Any]], None], stats: SSEStats):
+        settings = coalesce_settings(endpoint)
+        self.endpoint = endpoint
+        self.window = settings["window_ms"] / 1000
+        self.max_bytes = settings["max_bytes"]
+        self.emit = emit
+        self.stats = stats
+        self._buffer: Any = None
+        self._buffered = 0
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def send(self, event_type: str, payload: Any):
+        if event_type != "chunk" or self.window <= 0:
+            self.flush()
+            if event_type == "chunk":
+                self.stats.record(self.endpoint, chunks=1, frames=1)
+            self.emit({"event": event_type, "data": payload})
+            return
+
+        self._buffer = merge_chunk(self._buffer, payload)
+        self._buffered += 1
+        self._size += _payload_size(payload)
+        if self._size >= self.max_bytes:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffered:
+            return
+        self.stats.record(self.endpoint, chunks=self._buffered, frames=1)
+        self.emit({"event": "chunk", "data": self._buffer})
+        self._buffer = None
+        self._buffered = 0
+        self._size = 0
+
+
+class DisconnectCheck:
+    """Rate-limits `request.is_disconnected()` polling to once per interval"""
+
+    def __init__(self, request, interval: float):
+        self.request = request
+        self.interval = interval
+        self._checked = 0.0
+
+    async def __call__(self, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and now - self._checked < self.interval:
+            return False
+        self._checked = now
+        return await self.request.is_disconnected()
+
+
+# Global instance
+sse_stats = SSEStats()
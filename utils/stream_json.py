@@ -0,0 +1,142 @@
+import json
+import re
+from typing import List, Dict, Any, Optional
+
+
+def process_llm_response(content: str) -> dict:
+    """
+    Parses the LLM's string response into a dictionary.
+    Handles raw JSON strings and JSON within markdown code blocks.
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        # If content is not JSON format, try to extract JSON part from content
+        json_match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
+        if json_match:
+            try:
+                return json.loads(json_match.group(1))
+            except json.JSONDecodeError:
+                # If extracted JSON part parsing fails, return original content as text
+                return {"text": content}
+        else:
+            # If no JSON part found, return original content as text
+            return {"text": content}
+
+
+class SolutionStreamParser:
+    """
+    Incremental scanner for streamed LLM JSON output.
+
+    Feed it text chunks as they arrive; it returns every element of the
+    solutions array as soon as that element is complete. The solutions array
+    is either the top-level array or the "solutions" field of the top-level
+    object. Anything before the first bracket (e.g. a ```json fence) is ignored,
+    and `done` turns true once the top-level value is closed.
+    """
+
+    def __init__(self, solutions_key: str = "solutions"):
+        self.solutions_key = solutions_key
+        self.done = False
+        self.emitted = 0
+        self._buffer: List[str] = []
+        self._length = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._solutions_depth: Optional[int] = None
+        self._element_start: Optional[int] = None
+
+    @property
+    def document(self) -> Optional[str]:
+        """The complete top-level JSON text, once `done`"""
+        if self._start is None or self._end is None:
+            return None
+        return self._text()[self._start:self._end + 1]
+
+    def _text(self) -> str:
+        if len(self._buffer) > 1:
+            self._buffer = ["".join(self._buffer)]
+        return self._buffer[0] if self._buffer else ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        if self.done or not chunk:
+            return []
+
+        offset = self._length
+        self._buffer.append(chunk)
+        self._length += len(chunk)
+        completed = []
+
+        for i, char in enumerate(chunk):
+            position = offset + i
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._stack[0] == "{":
+                        self._last_key = self._text()[self._string_start + 1:position]
+                continue
+
+            if self._start is None:
+                if char not in "{[":
+                    continue
+                self._start = position
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+            elif char in "{[":
+                if self._is_solutions_array(char):
+                    self._solutions_depth = len(self._stack) + 1
+                elif char == "{" and len(self._stack) == self._solutions_depth:
+                    self._element_start = position
+                self._stack.append(char)
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if (
+                    char == "}"
+                    and self._element_start is not None
+                    and len(self._stack) == self._solutions_depth
+                ):
+                    element = self._parse(self._text()[self._element_start:position + 1])
+                    self._element_start = None
+                    if element is not None:
+                        self.emitted += 1
+                        completed.append(element)
+                elif char == "]" and len(self._stack) + 1 == self._solutions_depth:
+                    # The solutions array is closed, ignore later arrays
+                    self._solutions_depth = -1
+                if not self._stack:
+                    self._end = position
+                    self.done = True
+                    break
+
+        return completed
+
+    def _is_solutions_array(self, char: str) -> bool:
+        if char != "[" or self._solutions_depth is not None:
+            return False
+        if not self._stack:
+            return True
+        return (
+            self._stack == ["{"]
+            and (self._last_key or "").lower() == self.solutions_key.lower()
+        )
+
+    @staticmethod
+    def _parse(text: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
@@ -1,13 +1,21 @@
-import re
 from dotenv import load_dotenv
 import utils.log as LOG
 import utils.tasks.query_load as QUERY
 import utils.prompting as prompting
-import json
-from typing import Callable, Any, Awaitable
-from langchain.chat_models import init_chat_model
+import uuid
+from typing import Callable, Any, Awaitable, Optional
+from contextlib import nullcontext, aclosing
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from utils.model_cache import get_chat_model
+from utils.stream_json import process_llm_response
+from utils.query_cache import query_cache
+from utils.config import QUERY_CACHE, CHAT_PROTOCOL
+from utils.llm_limiter import llm_limiters
+from utils.hedging import stream_hedger
+from utils.run_metrics import RunMetrics, NodeTimer, estimate_usage
+from utils.chat_session import chat_sessions
+from utils.chat_context import chat_context_packs
 
 class OpenAIClient:
     def __init__(self, api_key, base_url, model_name=None):
@@ -17,65 +25,83 @@ class OpenAIClient:
 
 # --- Helper Functions  ---
 
-def process_llm_response(content: str) -> dict:
-    """
-    Parses the LLM's string response into a dictionary.
-    Handles raw JSON strings and JSON within markdown code blocks.
-    """
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        json_match = re.search(r'```json\s*([\s\S]*?)\s*```', content, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                return {"text": content} # Return original content if extracted JSON is invalid
-        else:
-            return {"text": content} # Return original content if no JSON is found
+def _provider_slot(model):
+    """Concurrency slot of the model's provider, or a no-op without a model"""
+    return llm_limiters.for_model(model).slot() if model is not None else nullcontext()
 
-async def stream_simple_chain(chain, inputs, send_event: Callable[[str, Any], Awaitable[None]]) -> str:
+async def stream_simple_chain(chain, inputs, send_event: Callable[[str, Any], Awaitable[None]], model=None, timer: Optional[NodeTimer] = None) -> str:
     """
     Streams a simple chain for tasks like query_analysis.
     Sends text chunks to the client.
     """
     full_content = ""
     try:
-        async for chunk in chain.astream(inputs):
-            content_piece = chunk.content
-            if content_piece:
-                full_content += content_piece
-                await send_event("chunk", {"text": content_piece})
+        stream = stream_hedger.open(model, lambda: chain.astream(inputs))
+        async with _provider_slot(model), aclosing(stream):
+            async for chunk in stream:
+                if timer and getattr(chunk, "usage_metadata", None):
+                    timer.set_usage(chunk.usage_metadata)
+                content_piece = chunk.content
+                if content_piece:
+                    if timer:
+                        timer.mark_token()
+                    full_content += content_piece
+                    await send_event("chunk", {"text": content_piece})
     except Exception as e:
         LOG.logger.error(f"Error during LangChain stream: {e}", exc_info=True)
         await send_event("error", f"Streaming Error: {e}")
+    if timer and not timer.usage and full_content:
+        timer.set_usage(estimate_usage(chain, inputs, full_content))
     return full_content
 
-async def stream_chat_chain(chain, inputs, send_event: Callable[[str, Any], Awaitable[None]]) -> str:
+def negotiate_chat_protocol(requested: Optional[int]) -> int:
+    """Highest supported chat protocol version not above the requested one"""
+    try:
+        requested = int(requested) if requested is not None else CHAT_PROTOCOL["default_version"]
+    except (TypeError, ValueError):
+        requested = CHAT_PROTOCOL["default_version"]
+    versions = [v for v in CHAT_PROTOCOL["supported_versions"] if v <= requested]
+    return max(versions) if versions else min(CHAT_PROTOCOL["supported_versions"])
+
+async def stream_chat_chain(chain, inputs, send_event: Callable[[str, Any], Awaitable[None]], model=None, timer: Optional[NodeTimer] = None, protocol: int = 1) -> str:
     """
     Streams a chain specifically for the inspiration chat.
-    Sends a richer payload (`delta`, `content`, `message`) for the chat UI.
+    Protocol 1 sends a richer payload (`delta`, `content`, `message`) for the chat UI;
+    protocol 2 sends only `delta` and a sequence number.
     """
     full_content = ""
+    seq = 0
     try:
-        async for chunk in chain.astream(inputs):
-            content_piece = chunk.content
-            if content_piece:
-                full_content += content_piece
-                payload = {
-                    "delta": content_piece,
-                    "content": full_content,
-                    "message": {"role": "assistant", "content": full_content}
-                }
-                await send_event("chunk", payload)
+        stream = stream_hedger.open(model, lambda: chain.astream(inputs))
+        async with _provider_slot(model), aclosing(stream):
+            async for chunk in stream:
+                if timer and getattr(chunk, "usage_metadata", None):
+                    timer.set_usage(chunk.usage_metadata)
+                content_piece = chunk.content
+                if content_piece:
+                    if timer:
+                        timer.mark_token()
+                    full_content += content_piece
+                    if protocol >= 2:
+                        payload = {"delta": content_piece, "seq": seq}
+                    else:
+                        payload = {
+                            "delta": content_piece,
+                            "content": full_content,
+                            "message": {"role": "assistant", "content": full_content}
+                        }
+                    seq += 1
+                    await send_event("chunk", payload)
     except Exception as e:
         LOG.logger.error(f"Error during LangChain chat stream: {e}", exc_info=True)
         await send_event("error", f"Streaming Error: {e}")
+    if timer and not timer.usage and full_content:
+        timer.set_usage(estimate_usage(chain, inputs, full_content))
     return full_content
 
 # --- Refactored Core Logic ---
 
-async def query_analysis(query: str, documents: str, model, send_event: Callable[[str, Any], Awaitable[None]]):
+async def query_analysis(query: str, documents: str, model, send_event: Callable[[str, Any], Awaitable[None]], timer: Optional[NodeTimer] = None):
     """
     Refactored to use LangChain for query analysis.
     """
@@ -92,42 +118,58 @@ async def query_analysis(query: str, documents: str, model, send_event: Callable
     chain = prompt | model
 
     # Use the new streaming helper
-    full_content = await stream_simple_chain(chain, {}, send_event)
+    full_content = await stream_simple_chain(chain, {}, send_event, model=model, timer=timer)
 
     if full_content:
         processed_response = process_llm_response(full_content)
         await send_event("result", processed_response)
+        return full_content, processed_response
+    return full_content, None
 
 
 async def query(current_user: dict, query_text: str, design_doc: str, send_event: Callable[[str, Any], Awaitable[None]]):
     """
-    Endpoint entry function. Now initializes a LangChain model.
+    Endpoint entry function. Reuses a cached LangChain model for the user's configuration.
     """
     print(f"User {current_user['email']} is calling /api/query")
     load_dotenv()
     
-    # Initialize LangChain model instead of custom client
-    model = init_chat_model(
-        model=current_user.get('model_name') or "deepseek-chat",
-        model_provider="openai",
-        api_key=current_user.get('api_key'),
-        base_url=current_user.get('api_url') or "https://api.deepseek.com/v1",
-        streaming=True
-    )
+    embedding = None
+    if QUERY_CACHE["enabled"]:
+        cached, embedding = await query_cache.lookup(query_text, design_doc)
+        if cached:
+            LOG.logger.info("Replaying cached query analysis result")
+            await query_cache.replay(cached, send_event)
+            return
+
+    model = get_chat_model(current_user)
+    metrics = RunMetrics.for_model("query", uuid.uuid4().hex, current_user, model)
+    timer = metrics.start("query_analysis")
     
-    await query_analysis(query_text, design_doc, model, send_event)
+    full_content, processed_response = await query_analysis(query_text, design_doc, model, send_event, timer=timer)
+    timer.finish()
+    await metrics.save("completed" if processed_response else "failed")
+    if QUERY_CACHE["enabled"] and processed_response:
+        await query_cache.store(query_text, design_doc, full_content, processed_response, embedding)
 
 
-async def _inspiration_chat_streamer(inspiration: str, new_message: str, model, chat_history: list, send_event: Callable[[str, Any], Awaitable[None]]):
+async def _inspiration_chat_streamer(inspiration: str, new_message: str, model, chat_history: list, send_event: Callable[[str, Any], Awaitable[None]], timer: Optional[NodeTimer] = None, protocol: int = 1, session: Optional[dict] = None) -> str:
     """
     Refactored to use LangChain for inspiration chat.
+    With a server-side session, the summary and stored turns replace chat_history.
     """
     LOG.logger.info(f"Using LangChain model for inspiration chat (Stream: True)")
     
     system_prompt = prompting.get_prompt('INSPIRATION_CHAT_SYSTEM_PROMPT')
     messages = [SystemMessage(content=system_prompt)]
     
-    if chat_history and isinstance(chat_history, list):
+    if session is not None:
+        messages.append(SystemMessage(content=f"Inspiration: {inspiration}"))
+        if session["summary"]:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{session['summary']}"))
+        messages.extend([HumanMessage(content=msg['content']) if msg['role'] == 'user' else AIMessage(content=msg['content']) for msg in session["messages"]])
+        messages.append(HumanMessage(content=new_message))
+    elif chat_history and isinstance(chat_history, list):
         messages.extend([HumanMessage(content=msg['content']) if msg['role'] == 'user' else SystemMessage(content=msg['content']) for msg in chat_history])
         messages.append(HumanMessage(content=new_message))
     else:
@@ -137,32 +179,53 @@ async def _inspiration_chat_streamer(inspiration: str, new_message: str, model,
     chain = prompt | model
     
     # Use the chat-specific streaming helper
-    full_content = await stream_chat_chain(chain, {}, send_event)
+    full_content = await stream_chat_chain(chain, {}, send_event, model=model, timer=timer, protocol=protocol)
     
     if full_content:
-        final_payload = {
-            "content": full_content,
-            "message": {"role": "assistant", "content": full_content}
-        }
+        if protocol >= 2:
+            # The full reply once, without the repeated message copy
+            final_payload = {"content": full_content, "done": True}
+        else:
+            final_payload = {
+                "content": full_content,
+                "message": {"role": "assistant", "content": full_content}
+            }
         await send_event("result", final_payload)
+    return full_content
 
 
-async def handle_inspiration_chat(current_user: dict, inspiration_id: str, new_message: str, chat_history: list, send_event: Callable[[str, Any], Awaitable[None]]):
+async def handle_inspiration_chat(current_user: dict, inspiration_id: str, new_message: str, chat_history: list, send_event: Callable[[str, Any], Awaitable[None]], protocol: Optional[int] = None, session_id: Optional[str] = None, use_session: bool = False):
     """
-    Endpoint entry function for inspiration chat. Now initializes a LangChain model.
+    Endpoint entry function for inspiration chat. Reuses a cached LangChain model.
+    With `use_session`, the conversation is kept server-side under session_id
+    (a new session is created when it is missing) and chat_history is ignored.
     """
     print(f"User {current_user['email']} is calling /task/inspiration/chat (Stream: True)")
-    inspiration_doc = await QUERY.query_solution(inspiration_id)
-    # Extract the relevant inspiration content, assuming it's in a specific field
-    inspiration_text = json.dumps(inspiration_doc) if inspiration_doc else "No inspiration found."
-
-    # Initialize LangChain model
-    model = init_chat_model(
-        model=current_user.get('model_name') or "deepseek-chat",
-        model_provider="openai",
-        api_key=current_user.get('api_key'),
-        base_url=current_user.get('api_url') or "https://api.deepseek.com/v1",
-        streaming=True
-    )
+    protocol = negotiate_chat_protocol(protocol)
+    if protocol >= 2:
+        await send_event("protocol", {"version": protocol})
+
+    session = None
+    user_id = str(current_user["_id"])
+    if use_session:
+        session = await chat_sessions.load(user_id, inspiration_id, session_id) if session_id else None
+        if session is None:
+            session_id = session_id or chat_sessions.new_session_id()
+            session = chat_sessions.new_session()
+        await send_event("session", {"session_id": session_id, "summarized_messages": session["summarized_messages"]})
+
+    # Compact solution + cited paper digests, cached across turns and users
+    inspiration_text = await chat_context_packs.get(inspiration_id) or "No inspiration found."
+
+    model = get_chat_model(current_user)
+    metrics = RunMetrics.for_model("chat", uuid.uuid4().hex, current_user, model)
+    timer = metrics.start("inspiration_chat")
     
-    await _inspiration_chat_streamer(inspiration_text, new_message, model, chat_history, send_event)
\ No newline at end of file
+    full_content = await _inspiration_chat_streamer(inspiration_text, new_message, model, chat_history, send_event, timer=timer, protocol=protocol, session=session)
+    timer.finish()
+    await metrics.save()
+
+    if session is not None and full_content:
+        await chat_sessions.record_turn(user_id, inspiration_id, session_id, session, new_message, full_content)
+        # Fold older turns into the summary after this response, so the next turn starts small
+        chat_sessions.compact_later(user_id, inspiration_id, session_id, model)
@@ -6,19 +6,16 @@ from utils.db import (
     solutions_collection, papers_collection,
     solutions_liked_collection, papers_cited_collection
 )
+from utils.loader import document_loaders
 
 ## Query #######################################################################
 
 async def query_solution(solution_id):
-    solution = await solutions_collection.find_one({
-        '_id': ObjectId(solution_id)
-    })
-    if solution:
-        solution['id'] = str(solution['_id'])
-        solution['_id'] = str(solution['_id'])
-        solution['user_id'] = str(solution['user_id'])
-        return solution
-    return None
+    return await document_loaders().solutions.load(solution_id)
+
+async def query_solutions(solution_ids: List[str]):
+    """Load several solutions with one batched query, in the order of the ids"""
+    return await document_loaders().solutions.load_many(solution_ids)
 
 async def query_liked_solution(user_id: str, solution_ids: List[str]):
     """
@@ -45,27 +42,16 @@ async def query_liked_solution(user_id: str, solution_ids: List[str]):
     return result
 
 async def query_paper(paper_id: str):
-    paper = None
-    # cache_key = f"paper:{paper_id}"
-    # cached_result = await async_redis.get(cache_key)
-    # if cached_result:
-    #     paper = json.loads(cached_result)
-    # # Not in cache, read from database
-    # else:
-    #     paper = await papers_collection.find_one({'_id': ObjectId(paper_id)})
-    #     if(paper):
-    #         paper['id'] = str(paper['_id'])
-    #         del paper['_id']
-    # # Update to cache
-    # if(paper):
-    #     await async_redis.setex(cache_key, 3600, json.dumps(paper))
+    return await document_loaders().papers.load(paper_id)
 
-    # Redis disabled - read directly from database
-    paper = await papers_collection.find_one({'_id': ObjectId(paper_id)})
-    if(paper):
-        paper['id'] = str(paper['_id'])
-        del paper['_id']
-    return paper
+async def query_papers(paper_ids: List[str], evidence_only: bool = False):
+    """
+    Load several papers with one batched query, in the order of the ids.
+    With evidence_only, only the fields used as prompt evidence are read.
+    """
+    loaders = document_loaders()
+    loader = loaders.paper_evidence if evidence_only else loaders.papers
+    return await loader.load_many(paper_ids)
 
 ## Load ########################################################################
 
@@ -104,12 +90,7 @@ async def load_liked_solutions(user_id: str, page: int = 1):
     relations = await solutions_liked_collection.find(
         {'user_id': ObjectId(user_id)}
     ).skip(skip).limit(items_per_page).to_list(None)
-    result = []
-    for relation in relations:
-        id = str(relation['solution_id'])
-        solution = await query_solution(id)
-        result.append(solution)
-    return result
+    return await query_solutions([str(relation['solution_id']) for relation in relations])
 
 async def load_paper_cited_by_solution(solution_id: str):
     relations = await papers_cited_collection.find(
@@ -1,13 +1,12 @@
 from typing import TypedDict, List, Dict, Any, Optional, Callable, Awaitable
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.chat_models import init_chat_model
-from IPython.display import Image, display
-from langgraph.graph import StateGraph, START, END
 from typing import Literal
 import json
-import re
 import os
+import time
+import uuid
+from contextlib import aclosing
 
 from utils.db import solution_eval, convert_objectid_to_str
 import utils.db as RAG
@@ -16,8 +15,25 @@ import utils.tasks.query_load as QUERY
 import asyncio
 import utils.tasks.task as TASK
 import utils.main as MAIN
-from utils.image import process_and_upload_image
+from utils.image import process_and_upload_image, drawing_semaphore
 from utils.tasks.llm import OpenAIClient
+from utils.model_cache import get_chat_model
+from utils.checkpoint import research_checkpoints
+from utils.config import (
+    RESEARCH_CHECKPOINT,
+    STREAM_JSON,
+    PROMPT_LAYOUT,
+    RESEARCH_PIPELINE,
+    RESEARCH_DEADLINE,
+    RESEARCH_MODES,
+)
+from utils.stream_json import SolutionStreamParser, process_llm_response
+from utils.llm_limiter import llm_limiters
+from utils.hedging import stream_hedger
+from utils.context_builder import build_context
+from utils.run_metrics import RunMetrics, estimate_usage
+from utils.run_events import run_events, start_background_run
+from utils.loader import loader_scope
 
 # ------------------------------------------------------------
 # State Definition
@@ -31,6 +47,10 @@ class ResearchState(TypedDict):
     with_paper: bool
     with_example: bool
     is_drawing: bool
+    # save solutions before drawing and add images in the background
+    persist_first: bool
+    # quality level: fast, balanced or thorough (see RESEARCH_MODES)
+    mode: str
 
     # input
     query: str
@@ -42,12 +62,25 @@ class ResearchState(TypedDict):
     init_solution: Dict[str, Any]
     iterated_solution: Dict[str, Any]
     final_solution: Dict[str, Any]
+    shared_prefix: str
+
+    # usage per node: input, output and cached prompt tokens
+    token_usage: Dict[str, Dict[str, int]]
+    metrics: Any
+
+    # time budget: wall-clock deadline and the shortcuts taken to meet it
+    deadline: float
+    shortcuts: List[Dict[str, str]]
 
     # progress tracking
     progress: int
     status: str
     # task_id: str
 
+    # checkpointing
+    run_id: str
+    completed_nodes: List[str]
+
     # error handling
     error: Optional[str]
 
@@ -55,44 +88,156 @@ class ResearchState(TypedDict):
 # ------------------------------------------------------------
 
 
-async def stream_chain(chain, inputs, state: ResearchState) -> str:
+async def stream_chain(chain, inputs, state: ResearchState, node: Optional[str] = None) -> str:
     chunks = []
-    async for msg_chunk in chain.astream(inputs, stream_mode="messages"):
-        if hasattr(msg_chunk, "content") and msg_chunk.content:
-            await state["send_event"]("chunk", {"text": msg_chunk.content})
-            chunks.append(msg_chunk.content)
-    return "".join(chunks)
+    parser = SolutionStreamParser()
+    document = None
+    usage = None
+    timer = state["metrics"].timer(node) if state.get("metrics") else None
+    limiter = llm_limiters.for_model(state["model"])
+    stream = stream_hedger.open(
+        state["model"], lambda: chain.astream(inputs, stream_mode="messages")
+    )
+    async with limiter.slot(), aclosing(stream):
+        async for msg_chunk in stream:
+            if getattr(msg_chunk, "usage_metadata", None):
+                usage = msg_chunk.usage_metadata
+            if hasattr(msg_chunk, "content") and msg_chunk.content:
+                if timer:
+                    timer.mark_token()
+                await state["send_event"]("chunk", {"text": msg_chunk.content})
+                chunks.append(msg_chunk.content)
+
+                completed = parser.feed(msg_chunk.content)
+                # One chunk can close several solutions, number them from the first
+                first = parser.emitted - len(completed)
+                for index, solution in enumerate(completed, start=first):
+                    await state["send_event"](
+                        "partial_solution",
+                        {"node": node, "index": index, "solution": solution},
+                    )
+                # Stop paying for trailing commentary once the JSON is complete
+                if STREAM_JSON["stop_on_close"] and _is_complete_document(parser):
+                    document = parser.document
+                    break
+        if document is not None and usage is None and getattr(state["model"], "stream_usage", False):
+            usage = await _trailing_usage(stream)
+    if usage is None and chunks:
+        usage = estimate_usage(chain, inputs, "".join(chunks))
+    if usage and node:
+        await record_usage(state, node, usage)
+    return document if document is not None else "".join(chunks)
+
+
+async def _trailing_usage(stream) -> Optional[Dict[str, Any]]:
+    """
+    Read (without forwarding) what follows a closed JSON document until the
+    provider's usage chunk arrives, for at most PROMPT_LAYOUT["usage_wait"] seconds
+    """
+
+    async def drain():
+        async for msg_chunk in stream:
+            if getattr(msg_chunk, "usage_metadata", None):
+                return msg_chunk.usage_metadata
+        return None
+
+    try:
+        return await asyncio.wait_for(drain(), PROMPT_LAYOUT["usage_wait"])
+    except asyncio.TimeoutError:
+        return None
+
+
+async def record_usage(state: ResearchState, node: str, usage: Dict[str, Any]):
+    """Keep the provider's token usage (or a local estimate) for a node, including cached prompt tokens"""
+    details = usage.get("input_token_details") or {}
+    node_usage = {
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "cached_tokens": details.get("cache_read", 0) or 0,
+        "estimated": bool(usage.get("estimated")),
+    }
+    state.setdefault("token_usage", {})[node] = node_usage
+    timer = state["metrics"].timer(node) if state.get("metrics") else None
+    if timer:
+        timer.set_usage(usage)
+    print(f"Token usage of {node}: {node_usage}")
+    await state["send_event"]("usage", {"node": node, **node_usage})
+
+
+async def node_context(state: ResearchState, node: str, budget: Optional[int] = None) -> str:
+    """Token-budgeted domain knowledge for a node prompt"""
+    context = build_context(state["domain_knowledge"], node, budget)
+    await state["send_event"]("context", {"node": node, **context.summary()})
+    return context.text
+
+
+def expert_model(state: ResearchState, node: str):
+    """The run's model, with the answer capped at the node's max_tokens in this mode"""
+    max_tokens = RESEARCH_MODES["modes"].get(state.get("mode"), {}).get(node)
+    return state["model"].bind(max_tokens=max_tokens) if max_tokens else state["model"]
+
+
+SHARED_PREFIX_SYSTEM_PROMPT = (
+    "You are one of several experts in a human-computer interaction research "
+    "pipeline. The user's query and the retrieved domain knowledge come first; "
+    "your role, instructions and output format are given after them."
+)
+
+
+async def node_messages(
+    state: ResearchState, node: str, system_prompt: str, sections: Dict[str, Any]
+) -> list:
+    """
+    Messages of an expert node. In prefix-cache layout the query and domain
+    knowledge come first, identical in every node, followed by the node's
+    system prompt and its own inputs (`sections`).
+    """
+    query = state["query"]
+    tail = "\n".join(f"{title}: {value}" for title, value in sections.items())
+
+    if not PROMPT_LAYOUT["prefix_cache"]:
+        domain_knowledge = await node_context(state, node)
+        content = f"query: {query}\nDomain Knowledge:\n{domain_knowledge}"
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"{content}\n{tail}" if tail else content),
+        ]
+
+    if not state.get("shared_prefix"):
+        domain_knowledge = await node_context(state, "shared", PROMPT_LAYOUT["shared_budget"])
+        state["shared_prefix"] = f"query: {query}\nDomain Knowledge:\n{domain_knowledge}"
+    return [
+        SystemMessage(content=SHARED_PREFIX_SYSTEM_PROMPT),
+        HumanMessage(content=state["shared_prefix"]),
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=tail or "Answer the query above following these instructions."),
+    ]
 
 
-def process_llm_response(content):
+def _is_complete_document(parser: SolutionStreamParser) -> bool:
+    if not parser.done or not parser.emitted:
+        return False
     try:
-        return json.loads(content)
+        json.loads(parser.document)
+        return True
     except json.JSONDecodeError:
-        # if content is not json, try to extract json from content
-        json_match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                # if extract json failed, return content as text
-                return {"text": content}
-        else:
-            # if no json found, return content as text
-            return {"text": content}
+        return False
 
 
 # ------------------------------------------------------------
 # Nodes Definition
 
 
-async def rag_node(state: ResearchState):
+async def rag_node(state: ResearchState, keyword_only: bool = False):
     # print("rag_node")
     query = state["query"]
     query_analysis_result = state["query_analysis_result"]
     # rag_results = RAG.search_in_meilisearch(
     #     query, query_analysis_result.get("Requirement", "")
     # )
-    rag_results = await RAG.hybrid_search(query, query_analysis_result.get("Requirement", ""))
+    rag_results = await RAG.hybrid_search(
+        query, query_analysis_result.get("Requirement", ""), keyword_only=keyword_only
+    )
 
     state["progress"] = 30
     state["status"] = "RAG search completed"
@@ -108,9 +253,7 @@ async def rag_node(state: ResearchState):
 async def paper_node(state: ResearchState):
     # print("paper_node")
     paper_ids = state.get("paper_ids", [])
-    papers = await asyncio.gather(
-        *[QUERY.query_paper(paper_id) for paper_id in paper_ids]
-    )
+    papers = await QUERY.query_papers(paper_ids, evidence_only=True)
     rag_results = {
         "hits": [
             {"paper_id": paper_id, "content": paper}
@@ -134,9 +277,7 @@ async def example_node(state: ResearchState):
     if not isinstance(existing_rag_results["hits"], list):
         existing_rag_results["hits"] = []
 
-    solutions = await asyncio.gather(
-        *[QUERY.query_solution(str(solution_id)) for solution_id in example_ids]
-    )
+    solutions = await QUERY.query_solutions([str(solution_id) for solution_id in example_ids])
     new_hits = [
         {"solution_id": str(solution_id), "content": solution}
         for solution_id, solution in zip(example_ids, solutions)
@@ -150,22 +291,27 @@ async def example_node(state: ResearchState):
     return state
 
 
-async def domain_expert_node(state: ResearchState):
+BRIEF_DOMAIN_EXPERT_INSTRUCTIONS = (
+    "\n\nTime is short: propose at most 2 solutions and keep every field to a "
+    "few sentences."
+)
+
+
+async def domain_expert_node(state: ResearchState, brief: bool = False):
     # print("domain_expert_node")
-    query = state["query"]
-    domain_knowledge = state["domain_knowledge"]
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            SystemMessage(content=prompting.get_prompt("DOMAIN_EXPERT_SYSTEM_PROMPT")),
-            HumanMessage(
-                content=f"query: {query}\nDomain Knowledge: {domain_knowledge}"
-            ),
-        ]
+    system_prompt = prompting.get_prompt("DOMAIN_EXPERT_SYSTEM_PROMPT")
+    if brief:
+        system_prompt += BRIEF_DOMAIN_EXPERT_INSTRUCTIONS
+    messages = await node_messages(state, "domain_expert", system_prompt, {})
+    prompt = ChatPromptTemplate.from_messages(messages)
+
+    model = (
+        state["model"].bind(max_tokens=RESEARCH_DEADLINE["brief_max_tokens"])
+        if brief
+        else expert_model(state, "domain_expert")
     )
-
-    model = state["model"]
     chain = prompt | model
-    response = await stream_chain(chain, {"query": state["query"]}, state)
+    response = await stream_chain(chain, {"query": state["query"]}, state, "domain_expert")
 
     state["progress"] = 60
     state["status"] = "Domain analysis completed"
@@ -181,23 +327,16 @@ async def domain_expert_node(state: ResearchState):
 
 async def interdisciplinary_node(state: ResearchState):
     # print("interdisciplinary_node")
-    query = state["query"]
-    domain_knowledge = state["domain_knowledge"]
-    init_solution = state["init_solution"]
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            SystemMessage(
-                content=prompting.get_prompt("INTERDISCIPLINARY_EXPERT_SYSTEM_PROMPT")
-            ),
-            HumanMessage(
-                content=f"query: {query}\nDomain Knowledge: {domain_knowledge}\nInitial Solution: {init_solution}"
-            ),
-        ]
+    messages = await node_messages(
+        state,
+        "interdisciplinary",
+        prompting.get_prompt("INTERDISCIPLINARY_EXPERT_SYSTEM_PROMPT"),
+        {"Initial Solution": state["init_solution"]},
     )
+    prompt = ChatPromptTemplate.from_messages(messages)
 
-    model = state["model"]
-    chain = prompt | model
-    response = await stream_chain(chain, {"query": state["query"]}, state)
+    chain = prompt | expert_model(state, "interdisciplinary")
+    response = await stream_chain(chain, {"query": state["query"]}, state, "interdisciplinary")
 
     state["progress"] = 70
     state["status"] = "Interdisciplinary analysis completed"
@@ -214,24 +353,20 @@ async def interdisciplinary_node(state: ResearchState):
 
 async def evaluation_node(state: ResearchState):
     # print("evaluation_node")
-    query = state["query"]
-    domain_knowledge = state["domain_knowledge"]
-    init_solution = state["init_solution"]
-    iterated_solution = state["iterated_solution"]
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            SystemMessage(
-                content=prompting.get_prompt("PRACTICAL_EXPERT_EVALUATE_SYSTEM_PROMPT")
-            ),
-            HumanMessage(
-                content=f"query: {query}\nDomain Knowledge: {domain_knowledge}\nInitial Solution: {init_solution}\nIterated Solution: {iterated_solution}"
-            ),
-        ]
+    sections = {"Initial Solution": state["init_solution"]}
+    # Balanced mode evaluates the domain expert's solutions without an iteration
+    if "iterated_solution" in state:
+        sections["Iterated Solution"] = state["iterated_solution"]
+    messages = await node_messages(
+        state,
+        "evaluation",
+        prompting.get_prompt("PRACTICAL_EXPERT_EVALUATE_SYSTEM_PROMPT"),
+        sections,
     )
+    prompt = ChatPromptTemplate.from_messages(messages)
 
-    model = state["model"]
-    chain = prompt | model
-    response = await stream_chain(chain, {"query": state["query"]}, state)
+    chain = prompt | expert_model(state, "evaluation")
+    response = await stream_chain(chain, {"query": state["query"]}, state, "evaluation")
 
     state["progress"] = 80
     state["status"] = "Solution evaluation completed"
@@ -245,24 +380,39 @@ async def evaluation_node(state: ResearchState):
     return state
 
 
-async def drawing_node(state: ResearchState):
-    # print("drawing_node")
-    query_analysis_result = state["query_analysis_result"]
-    final_solution = state["final_solution"]
-    current_user = state["current_user"]
-    user_type = current_user.get("user_type", "None Type")
+async def single_pass_node(state: ResearchState):
+    # Fast mode: one prompt proposes, iterates and evaluates the solutions
+    messages = await node_messages(
+        state, "single_pass", prompting.get_prompt("SINGLE_PASS_EXPERT_SYSTEM_PROMPT"), {}
+    )
+    prompt = ChatPromptTemplate.from_messages(messages)
 
-    # Parse final_solution using solution_eval
-    final_solution = solution_eval(final_solution)
+    chain = prompt | expert_model(state, "single_pass")
+    response = await stream_chain(chain, {"query": state["query"]}, state, "single_pass")
 
-    if not final_solution or "solutions" not in final_solution:
-        state["error"] = "final_solution error"
-        state["progress"] = 85
-        state["status"] = "Image generation failed"
-        return state
+    state["progress"] = 80
+    state["status"] = "Solution generation completed"
+    state["final_solution"] = process_llm_response(response)
 
-    target_user = query_analysis_result.get("Target User", "null")
+    # Send node completion event
+    await state["send_event"](
+        "node_complete", {"node": "single_pass", "result": state["final_solution"]}
+    )
+
+    return state
 
+
+async def generate_images(
+    solutions: List[Dict[str, Any]],
+    target_user: str,
+    user_type: str,
+    on_image: Callable[..., Awaitable[None]],
+):
+    """
+    Generate and upload one image per solution with bounded concurrency.
+    `on_image(index, image_url, image_name, error, completed, total)` is awaited
+    as each image finishes, in completion order.
+    """
     # Setup drawing API client
     BASE_URL = os.getenv("DRAW_URL")
     API_KEY = os.getenv("DRAW_API_KEY")
@@ -271,59 +421,140 @@ async def drawing_node(state: ResearchState):
     client = OpenAIClient(api_key=API_KEY, base_url=BASE_URL, model_name=MODEL_NAME)
     SM_MS_API_KEY = os.getenv("SM_MS_API_KEY")
 
-    total_solutions = len(final_solution["solutions"])
+    total_solutions = len(solutions)
+    semaphore = drawing_semaphore(BASE_URL)
 
-    for i, solution in enumerate(final_solution["solutions"]):
+    async def draw(i: int, solution: Dict[str, Any]):
         technical_method = solution.get("Technical Method")
         possible_results = solution.get("Possible Results")
-
-        # Update progress for each image generation
-        current_progress = 80 + (i + 1) * 10 / total_solutions
-        await state["send_event"]("progress", int(current_progress))
-        await state["send_event"](
-            "status", f"Generating image {i+1}/{total_solutions}..."
-        )
-
         try:
-            # Generate image using drawing_expert_system
-            image_data = await MAIN.drawing_expert_system(
-                target_user,
-                technical_method,
-                possible_results,
-                client,
-                user_type=user_type,
-            )
+            async with semaphore:
+                # Generate image using drawing_expert_system
+                image_data = await MAIN.drawing_expert_system(
+                    target_user,
+                    technical_method,
+                    possible_results,
+                    client,
+                    user_type=user_type,
+                )
 
             # Process and upload image
             image_url, image_name = await process_and_upload_image(
                 image_data["url"], SM_MS_API_KEY
             )
+            return i, image_url, image_name, None
+        except Exception as e:
+            return i, None, None, e
+
+    tasks = [asyncio.create_task(draw(i, solution)) for i, solution in enumerate(solutions)]
+    completed = 0
+    try:
+        # Report each image as soon as it is ready, whatever its position
+        for next_done in asyncio.as_completed(tasks):
+            i, image_url, image_name, error = await next_done
+            completed += 1
+            if error is not None:
+                print(f"Failed to process image {i}: {error}")
+            await on_image(i, image_url, image_name, error, completed, total_solutions)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def drawing_node(state: ResearchState):
+    # print("drawing_node")
+    query_analysis_result = state["query_analysis_result"]
+    final_solution = state["final_solution"]
+    current_user = state["current_user"]
+    user_type = current_user.get("user_type", "None Type")
+
+    # Parse final_solution using solution_eval
+    final_solution = solution_eval(final_solution)
+
+    if not final_solution or "solutions" not in final_solution:
+        state["error"] = "final_solution error"
+        state["progress"] = 85
+        state["status"] = "Image generation failed"
+        return state
+
+    target_user = query_analysis_result.get("Target User", "null")
+
+    async def on_image(i, image_url, image_name, error, completed, total):
+        if error is None:
             final_solution["solutions"][i]["image_url"] = image_url
             final_solution["solutions"][i]["image_name"] = image_name
-
-        except Exception as e:
-            print(f"Failed to process image {i}: {e}")
+            await state["send_event"](
+                "image", {"index": i, "image_url": image_url, "image_name": image_name}
+            )
+        else:
             # Continue with other images even if one fails
-            continue
+            await state["send_event"]("image", {"index": i, "error": str(error)})
 
-    state["progress"] = 90
-    state["status"] = "Image generation completed"
-    state["final_solution"] = final_solution
+        # Update progress for each image generation
+        await state["send_event"]("progress", int(80 + completed * 10 / total))
+        await state["send_event"]("status", f"Generated image {completed}/{total}")
 
-    # Send node completion event
     await state["send_event"](
-        "node_complete", {"node": "drawing", "result": final_solution}
+        "status", f"Generating {len(final_solution['solutions'])} images..."
     )
+    await generate_images(final_solution["solutions"], target_user, user_type, on_image)
+
+    state["progress"] = 90
+    state["status"] = "Image generation completed"
+    state["final_solution"] = final_solution
 
     return state
 
 
+async def decorate_solutions(
+    solution_ids: List[str],
+    solutions: List[Dict[str, Any]],
+    target_user: str,
+    user_type: str,
+    send_event: Callable[[str, Any], Awaitable[None]],
+):
+    """
+    Background image job of a persist-first run: draw `solutions[i]`, patch
+    the image into the stored solution `solution_ids[i]` and its search
+    document, and notify the client if it is still connected. It runs as its
+    own logged run, so clients follow it through /research/attach.
+    """
+    notify = True
+
+    async def on_image(i, image_url, image_name, error, completed, total):
+        nonlocal notify
+        solution_id = solution_ids[i]
+        payload = {"index": i, "solution_id": solution_id}
+        if error is None:
+            try:
+                await TASK.set_solution_image(solution_id, image_url, image_name)
+                payload.update({"image_url": image_url, "image_name": image_name})
+            except Exception as e:
+                print(f"Failed to save image of solution {solution_id}: {e}")
+                payload["error"] = str(e)
+        else:
+            payload["error"] = str(error)
+
+        if notify:
+            try:
+                await send_event("image_ready", payload)
+            except (asyncio.CancelledError, Exception):
+                # The client is gone; keep patching the stored solutions
+                notify = False
+
+    await generate_images(solutions, target_user, user_type, on_image)
+
+
 async def persistence_node(state: ResearchState):
     print("persistence_node")
     query = state["query"]
     query_analysis_result = state["query_analysis_result"]
     domain_knowledge = state["domain_knowledge"]
     final_solution = state["final_solution"]
+    # The generated solutions, in their original order, for background drawing
+    drafts = list(final_solution.get("solutions") or []) if isinstance(final_solution, dict) else []
+    solution_ids = []
 
     try:
         # Save solution to database
@@ -331,24 +562,49 @@ async def persistence_node(state: ResearchState):
             state["current_user"], query, query_analysis_result, final_solution
         )
         print(f"Solution IDs from database: {solution_ids}")
-        await TASK.paper_cited(domain_knowledge, solution_ids)
+        try:
+            await TASK.paper_cited(domain_knowledge, solution_ids)
+        except Exception as e:
+            # Citation bookkeeping must not lose the saved solutions
+            print(f"Error recording cited papers: {e}")
 
         # Get saved solutions
-        solutions = await asyncio.gather(
-            *[QUERY.query_solution(str(solution_id)) for solution_id in solution_ids]
-        )
+        solutions = await QUERY.query_solutions([str(solution_id) for solution_id in solution_ids])
         solutions = [convert_objectid_to_str(solution) for solution in solutions]
         final_solution["solutions"] = solutions
     except Exception as e:
         print(f"Error saving solution: {e}")
+        solutions = []
 
     state["progress"] = 100
     state["status"] = "Task completed"
 
+    images_run_id = None
+    if state.get("is_drawing") and state.get("persist_first") and solution_ids:
+        # Solutions are returned now and the run ends; images are patched in
+        # by a separate run whose image_ready events the client can follow
+        user_type = state["current_user"].get("user_type", "None Type")
+        target_user = state["query_analysis_result"].get("Target User", "null")
+        ids = [str(solution_id) for solution_id in solution_ids]
+        images_run_id = f"{state['run_id']}-images"
+        await run_events.create(images_run_id, str(state["current_user"]["_id"]))
+        start_background_run(
+            "images",
+            images_run_id,
+            lambda send_event: decorate_solutions(
+                ids, drafts[: len(ids)], target_user, user_type, send_event
+            ),
+        )
+        state["status"] = "Solutions saved, generating images"
+
     # Send final completion event with solutions
     await state["send_event"](
         "node_complete", {"node": "persistence", "result": final_solution}
     )
+    if images_run_id:
+        await state["send_event"](
+            "images_pending", {"run_id": images_run_id, "solution_ids": ids}
+        )
 
     return state
 
@@ -360,6 +616,154 @@ async def progress_tracker_node(state: ResearchState):
     return {}
 
 
+# ------------------------------------------------------------
+# Checkpointing
+
+# State field holding the result each node reports in its node_complete event
+NODE_RESULT_KEYS = {
+    "rag": "domain_knowledge",
+    "domain_expert": "init_solution",
+    "interdisciplinary": "iterated_solution",
+    "evaluation": "final_solution",
+    "single_pass": "final_solution",
+    "drawing": "final_solution",
+    "persistence": "final_solution",
+}
+
+
+# ------------------------------------------------------------
+# Time budget
+
+
+def remaining_time(state: ResearchState) -> float:
+    deadline = state.get("deadline")
+    return deadline - time.time() if deadline else float("inf")
+
+
+async def take_shortcut(state: ResearchState, node: str, action: str, reason: str):
+    shortcut = {"node": node, "action": action, "reason": reason}
+    state.setdefault("shortcuts", []).append(shortcut)
+    print(f"Research shortcut: {shortcut}")
+    await state["send_event"]("shortcut", shortcut)
+
+
+async def keyword_only_rag(state: ResearchState, reason: str):
+    await take_shortcut(state, "rag", "keyword_only", reason)
+    return await rag_node(state, keyword_only=True)
+
+
+async def brief_domain_expert(state: ResearchState, reason: str):
+    await take_shortcut(state, "domain_expert", "brief", reason)
+    return await domain_expert_node(state, brief=True)
+
+
+async def skip_interdisciplinary(state: ResearchState, reason: str):
+    await take_shortcut(state, "interdisciplinary", "skipped", reason)
+    state["iterated_solution"] = state["init_solution"]
+    state["progress"] = 70
+    state["status"] = "Interdisciplinary analysis skipped"
+    await state["send_event"](
+        "node_complete",
+        {"node": "interdisciplinary", "result": state["iterated_solution"], "skipped": True},
+    )
+    return state
+
+
+async def skip_evaluation(state: ResearchState, reason: str):
+    await take_shortcut(state, "evaluation", "skipped", reason)
+    state["final_solution"] = state.get("iterated_solution") or state["init_solution"]
+    state["progress"] = 80
+    state["status"] = "Solution evaluation skipped"
+    await state["send_event"](
+        "node_complete",
+        {"node": "evaluation", "result": state["final_solution"], "skipped": True},
+    )
+    return state
+
+
+async def skip_drawing(state: ResearchState, reason: str):
+    await take_shortcut(state, "drawing", "skipped", reason)
+    state["progress"] = 90
+    state["status"] = "Image generation skipped"
+    return state
+
+
+# Cheaper substitutes for nodes that may be cut short to meet the deadline
+NODE_FALLBACKS = {
+    "rag": keyword_only_rag,
+    "domain_expert": brief_domain_expert,
+    "interdisciplinary": skip_interdisciplinary,
+    "evaluation": skip_evaluation,
+    "drawing": skip_drawing,
+}
+
+
+async def run_fallback(name: str, fallback, state: ResearchState, reason: str):
+    """Run a node's fallback within its own, short budget"""
+    timeout = RESEARCH_DEADLINE["fallback_budgets"].get(name, 5)
+    try:
+        return await asyncio.wait_for(fallback(state, reason), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Research time budget exceeded in {name}, fallback included")
+
+
+async def run_within_budget(name: str, node, state: ResearchState):
+    """
+    Run a node within its own budget and the run's deadline. When too little
+    time is left, or the node times out, its fallback runs instead (bounded by
+    its fallback budget); nodes without one fail the run.
+    """
+    budget = RESEARCH_DEADLINE["node_budgets"].get(name)
+    if not RESEARCH_DEADLINE["enabled"] or budget is None:
+        return await node(state)
+
+    remaining = remaining_time(state)
+    fallback = NODE_FALLBACKS.get(name)
+    if fallback and remaining < RESEARCH_DEADLINE["min_remaining"].get(name, 0):
+        return await run_fallback(
+            name, fallback, state, f"{max(remaining, 0):.0f}s of the time budget left"
+        )
+
+    timeout = max(min(budget, remaining), 0)
+    try:
+        return await asyncio.wait_for(node(state), timeout)
+    except asyncio.TimeoutError:
+        if fallback is None:
+            raise TimeoutError(f"Research time budget exceeded in {name}")
+        return await run_fallback(name, fallback, state, f"timed out after {timeout:.1f}s")
+
+
+def checkpointed(name: str, node):
+    """
+    Wrap a node so it is timed, kept within its time budget, and its output is
+    checkpointed once it completes.
+    Nodes already completed by an earlier attempt of the same run are skipped,
+    and their stored result is replayed to the client instead.
+    """
+
+    async def run(state: ResearchState):
+        if name in (state.get("completed_nodes") or []):
+            result_key = NODE_RESULT_KEYS.get(name)
+            if result_key and result_key in state:
+                await state["send_event"](
+                    "node_complete",
+                    {"node": name, "result": state[result_key], "restored": True},
+                )
+            return state
+
+        timer = state["metrics"].start(name) if state.get("metrics") else None
+        try:
+            state = await run_within_budget(name, node, state)
+        finally:
+            if timer:
+                timer.finish()
+        if state.get("run_id") and RESEARCH_CHECKPOINT["enabled"]:
+            await research_checkpoints.save(state["run_id"], name, state)
+        return state
+
+    return run
+
+
 # ------------------------------------------------------------
 
 
@@ -376,7 +780,7 @@ def decide_paper(state: ResearchState) -> Literal["paper", "example", "domain_ex
 
 def decide_draw(state: ResearchState) -> Literal["drawing", "persistence"]:
     is_drawing = state.get("is_drawing", False)
-    if is_drawing:
+    if is_drawing and not state.get("persist_first", False):
         return "drawing"
     else:
         return "persistence"
@@ -386,41 +790,46 @@ def decide_draw(state: ResearchState) -> Literal["drawing", "persistence"]:
 # Workflow Definition
 
 
-def create_research_graph():
+EXPERT_NODES = {
+    "domain_expert": domain_expert_node,
+    "interdisciplinary": interdisciplinary_node,
+    "evaluation": evaluation_node,
+    "single_pass": single_pass_node,
+}
+
+
+def create_research_graph(mode: str = "thorough"):
+    """Graph of the given mode, running its expert stages from RESEARCH_MODES in order"""
+    from langgraph.graph import StateGraph, END
+
+    stages = list(RESEARCH_MODES["modes"][mode])
     workflow = StateGraph(ResearchState)
 
     # add nodes
-    workflow.add_node("rag", rag_node)
-    workflow.add_node("paper", paper_node)
-    workflow.add_node("example", example_node)
-    workflow.add_node("domain_expert", domain_expert_node)
-    workflow.add_node("interdisciplinary", interdisciplinary_node)
-    workflow.add_node("evaluation", evaluation_node)
-    workflow.add_node("drawing", drawing_node)
-    workflow.add_node("persistence", persistence_node)
+    workflow.add_node("rag", checkpointed("rag", rag_node))
+    workflow.add_node("paper", checkpointed("paper", paper_node))
+    workflow.add_node("example", checkpointed("example", example_node))
+    for stage in stages:
+        workflow.add_node(stage, checkpointed(stage, EXPERT_NODES[stage]))
+    workflow.add_node("drawing", checkpointed("drawing", drawing_node))
+    workflow.add_node("persistence", checkpointed("persistence", persistence_node))
     workflow.add_node("progress_tracker", progress_tracker_node)
 
     # define the workflow
     workflow.set_entry_point("rag")
-    workflow.add_conditional_edges("rag", decide_paper)
-    workflow.add_edge("paper", "domain_expert")
-    workflow.add_edge("example", "domain_expert")
-    workflow.add_edge("domain_expert", "interdisciplinary")
-    workflow.add_edge("interdisciplinary", "evaluation")
-    workflow.add_conditional_edges("evaluation", decide_draw)
+    workflow.add_conditional_edges(
+        "rag", decide_paper, {"paper": "paper", "example": "example", "domain_expert": stages[0]}
+    )
+    workflow.add_edge("paper", stages[0])
+    workflow.add_edge("example", stages[0])
+    for previous, stage in zip(stages, stages[1:]):
+        workflow.add_edge(previous, stage)
+    workflow.add_conditional_edges(stages[-1], decide_draw)
     workflow.add_edge("drawing", "persistence")
     workflow.add_edge("persistence", END)
 
     # add parallel edges for progress tracking
-    for node in [
-        "rag",
-        "paper",
-        "example",
-        "domain_expert",
-        "interdisciplinary",
-        "evaluation",
-        "drawing",
-    ]:
+    for node in ["rag", "paper", "example", *stages, "drawing"]:
         workflow.add_edge(node, "progress_tracker")
 
     return workflow.compile()
@@ -437,18 +846,25 @@ async def start_research(
     with_example: bool,
     is_drawing: bool,
     send_event: Callable[[str, Any], Awaitable[None]],
+    run_id: Optional[str] = None,
+    persist_first: Optional[bool] = None,
+    started_at: Optional[float] = None,
+    mode: Optional[str] = None,
 ):
-    BASE_URL = current_user.get("api_url") or "https://api.deepseek.com/v1"
-    MODEL_NAME = current_user.get("model_name") or "deepseek-chat"
-    API_KEY = current_user.get("api_key") or None
-
-    model = init_chat_model(
-        model=MODEL_NAME,
-        model_provider="openai",
-        api_key=API_KEY,
-        base_url=BASE_URL,
-        streaming=True,
-    )
+    """
+    Run the research workflow. Passing the run_id of an earlier, interrupted
+    run resumes it from its last completed node. With persist_first, drawing
+    runs save their solutions first and add the images in a separate run,
+    announced by an images_pending event.
+    The run has to finish within the SLO counted from `started_at` (when the
+    request was accepted or a worker claimed it), taking shortcuts when time
+    runs low. `mode` picks
+    the quality level: fast, balanced or thorough.
+    """
+    mode = mode or RESEARCH_MODES["default"]
+    if mode not in RESEARCH_MODES["modes"]:
+        raise ValueError(f"Unknown research mode: {mode}")
+    model = get_chat_model(current_user)
 
     # Create initial state
     initial_state = {
@@ -458,18 +874,69 @@ async def start_research(
         "with_paper": with_paper,
         "with_example": with_example,
         "is_drawing": is_drawing,
+        "persist_first": (
+            RESEARCH_PIPELINE["persist_first"] if persist_first is None else bool(persist_first)
+        ),
+        "mode": mode,
         "query": query,
         "query_analysis_result": query_analysis_result,
         "progress": 0,
         "status": "Starting research workflow",
+        "token_usage": {},
+        "shortcuts": [],
+        "completed_nodes": [],
     }
 
-    # Run the graph
-    result = await graph.ainvoke(initial_state)
+    checkpoint = await research_checkpoints.load(run_id) if run_id else None
+    if checkpoint:
+        # Resume: restore the state produced by the completed nodes
+        initial_state.update(checkpoint["state"])
+        initial_state["completed_nodes"] = checkpoint["completed"]
+        print(f"Resuming research run {run_id} after {checkpoint['completed']}")
+    else:
+        run_id = run_id or uuid.uuid4().hex
+        if RESEARCH_CHECKPOINT["enabled"]:
+            await research_checkpoints.create(run_id, str(current_user["_id"]), initial_state)
+    initial_state["run_id"] = run_id
+    started_at = started_at or time.time()
+    initial_state["deadline"] = started_at + RESEARCH_DEADLINE["slo"]
+
+    mode = initial_state["mode"]
+    await send_event(
+        "run", {"run_id": run_id, "resumed": checkpoint is not None, "mode": mode}
+    )
+
+    metrics = RunMetrics.for_model("research", run_id, current_user, model)
+    metrics.mode = mode
+    initial_state["metrics"] = metrics
+    status = "failed"
+    try:
+        # Run the graph; nodes share batched, memoized document loads
+        with loader_scope():
+            result = await research_graph(mode).ainvoke(initial_state)
+        status = "completed"
+        metrics.shortcuts = result.get("shortcuts", [])
+        await send_event(
+            "budget",
+            {
+                "slo": RESEARCH_DEADLINE["slo"],
+                "elapsed": round(time.time() - started_at, 1),
+                "shortcuts": metrics.shortcuts,
+            },
+        )
+    finally:
+        await metrics.save(status)
     # print("Final state:", result)
 
 
 # -------------------------------------------------------------
 # Compile
 
-graph = create_research_graph()
+_graphs: Dict[str, Any] = {}
+
+
+def research_graph(mode: str = "thorough"):
+    """The compiled graph of a mode, built on first use rather than at import"""
+    if mode not in _graphs:
+        _graphs[mode] = create_research_graph(mode)
+    return _graphs[mode]
@@ -4,10 +4,14 @@ import datetime
 import base64
 import os
 import asyncio
-from typing import Dict, Any
+import json
+from typing import Dict, Any, List, Optional, Union
 from bson.objectid import ObjectId
 from meilisearch import Client
-from utils.config import MEILISEARCH
+from utils.config import MEILISEARCH, API_TEST
+from utils.redis import async_redis
+from utils.model_cache import api_key_fingerprint
+from utils.chat_context import chat_context_packs
 from utils.db import (
     users_collection,
     solutions_collection,
@@ -99,11 +103,26 @@ async def delete_solution(solution_id):
             # Delete document using async method
             index = await get_async_solution_index()
             await index.delete_document(str(solution_id))
+            await chat_context_packs.invalidate([solution_id])
 
             return True
     return False
 
 
+async def set_solution_image(solution_id, image_url: str, image_name: str) -> bool:
+    """Patch a generated image into a stored solution and its search document"""
+    updated = await solutions_collection.find_one_and_update(
+        {"_id": ObjectId(solution_id)},
+        {"$set": {"solution.image_url": image_url, "solution.image_name": image_name}},
+        return_document=True,
+    )
+    if not updated:
+        return False
+    await async_update_solution_to_meilisearch(updated)
+    await chat_context_packs.invalidate([solution_id])
+    return True
+
+
 ## Insert & Delete #############################################################
 
 
@@ -131,11 +150,16 @@ async def insert_solution(current_user, query, query_analysis_result, final_solu
 
 
 async def paper_cited(
-    papers: List[Dict[str, Any]], solution_ids: List[ObjectId]
+    papers: Union[Dict[str, Any], List[Dict[str, Any]]], solution_ids: List[ObjectId]
 ) -> None:
     formatted_time = get_formatted_time()
 
+    # Research passes its domain knowledge as {"hits": [...]}
+    if isinstance(papers, dict):
+        papers = papers.get("hits", [])
     for paper in papers:
+        if not isinstance(paper, dict):
+            continue
         paper_id = paper.get("_id")
         if paper_id:
             updated_paper = await papers_collection.find_one_and_update(
@@ -155,6 +179,9 @@ async def paper_cited(
                     }
                 )
 
+    # Packs built before the citations were recorded miss the cited papers
+    await chat_context_packs.invalidate(solution_ids)
+
 
 async def like_paper(paper, user):
     paper_id = paper.get("_id")
@@ -254,6 +281,82 @@ async def set_apikey(current_user, api_key, api_url=None, model_name=None):
         return {"success": False, "message": f"Error setting API key: {str(e)}"}
 
 
+def _api_test_cache_key(base_url: str, model: str, api_key: str) -> str:
+    return f"innoweaver:api_test:{base_url}|{model}|{api_key_fingerprint(api_key)}"
+
+
+async def _probe_api(api_key: str, base_url: str, model: str) -> Dict[str, Any]:
+    """Send one test completion and report the outcome with its latency"""
+    # Import here to avoid circular import
+    from .llm import OpenAIClient
+
+    # Create a new client with the provided credentials
+    client = OpenAIClient(
+        api_key=api_key, base_url=base_url, model_name=model  # Pass model name to client
+    )
+
+    # Basic test prompt
+    test_prompt = "Hello, this is a test message. Please respond with 'OK' if you receive this."
+
+    started = time.perf_counter()
+    try:
+        response = await MAIN.simple_completion(
+            test_prompt, client, timeout=API_TEST["timeout"]
+        )
+        return {
+            "success": True,
+            "message": "API connection successful",
+            "response": response,
+            "latency_ms": int((time.perf_counter() - started) * 1000),
+        }
+    except Exception as api_error:
+        error_details = str(api_error)
+        latency_ms = int((time.perf_counter() - started) * 1000)
+
+        # Extract more readable error message if possible
+        if "status_code" in error_details and "text" in error_details:
+            return {
+                "success": False,
+                "message": "API connection failed",
+                "error": error_details,
+                "details": {
+                    "raw_error": error_details,
+                    "provider": (
+                        "openai" if "openai.com" in str(base_url) else "other"
+                    ),
+                },
+                "latency_ms": latency_ms,
+            }
+        else:
+            # Generic error handling
+            return {
+                "success": False,
+                "message": f"API connection failed: {error_details}",
+                "details": {"raw_error": error_details},
+                "latency_ms": latency_ms,
+            }
+
+
+async def _cached_probe_api(api_key: str, base_url: str, model: str) -> Dict[str, Any]:
+    """Probe an endpoint, reusing a result from the last few seconds if there is one"""
+    cache_key = _api_test_cache_key(base_url, model, api_key)
+    try:
+        cached = await async_redis.get(cache_key)
+        if cached:
+            return {**json.loads(cached), "cached": True}
+    except Exception as e:
+        LOG.logger.error(f"API test cache read failed: {str(e)}")
+
+    result = await _probe_api(api_key, base_url, model)
+    expire = API_TEST["cache_expire" if result["success"] else "failure_cache_expire"]
+    try:
+        if expire > 0:
+            await async_redis.setex(cache_key, expire, json.dumps(result))
+    except Exception as e:
+        LOG.logger.error(f"API test cache write failed: {str(e)}")
+    return {**result, "cached": False}
+
+
 async def test_api_connection(current_user, api_key, api_url=None, model_name=None):
     try:
         # Validate API key format
@@ -269,58 +372,59 @@ async def test_api_connection(current_user, api_key, api_url=None, model_name=No
             f"Testing API connection for user {current_user['email']} with URL: {base_url}, model: {model}"
         )
 
-        # Import here to avoid circular import
-        from .llm import OpenAIClient
-
-        # Create a new client with the provided credentials
-        client = OpenAIClient(
-            api_key=api_key, base_url=base_url, model_name=model  # Pass model name to client
-        )
-
-        # Basic test prompt
-        test_prompt = "Hello, this is a test message. Please respond with 'OK' if you receive this."
-
-        try:
-            response = await asyncio.to_thread(
-                lambda: MAIN.simple_completion(test_prompt, client)
-            )
+        result = await _cached_probe_api(api_key, base_url, model)
+        if result["success"]:
             LOG.logger.info(
                 f"API connection test successful for user {current_user['email']}"
             )
-            return {
-                "success": True,
-                "message": "API connection successful",
-                "response": response,
-            }
-        except Exception as api_error:
-            error_details = str(api_error)
-            # Log the detailed error
+        else:
             LOG.logger.error(
-                f"API connection test failed for user {current_user['email']}: {error_details}"
+                f"API connection test failed for user {current_user['email']}: {result['message']}"
             )
-
-            # Extract more readable error message if possible
-            if "status_code" in error_details and "text" in error_details:
-                return {
-                    "success": False,
-                    "message": "API connection failed",
-                    "error": error_details,
-                    "details": {
-                        "raw_error": error_details,
-                        "provider": (
-                            "openai" if "openai.com" in str(base_url) else "other"
-                        ),
-                    },
-                }
-            else:
-                # Generic error handling
-                return {
-                    "success": False,
-                    "message": f"API connection failed: {error_details}",
-                    "details": {"raw_error": error_details},
-                }
+        return result
 
     except Exception as e:
         error_message = f"Error testing API connection: {str(e)}"
         LOG.logger.error(error_message)
         return {"success": False, "message": error_message}
+
+
+async def test_api_candidates(
+    current_user, api_key: Optional[str], candidates: List[Dict[str, Any]]
+):
+    """
+    Test several endpoint/model candidates concurrently.
+    Results are ordered with working candidates first, fastest first.
+    """
+    probes = []
+    for candidate in candidates[: API_TEST["max_candidates"]]:
+        candidate_key = candidate.get("api_key") or api_key
+        base_url = candidate.get("api_url") or "https://api.deepseek.com/v1"
+        model = candidate.get("model_name") or "deepseek-chat"
+        probes.append((candidate_key, base_url, model))
+
+    LOG.logger.info(
+        f"Testing {len(probes)} API candidates for user {current_user['email']}"
+    )
+
+    async def run_probe(candidate_key, base_url, model):
+        if not candidate_key or not validate_apikey(candidate_key):
+            result = {"success": False, "message": "Invalid API key format"}
+        else:
+            result = await _cached_probe_api(candidate_key, base_url, model)
+        return {"api_url": base_url, "model_name": model, **result}
+
+    results = await asyncio.gather(*[run_probe(*probe) for probe in probes])
+    results.sort(
+        key=lambda r: (not r["success"], r.get("latency_ms", float("inf")))
+    )
+    fastest = results[0] if results and results[0]["success"] else None
+    return {
+        "success": fastest is not None,
+        "fastest": (
+            {"api_url": fastest["api_url"], "model_name": fastest["model_name"]}
+            if fastest
+            else None
+        ),
+        "results": results,
+    }
@@ -1,24 +1,41 @@
-import chromadb
-import dashscope
 from typing import List, Dict
 import os
 import hashlib
+import threading
 
 
 class VectorStore:
+    """
+    Chroma collection of paper embeddings. chromadb and dashscope are heavy
+    to import, so both are loaded, and the database opened, on first use.
+    """
+
     def __init__(self):
-        # Setup qwen embedding
-        dashscope.api_key = os.getenv("QWEN_API_KEY")
+        self._client = None
+        self._collection = None
+        self._lock = threading.Lock()
 
-        # Setup chromadb
-        self.client = chromadb.PersistentClient(path="./chroma_db")
-        self.collection = self.client.get_or_create_collection(
-            name="papers", metadata={"hnsw:space": "cosine"}
-        )
+    @property
+    def collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    import chromadb
+
+                    # Setup chromadb
+                    self._client = chromadb.PersistentClient(path="./chroma_db")
+                    self._collection = self._client.get_or_create_collection(
+                        name="papers", metadata={"hnsw:space": "cosine"}
+                    )
+        return self._collection
 
     def get_embedding(self, text: str) -> List[float]:
         """Get embedding from qwen"""
         try:
+            import dashscope
+
+            # Setup qwen embedding
+            dashscope.api_key = os.getenv("QWEN_API_KEY")
             response = dashscope.TextEmbedding.call(
                 model=dashscope.TextEmbedding.Models.text_embedding_v2,
                 input=text[:2000],  # Limit text length